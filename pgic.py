@@ -5,24 +5,50 @@ Python tool to correct attenuation bias stemming from measurement error in polyg
 """
 
 import argparse
+import concurrent.futures
 import copy
+import csv
+import hashlib
 import itertools
+import json
 import logging
 import multiprocessing
 import os
 import re
+import shutil
 import stat
 import sys
 import tarfile
 import tempfile
-from typing import Any, Dict, List, Tuple
+import threading
+from typing import Any, Dict, Iterable, List, Tuple, Union
 import zipfile
 
 import numpy as np
 import pandas as pd
+import scipy.linalg
+import scipy.optimize
+import scipy.sparse
+import scipy.sparse.csgraph
 import statsmodels.api as sm
 import wget
 
+# pyarrow is optional (it enables the multi-threaded text parser and columnar input formats)
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.feather
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# PyYAML is optional (it enables YAML specification files)
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
 ####################################################################################################
 
 # The default short file prefix to use for output and logs
@@ -60,6 +86,48 @@ DEFAULT_NUM_JK_BLOCKS = 100
 # Threshold of number of jack knife blocks below which the user is warned
 MIN_WARNING_JK_BLOCKS = 20
 
+# Jack knife methods (derive each iteration's estimates by downdating the full-data moments, or
+# re-run the full procedure on each restricted dataset)
+JK_METHOD_DOWNDATE = "downdate"
+JK_METHOD_REFIT = "refit"
+JK_METHODS = [JK_METHOD_DOWNDATE, JK_METHOD_REFIT]
+
+# Shuffled jack knife regression data as seen by a worker process (set by _init_jk_worker())
+_jk_worker_state = None
+
+# Convergence settings of the alternating projections that sweep out multiple fixed effects (the
+# tolerance is relative to the standard deviation of each column)
+ABSORB_TOLERANCE = 1e-10
+ABSORB_MAX_ITERATIONS = 1000
+
+# Bootstrap methods (Bayesian bootstrap weights are flat Dirichlet draws scaled to sum to the
+# sample size, multiplier bootstrap weights are Poisson(1) draws) and the approximate number of
+# weights drawn at a time
+BOOTSTRAP_BAYESIAN = "bayesian"
+BOOTSTRAP_MULTIPLIER = "multiplier"
+BOOTSTRAP_METHODS = [BOOTSTRAP_BAYESIAN, BOOTSTRAP_MULTIPLIER]
+DEFAULT_BOOTSTRAP_CHUNK_ELEMENTS = 1 << 22
+
+# Least squares solvers (the cross-products of one pass over the data with a fallback to
+# statsmodels, statsmodels, or a direct LAPACK solve of the normal equations via a Cholesky
+# factorization or of the design matrix via a QR factorization)
+SOLVER_MOMENTS = "moments"
+SOLVER_STATSMODELS = "statsmodels"
+SOLVER_CHOLESKY = "cholesky"
+SOLVER_QR = "qr"
+SOLVERS = [SOLVER_MOMENTS, SOLVER_STATSMODELS, SOLVER_CHOLESKY, SOLVER_QR]
+
+# Largest condition number (of the correlation matrix of the independent variables) for which the
+# moments solver works from the cross-products instead of falling back to statsmodels
+MOMENTS_MAX_CONDITION = 1e10
+
+# Storage precisions of the regression data (sums of squares and cross-products are always
+# accumulated in float64), and the number of rows accumulated at a time
+PRECISION_FLOAT64 = "float64"
+PRECISION_FLOAT32 = "float32"
+PRECISIONS = [PRECISION_FLOAT64, PRECISION_FLOAT32]
+MOMENTS_BLOCK_ROWS = 65536
+
 # Name given to column of constant values added to the regression data
 CONS_COL_NAME = "cons"
 
@@ -74,6 +142,11 @@ CORR_COEF_COLUMN = "corrected_coef"
 CORR_COEF_SE_COLUMN = "corrected_se"
 OUTPUT_COLUMNNAMES = [VAR_OUTPUT_COLUMN, UNCORR_COEF_COLUMN, UNCORR_COEF_SE_COLUMN,
                       CORR_COEF_COLUMN, CORR_COEF_SE_COLUMN]
+GRID_OUTPUT_COLUMNNAMES = ["h2", "R2", "rho", VAR_OUTPUT_COLUMN, CORR_COEF_COLUMN,
+                           CORR_COEF_SE_COLUMN]
+
+# Separator of the START:STOP:NUM form of --h2-grid and --rho-grid
+GRID_RANGE_SEPARATOR = ":"
 
 ####################################################################################################
 
@@ -107,6 +180,133 @@ Rho = %s (%s)
 # Used in the slot where standard errors would normally be reported (when jack-knife wasn't run)
 ASSUMED_VAL = "assumed"
 
+# Separator handed to the text parser when the regression data file is whitespace-delimited
+WHITESPACE_SEP = r"\s+"
+
+# Candidate delimiters considered when sniffing the header of the regression data file
+CANDIDATE_DELIMITERS = ",\t;| "
+
+# Regression data file formats (delimited text plus columnar formats read via pyarrow)
+TEXT_FORMAT = "text"
+PARQUET_FORMAT = "parquet"
+FEATHER_FORMAT = "feather"
+ARROW_FORMAT = "arrow"
+AUTO_FORMAT = "auto"
+REG_DATA_FORMATS = [AUTO_FORMAT, TEXT_FORMAT, PARQUET_FORMAT, FEATHER_FORMAT, ARROW_FORMAT]
+
+# File extensions used to detect columnar formats (anything else is treated as text)
+COLUMNAR_FORMAT_EXTENSIONS = {".parquet" : PARQUET_FORMAT,
+                              ".pq" : PARQUET_FORMAT,
+                              ".feather" : FEATHER_FORMAT,
+                              ".ftr" : FEATHER_FORMAT,
+                              ".arrow" : ARROW_FORMAT,
+                              ".ipc" : ARROW_FORMAT}
+
+# Number of rows per record batch when streaming columnar regression data
+DEFAULT_BATCH_ROWS = 65536
+
+# GCTA GRM file suffixes (the .bin files hold the lower triangle, including the diagonal, of the
+# relatedness and number-of-SNPs matrices row by row as float32)
+GRM_BIN_SUFFIX = ".grm.bin"
+GRM_N_BIN_SUFFIX = ".grm.N.bin"
+GRM_ID_SUFFIX = ".grm.id"
+GRM_DTYPE = np.float32
+
+# Approximate number of GRM elements gathered per write when writing a restricted GRM (or
+# scanned at a time when looking for related pairs)
+DEFAULT_GRM_CHUNK_ELEMENTS = 1 << 22
+
+# Name (within the temporary directory) of the GRM with the relatedness cutoff applied
+PRUNED_GRM_NAME = "pruned_grm"
+
+# Sparse GRM files (as written by GCTA's --make-bK-sparse): a .grm.id file and a text file of
+# (row index, column index, relatedness) triplets of the nonzero lower triangle (0-based indices),
+# and the name (within the temporary directory) of a sparse GRM made by thresholding a dense one
+GRM_SPARSE_SUFFIX = ".grm.sp"
+SPARSE_GRM_NAME = "sparse_grm"
+
+# GRM construction engines (GCTA's --make-grm, or the built-in builder reading the .bed file)
+GRM_BUILDER_GCTA = "gcta"
+GRM_BUILDER_NATIVE = "native"
+GRM_BUILDERS = [GRM_BUILDER_GCTA, GRM_BUILDER_NATIVE]
+
+# PLINK binary genotype files: the .bed file starts with these magic bytes (the last one
+# indicating SNP-major order) followed by one row of ceil(#individuals / 4) bytes per SNP, each
+# byte holding the 2-bit codes of 4 individuals (lowest bits first)
+BED_SUFFIX = ".bed"
+BIM_SUFFIX = ".bim"
+FAM_SUFFIX = ".fam"
+BED_MAGIC = bytes([0x6c, 0x1b, 0x01])
+
+# Precision that genotypes are decoded (and the built-in GRM builder accumulates) in, the number
+# of copies of the first (.bim column 5) allele for each 2-bit code (01 is missing), and the
+# decoded genotypes of the 4 individuals in each possible byte
+GENOTYPE_DTYPE = np.float32
+BED_CODE_GENOTYPES = np.array([2.0, np.nan, 1.0, 0.0], dtype=GENOTYPE_DTYPE)
+BED_BYTE_GENOTYPES = BED_CODE_GENOTYPES[(np.arange(256)[:, np.newaxis] >> (2 * np.arange(4))) & 3]
+
+# Number of decoded genotypes (individuals x SNPs) held at a time by the built-in GRM builder and
+# randomized Haseman-Elston regression (the number of SNPs per block is derived from it and the
+# number of individuals), which also bounds the GRM builder's temporary products
+DEFAULT_GENOTYPE_BLOCK_ELEMENTS = 1 << 24
+
+# Heritability estimation methods (REML by GCTA or BOLT, in-process REML on the eigendecomposed
+# GRM, or in-process randomized Haseman-Elston regression), and the default number and seed of
+# the random probe vectors of the latter
+H2_METHOD_REML = "reml"
+H2_METHOD_REML_EIGEN = "reml-eigen"
+H2_METHOD_RHE = "rhe"
+H2_METHODS = [H2_METHOD_REML, H2_METHOD_REML_EIGEN, H2_METHOD_RHE]
+DEFAULT_RHE_PROBES = 10
+RHE_PROBE_SEED = 0
+
+# Number of stacked values (individuals x (probes, phenotype, and covariates) of each sample)
+# of the samples whose randomized Haseman-Elston statistics are calculated in one pass over the
+# SNPs
+DEFAULT_RHE_BATCH_ELEMENTS = 1 << 24
+
+# Cached GRM eigendecompositions are stored next to the GRM files as .npy files (memory-mapped
+# when read), with those of the GRM restricted to a subset of its individuals keyed by the
+# first GRM_SUBSET_KEY_LENGTH characters of the SHA-256 digest of the subset's IDs.  REML on
+# the eigendecomposed GRM searches log(sigma_e^2 / sigma_g^2) over a grid and then refines the
+# best grid point.
+GRM_EIGENVALUES_SUFFIX = ".grm.eigval.npy"
+GRM_EIGENVECTORS_SUFFIX = ".grm.eigvec.npy"
+GRM_SUBSET_KEY_LENGTH = 16
+REML_EIGEN_LOG_DELTA_BOUNDS = (-10.0, 10.0)
+REML_EIGEN_GRID_POINTS = 100
+
+# Values marking a missing phenotype in a GCTA phenotype file
+PHENO_FILE_MISSING_VALUES = ["-9", "NA"]
+
+# Heritability cache settings (entries are JSON files named by the hash of their inputs)
+DEFAULT_H2_CACHE_MAX_MB = 256
+H2_CACHE_ENTRY_SUFFIX = ".json"
+HASH_READ_BYTES = 1 << 24
+
+# Content hashes of files that have already been hashed, keyed by (path, size, modification time)
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+# Full sample h^2 estimates (and their standard errors) made by this process, keyed by the inputs
+# of the estimation
+_full_sample_h2s = {}
+
+# Specification file formats (by extension, anything else is treated as tab-separated text)
+JSON_SPEC_EXTENSIONS = {".json"}
+YAML_SPEC_EXTENSIONS = {".yaml", ".yml"}
+
+# Specifications (and their shared data) as seen by a specification worker process
+_spec_worker_state = None
+
+# PGI scan settings (number of PGIs corrected together, number of missingness groups whose
+# shared values are kept at a time, and the columns of the --pgi-table)
+DEFAULT_SCAN_BATCH_SIZE = 256
+SCAN_SHARED_GROUPS = 8
+PGI_TABLE_PGI_COLUMN = "pgi"
+PGI_TABLE_H2_COLUMN = "h2"
+PGI_TABLE_R2_COLUMN = "R2"
+
 
 """
 Class used as a holder for internal values
@@ -229,13 +429,51 @@ def validate_h2_software_inputs(user_args: Dict[str, str], parsed_args: argparse
     # Classify GCTA-related flags for checking consistency
     required_gcta_argnames = {"pheno_file"}
     need_one_argnames = {"bfile", "grm"}
-    optional_gcta_argnames = {"gcta_exec", "grm_cutoff"} | need_one_argnames
+    optional_gcta_argnames = {"gcta_exec", "grm_cutoff", "grm_builder"} | need_one_argnames
     required_bolt_argnames = {"pheno_file", "bfile"}
     optional_bolt_argnames = {"pheno_file_pheno_col"}
+    sparse_argnames = {"grm_sparse", "sparse_grm_cutoff"}
 
     # Set of all user flags employed
     user_args_key_set = set(user_args.keys())
-    all_software_args = required_gcta_argnames | optional_gcta_argnames | required_bolt_argnames | optional_bolt_argnames
+    all_software_args = required_gcta_argnames | optional_gcta_argnames | required_bolt_argnames | optional_bolt_argnames | sparse_argnames
+
+    # In-process estimation only needs the phenotype and the genotypes (RHE) or a GRM (REML on the
+    # eigendecomposed GRM, which is built in-process from --bfile if need be)
+    if settings.calc_h2 and parsed_args.h2_method != H2_METHOD_REML:
+        not_needed = user_args_key_set & {"gcta_exec", "bolt_exec", "download_gcta",
+                                          "download_bolt"}
+        if parsed_args.h2_method == H2_METHOD_RHE:
+            settings.software = "RHE"
+            missing = {"pheno_file", "bfile"} - user_args_key_set
+            not_needed |= user_args_key_set & ({"grm"} | sparse_argnames)
+        else:
+            settings.software = "REML-eigen"
+            missing = required_gcta_argnames - user_args_key_set
+            grm_argnames = need_one_argnames | {"grm_sparse"}
+            if len(grm_argnames & user_args_key_set) != 1:
+                raise RuntimeError("Need to specify one and only one of: %s" %
+                                   {to_flag(arg) for arg in grm_argnames})
+            if {"grm_sparse", "sparse_grm_cutoff"} <= user_args_key_set:
+                raise RuntimeError("The %s flag only applies to a dense GRM (--grm or --bfile)" %
+                                   to_flag("sparse_grm_cutoff"))
+            if parsed_args.grm_builder != GRM_BUILDER_NATIVE and "grm_builder" in user_args:
+                warn_or_raise(settings.force, "%s builds its GRM in-process, ignoring %s %s",
+                              settings.software, to_flag("grm_builder"), parsed_args.grm_builder)
+            settings.grm_builder = GRM_BUILDER_NATIVE
+        if missing:
+            raise RuntimeError("For %s to run, please specify the following missing flags: %s" %
+                               (settings.software, {to_flag(arg) for arg in missing}))
+        if not_needed:
+            warn_or_raise(settings.force, "The following unneeded flags were specified: %s",
+                          {to_flag(arg) for arg in not_needed})
+        return
+
+    # Sparse GRMs are only used by the in-process REML
+    if settings.calc_h2 and sparse_argnames & user_args_key_set:
+        raise RuntimeError("The flags %s require --h2-method %s" %
+                           ({to_flag(arg) for arg in sparse_argnames & user_args_key_set},
+                            H2_METHOD_REML_EIGEN))
 
     if settings.use_gcta:
         missing = required_gcta_argnames - user_args_key_set
@@ -293,6 +531,11 @@ def validate_filedir_inputs(user_args: Dict[str, str], parsed_args: argparse.Nam
         raise FileNotFoundError("The designated data file [%s] does not exist." %
                                 parsed_args.reg_data_file)
 
+    # Check for PGI table
+    if parsed_args.pgi_table and not os.path.exists(parsed_args.pgi_table):
+        raise FileNotFoundError("The designated PGI table [%s] does not exist." %
+                                parsed_args.pgi_table)
+
     # If path to gcta executable is specified (and gcta is needed), confirm it exists
     if settings.calc_h2 and parsed_args.gcta_exec:
         if not os.path.exists(parsed_args.gcta_exec):
@@ -313,6 +556,13 @@ def validate_filedir_inputs(user_args: Dict[str, str], parsed_args: argparse.Nam
                                     "do not exist in directory %s." %
                                     (parsed_args.grm, parsed_args.grm, parsed_args.grm, grm_dir))
 
+    # If a sparse GRM is specified (and h^2 is calculated), confirm its files exist
+    if settings.calc_h2 and parsed_args.grm_sparse:
+        for suffix in [GRM_SPARSE_SUFFIX, GRM_ID_SUFFIX]:
+            if not os.path.exists(parsed_args.grm_sparse + suffix):
+                raise FileNotFoundError("The expected sparse GRM file [%s] does not exist." %
+                                        (parsed_args.grm_sparse + suffix))
+
     # If a phenotype file is specified (and gcta is needed), confirm it exists
     if settings.calc_h2 and parsed_args.pheno_file:
         if not os.path.exists(parsed_args.pheno_file):
@@ -365,6 +615,53 @@ def validate_numeric_flags(user_args: Dict[str, str], parsed_args: argparse.Name
             raise ValueError("The specified R^2 value (%s) should be between %f and %f." %
                              (parsed_args.R2, r2_lower_bound, r2_upper_bound))
 
+    # Check h^2 standard error if it's specified
+    if parsed_args.h2_se is not None:
+        if not parsed_args.h2:
+            raise ValueError("The --h2-se flag can only be used with --h2.")
+        if parsed_args.h2_se < 0.0:
+            raise ValueError("The specified h2-se value (%s) should not be negative." %
+                             parsed_args.h2_se)
+
+    # Check the number of randomized Haseman-Elston probes
+    if parsed_args.rhe_probes < 1:
+        raise ValueError("The specified rhe-probes value (%s) should be at least 1." %
+                         parsed_args.rhe_probes)
+
+    # Check sensitivity grids if they're specified
+    if parsed_args.h2_grid:
+        settings.h2_grid = parse_grid(parsed_args.h2_grid, "h2-grid")
+        if np.any(settings.h2_grid <= h2_lower_bound) or np.any(settings.h2_grid > h2_upper_bound):
+            raise ValueError("The specified h2-grid values should be greater than %f and at most "
+                             "%f." % (h2_lower_bound, h2_upper_bound))
+    if parsed_args.rho_grid:
+        settings.rho_grid = parse_grid(parsed_args.rho_grid, "rho-grid")
+        if np.any(settings.rho_grid <= 0.0):
+            raise ValueError("The specified rho-grid values should be positive.")
+
+    # Check PGI scan batch size
+    if parsed_args.scan_batch_size < 1:
+        raise ValueError("The specified scan-batch-size (%s) must be positive." %
+                         parsed_args.scan_batch_size)
+
+    # Check number of bootstrap replicates if it's specified
+    if parsed_args.bootstrap is not None and parsed_args.bootstrap < 2:
+        raise ValueError("The specified bootstrap (%s) must be at least 2." % parsed_args.bootstrap)
+
+    # Check chunk size
+    if parsed_args.chunk_rows < 1:
+        raise ValueError("The specified chunk-rows (%s) must be positive." %
+                         parsed_args.chunk_rows)
+
+    # Check number of simultaneous heritability jobs
+    if parsed_args.h2_jobs < 1:
+        raise ValueError("The specified h2-jobs (%s) must be positive." % parsed_args.h2_jobs)
+
+    # Check number of jack knife worker processes
+    if parsed_args.jk_workers < 1:
+        raise ValueError("The specified jk-workers (%s) must be positive." %
+                         parsed_args.jk_workers)
+
     # Check num blocks if it's specified
     if parsed_args.num_blocks:
         if parsed_args.num_blocks < 2:
@@ -375,6 +672,33 @@ def validate_numeric_flags(user_args: Dict[str, str], parsed_args: argparse.Name
                           parsed_args.num_blocks, MIN_WARNING_JK_BLOCKS)
 
 
+def parse_grid(values: List[str], flag_name: str) -> np.ndarray:
+    """
+    Parses the values of a sensitivity grid flag: either a list of numbers or a single
+    START:STOP:NUM range of NUM evenly spaced numbers from START to STOP (inclusive)
+
+    :param values: Values given for the flag
+    :param flag_name: Name of the flag (for error messages)
+
+    :return: Array of grid values
+    """
+
+    try:
+        if len(values) == 1 and GRID_RANGE_SEPARATOR in values[0]:
+            start, stop, num = values[0].split(GRID_RANGE_SEPARATOR)
+            grid = np.linspace(float(start), float(stop), int(num))
+        else:
+            grid = np.array([float(value) for value in values])
+    except ValueError:
+        raise ValueError("The %s flag needs either numbers or a single START%sSTOP%sNUM range, "
+                         "not %s." % (flag_name, GRID_RANGE_SEPARATOR, GRID_RANGE_SEPARATOR,
+                                      " ".join(values)))
+    if grid.size == 0:
+        raise ValueError("The %s flag needs at least one value." % flag_name)
+
+    return grid
+
+
 def validate_jackknife_inputs(user_args: Dict[str, str], parsed_args: argparse.Namespace,
                               settings: InternalNamespace):
     """
@@ -416,6 +740,247 @@ def validate_jackknife_inputs(user_args: Dict[str, str], parsed_args: argparse.N
                           extraneous_flags)
 
 
+def determine_reg_data_format(reg_data_file: str, reg_data_format: str = AUTO_FORMAT) -> str:
+    """
+    Determines the format of the regression data file, either as specified or (if the specified
+    format is AUTO_FORMAT) from the file extension
+
+    :param reg_data_file: Full path to the regression data file
+    :param reg_data_format: User-specified format (one of REG_DATA_FORMATS)
+
+    :return: The resolved format (one of REG_DATA_FORMATS other than AUTO_FORMAT)
+    """
+
+    if reg_data_format == AUTO_FORMAT:
+        extension = os.path.splitext(reg_data_file)[1].lower()
+        reg_data_format = COLUMNAR_FORMAT_EXTENSIONS.get(extension, TEXT_FORMAT)
+
+    if reg_data_format != TEXT_FORMAT and not pyarrow:
+        raise ImportError("Reading regression data in %s format requires the pyarrow package, "
+                          "which could not be imported." % reg_data_format)
+
+    return reg_data_format
+
+
+def _open_ipc_file(reg_data_file: str, batch_rows: int = None) -> Tuple[Any, Iterable]:
+    """
+    Memory-maps an Arrow IPC / Feather file and opens it for access to its batches.  Feather V1
+    files (which aren't Arrow IPC files, and have no batches) are read by pyarrow.feather
+    (memory-mapped, the same way load_regression_data() reads them) and split into batches.
+
+    :param reg_data_file: Full path to the file
+    :param batch_rows: Maximum number of rows per batch of a Feather V1 file (all rows if not
+                       specified)
+
+    :return: Tuple of the pyarrow schema of the file and a generator of its record batches
+    """
+
+    try:
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(reg_data_file, "r"))
+    except pyarrow.ArrowInvalid:
+        logging.debug("[%s] is not an Arrow IPC file, reading it as a Feather V1 file",
+                      reg_data_file)
+        table = pyarrow.feather.read_table(reg_data_file, memory_map=True)
+        return table.schema, iter(table.to_batches(max_chunksize=batch_rows))
+
+    return reader.schema, (reader.get_batch(batch_num)
+                           for batch_num in range(reader.num_record_batches))
+
+
+def read_reg_data_header(reg_data_file: str,
+                         reg_data_format: str = TEXT_FORMAT) -> Tuple[str, List[str]]:
+    """
+    Reads the column names of the regression data file without reading any data rows.  For text
+    files, this reads the header line, sniffing the delimiter so that the data itself can be
+    loaded later by a fast parser with an explicit separator.  For columnar files, this reads the
+    schema.
+
+    :param reg_data_file: Full path to the regression data file
+    :param reg_data_format: Format of the file (one of REG_DATA_FORMATS other than AUTO_FORMAT)
+
+    :return: Tuple of the separator to pass to the parser (None for columnar formats) and the
+             list of column names
+    """
+
+    if reg_data_format == PARQUET_FORMAT:
+        return None, pyarrow.parquet.read_schema(reg_data_file, memory_map=True).names
+    if reg_data_format in (FEATHER_FORMAT, ARROW_FORMAT):
+        return None, _open_ipc_file(reg_data_file)[0].names
+
+    with open(reg_data_file, "r", newline="") as data_file:
+        header_line = data_file.readline().rstrip("\r\n")
+
+    # Determine the delimiter the same way the python parser engine would (if that fails, as it
+    # does for a single column, fall back to whitespace)
+    try:
+        delimiter = csv.Sniffer().sniff(header_line, delimiters=CANDIDATE_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = " "
+
+    # Space-delimited files are parsed on runs of whitespace
+    if delimiter == " ":
+        return WHITESPACE_SEP, header_line.split()
+
+    return delimiter, next(csv.reader([header_line], delimiter=delimiter))
+
+
+def determine_reg_data_usecols(iargs: InternalNamespace) -> List[str]:
+    """
+    Determines the (de-duplicated) list of regression data file columns needed by this run
+
+    :param iargs: Internal namespace holding the resolved column lists
+
+    :return: List of column names, in the order they appear in the file
+    """
+
+    needed = set(iargs.outcome + iargs.pgi_var + iargs.pgi_pheno_var + iargs.covariates +
+                 iargs.pgi_interact_vars + iargs.weights + iargs.id_col +
+                 getattr(iargs, "categorical", []) + getattr(iargs, "absorb", []))
+
+    return [col for col in iargs.reg_data_columns if col in needed]
+
+
+def _get_csv_engine(sep: str) -> str:
+    """
+    Determines the fastest parser available for the given separator.  The pyarrow parser is
+    multi-threaded, but needs pyarrow to be installed and a single-character separator.
+    Otherwise, the pandas C engine is used.
+
+    :param sep: Separator of the regression data file
+
+    :return: Name of the parser engine to use ("pyarrow" or "c")
+    """
+
+    return "pyarrow" if pyarrow and len(sep) == 1 else "c"
+
+
+def reg_data_float_dtype(iargs: InternalNamespace) -> np.dtype:
+    """
+    Determines the type in which the numeric columns of the regression data are stored
+
+    :param iargs: Internal namespace holding the parsed user inputs
+
+    :return: np.float32 for --precision float32, np.float64 otherwise
+    """
+
+    return np.float32 if getattr(iargs, "precision", PRECISION_FLOAT64) == PRECISION_FLOAT32 \
+        else np.float64
+
+
+def reg_data_string_cols(iargs: InternalNamespace) -> List[str]:
+    """
+    Determines the regression data columns that are read as strings (IDs and the categorical
+    variables that are expanded into dummies or whose fixed effects are absorbed) rather than
+    floats
+
+    :param iargs: Internal namespace holding the resolved column lists
+
+    :return: List of column names
+    """
+
+    return iargs.id_col + getattr(iargs, "categorical", []) + getattr(iargs, "absorb", [])
+
+
+def _cast_reg_data_table(table: Any, iargs: InternalNamespace) -> pd.DataFrame:
+    """
+    Casts a pyarrow Table of regression data to the expected types (ID and categorical columns as
+    strings, all others as floats of the --precision) and converts it to a DataFrame
+
+    :param table: pyarrow Table holding the projected regression data
+    :param iargs: Internal namespace holding the resolved column lists
+
+    :return: DataFrame holding the projected regression data
+    """
+
+    string_cols = reg_data_string_cols(iargs)
+    float_type = pyarrow.from_numpy_dtype(reg_data_float_dtype(iargs))
+    target_schema = pyarrow.schema([
+        (col, pyarrow.string() if col in string_cols else float_type)
+        for col in table.schema.names])
+
+    return table.cast(target_schema).to_pandas()
+
+
+def iter_regression_data_batches(iargs: InternalNamespace, batch_rows: int = DEFAULT_BATCH_ROWS):
+    """
+    Streams the needed columns of the regression data file in batches of rows.  Parquet files
+    are read one row group at a time and Arrow IPC / Feather files are memory-mapped, so only
+    the current batch is held in memory.
+
+    :param iargs: Internal namespace holding the file path, format, and resolved column lists
+    :param batch_rows: Maximum number of rows per batch (text, Parquet, and Feather V1 formats)
+
+    :return: Generator of DataFrames holding consecutive batches of the projected data
+    """
+
+    usecols = determine_reg_data_usecols(iargs)
+    string_cols = reg_data_string_cols(iargs)
+
+    if iargs.reg_data_format == PARQUET_FORMAT:
+        parquet_file = pyarrow.parquet.ParquetFile(iargs.reg_data_file, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=usecols):
+            yield _cast_reg_data_table(pyarrow.Table.from_batches([batch]), iargs)
+
+    elif iargs.reg_data_format in (FEATHER_FORMAT, ARROW_FORMAT):
+        for batch in _open_ipc_file(iargs.reg_data_file, batch_rows)[1]:
+            yield _cast_reg_data_table(pyarrow.Table.from_batches([batch]).select(usecols), iargs)
+
+    else:
+        dtypes = {col : (str if col in string_cols else reg_data_float_dtype(iargs))
+                  for col in usecols}
+        yield from pd.read_csv(iargs.reg_data_file, sep=iargs.reg_data_sep, usecols=usecols,
+                               dtype=dtypes, engine="c", chunksize=batch_rows)
+
+
+def load_regression_data(iargs: InternalNamespace, usecols: List[str] = None) -> pd.DataFrame:
+    """
+    Reads the columns of the regression data file needed by this run (ID and categorical columns
+    as strings, all others as floats of the --precision) using the format, separator, and column
+    list found during validation
+
+    :param iargs: Internal namespace holding the file path, format, and resolved column lists
+    :param usecols: Columns to read, in file order (defaults to the columns needed by this run)
+
+    :return: DataFrame holding the projected regression data
+    """
+
+    usecols = usecols if usecols else determine_reg_data_usecols(iargs)
+    string_cols = reg_data_string_cols(iargs)
+
+    # Columnar formats are projected and memory-mapped by pyarrow
+    if iargs.reg_data_format == PARQUET_FORMAT:
+        logging.debug("Reading %s of %s columns from Parquet file [%s]", len(usecols),
+                      len(iargs.reg_data_columns), iargs.reg_data_file)
+        return _cast_reg_data_table(pyarrow.parquet.read_table(
+            iargs.reg_data_file, columns=usecols, memory_map=True), iargs)
+    if iargs.reg_data_format in (FEATHER_FORMAT, ARROW_FORMAT):
+        logging.debug("Reading %s of %s columns from Arrow IPC / Feather file [%s]", len(usecols),
+                      len(iargs.reg_data_columns), iargs.reg_data_file)
+        return _cast_reg_data_table(pyarrow.feather.read_table(
+            iargs.reg_data_file, columns=usecols, memory_map=True), iargs)
+
+    engine = _get_csv_engine(iargs.reg_data_sep)
+    logging.debug("Reading %s of %s columns from [%s] using the %s parser engine",
+                  len(usecols), len(iargs.reg_data_columns), iargs.reg_data_file, engine)
+
+    if engine == "pyarrow":
+        float_type = pyarrow.from_numpy_dtype(reg_data_float_dtype(iargs))
+        col_types = {col : (pyarrow.string() if col in string_cols else float_type)
+                     for col in usecols}
+        table = pyarrow.csv.read_csv(
+            iargs.reg_data_file,
+            parse_options=pyarrow.csv.ParseOptions(delimiter=iargs.reg_data_sep),
+            convert_options=pyarrow.csv.ConvertOptions(include_columns=usecols,
+                                                       column_types=col_types,
+                                                       strings_can_be_null=True))
+        return table.to_pandas()
+
+    dtypes = {col : (str if col in string_cols else reg_data_float_dtype(iargs))
+              for col in usecols}
+    return pd.read_csv(iargs.reg_data_file, sep=iargs.reg_data_sep, usecols=usecols,
+                       dtype=dtypes, engine=engine)
+
+
 def validate_regression_data_columns(user_args: Dict[str, str], parsed_args: argparse.Namespace,
                                      settings: InternalNamespace):
     """
@@ -433,19 +998,24 @@ def validate_regression_data_columns(user_args: Dict[str, str], parsed_args: arg
                 "weights" : False,
                 "id_col" : settings.jk_se,
                 "pgi_interact_vars" : False,
-                "covariates" : True}
+                "covariates" : True,
+                "categorical" : False,
+                "absorb" : False}
     if "weights" in user_args:
         settings.weights = [settings.weights]
 
-    # Read the first line of the file to get column names
-    first_line_of_reg_data = pd.read_csv(parsed_args.reg_data_file, sep=None,
-                                         engine='python', nrows=1)
-    file_columns = set(first_line_of_reg_data.columns)
+    # Read the header / schema of the file once (no data rows) to get column names
+    settings.reg_data_format = determine_reg_data_format(parsed_args.reg_data_file,
+                                                         parsed_args.reg_data_format)
+    settings.reg_data_sep, settings.reg_data_columns = read_reg_data_header(
+        parsed_args.reg_data_file, settings.reg_data_format)
+    file_columns = set(settings.reg_data_columns)
     logging.debug("Found the following columns in regression data: %s\n", file_columns)
 
 
-    # Determine actual interaction and covariate column lists and record them to internal namespace
-    for coltype in ["pgi_interact_vars", "covariates"]:
+    # Determine actual interaction, covariate, categorical, and absorbed column lists and record
+    # them to internal namespace
+    for coltype in ["pgi_interact_vars", "covariates", "categorical", "absorb"]:
         pargs_val = getattr(parsed_args, coltype)
         if getattr(parsed_args, coltype):
             try:
@@ -455,6 +1025,43 @@ def validate_regression_data_columns(user_args: Dict[str, str], parsed_args: arg
                 logging.error("Error matching columns for %s", to_flag(coltype))
                 raise
 
+    # Determine the actual outcome column(s), in file order
+    try:
+        outcomes = set(determine_col_names_from_input(parsed_args.outcome, file_columns,
+                                                      parsed_args.force))
+    except:
+        logging.error("Error matching columns for --outcome")
+        raise
+    settings.outcome = [col for col in settings.reg_data_columns if col in outcomes]
+
+    # Determine the actual PGI column(s), in file order
+    try:
+        pgi_vars = set(determine_col_names_from_input(parsed_args.pgi_var, file_columns,
+                                                      parsed_args.force))
+    except:
+        logging.error("Error matching columns for --pgi-var")
+        raise
+    settings.pgi_var = [col for col in settings.reg_data_columns if col in pgi_vars]
+
+    # A PGI scan needs h^2 for each PGI and a specification without PGI-specific columns
+    if len(settings.pgi_var) > 1:
+        logging.info("Scanning %s PGIs", len(settings.pgi_var))
+        if not (parsed_args.h2 or parsed_args.pgi_table):
+            raise ValueError("A PGI scan needs either --h2 or --pgi-table.")
+        if parsed_args.pgi_interact_vars or len(settings.outcome) > 1:
+            raise ValueError("A PGI scan cannot be combined with --pgi-interact-vars or "
+                             "multiple outcomes.")
+    elif parsed_args.pgi_table:
+        raise ValueError("The --pgi-table flag is only used when scanning multiple PGIs.")
+
+    # With multiple outcomes, R^2 must come from a single PGI phenotype
+    if len(settings.outcome) > 1:
+        logging.info("Correcting the specification for %s outcomes: %s", len(settings.outcome),
+                     settings.outcome)
+        if not (parsed_args.pgi_pheno_var or parsed_args.R2):
+            raise ValueError("With more than one outcome, either --pgi-pheno-var or --R2 must be "
+                             "specified.")
+
     # Set pgi pheno var to outcome if not set already (and then disregard, just check outcome)
     if not parsed_args.pgi_pheno_var:
         settings.pgi_pheno_var = settings.outcome
@@ -516,6 +1123,8 @@ def validate_regression_data_columns(user_args: Dict[str, str], parsed_args: arg
     # Log the covariates and interact columns found, depending on log level
     logging.debug("Identified the following covariate columns: %s", settings.covariates)
     logging.debug("Identified the following interaction columns: %s", settings.pgi_interact_vars)
+    logging.debug("Identified the following categorical columns: %s", settings.categorical)
+    logging.debug("Identified the following absorbed columns: %s", settings.absorb)
 
 
 def validate_inputs(pargs: argparse.Namespace, user_args: Dict):
@@ -539,8 +1148,9 @@ def validate_inputs(pargs: argparse.Namespace, user_args: Dict):
         setattr(settings, attr, getattr(pargs, attr))
 
     # Check if heritability calculation(s) required and which software to use
-    settings.calc_h2 = not pargs.h2
-    settings.use_gcta = settings.calc_h2 and "bolt_exec" not in user_args
+    settings.calc_h2 = not (pargs.h2 or pargs.pgi_table)
+    settings.use_gcta = settings.calc_h2 and "bolt_exec" not in user_args and \
+                        pargs.h2_method == H2_METHOD_REML
 
     # Check if GCTA commands should have stdout suppressed
     settings.quiet_h2 = pargs.logging_level != "debug"
@@ -558,6 +1168,45 @@ def validate_inputs(pargs: argparse.Namespace, user_args: Dict):
     # Check regression data column inputs
     validate_regression_data_columns(user_args, pargs, settings)
 
+    # Streaming only keeps sufficient statistics, which isn't enough for jack-knifing
+    if settings.streaming and settings.jk_se:
+        raise RuntimeError("The --jk-se flag cannot be combined with --streaming.")
+
+    # Multiple outcomes and PGI scans are only supported for in-memory point estimates
+    if len(settings.outcome) > 1 and (settings.streaming or settings.jk_se):
+        raise RuntimeError("Multiple outcomes cannot be combined with --jk-se or --streaming.")
+    if (len(settings.outcome) > 1 or len(settings.pgi_var) > 1) and (settings.h2_grid is not None
+                                                                     or settings.rho_grid is not None):
+        raise RuntimeError("Multiple outcomes and PGI scans cannot be combined with --h2-grid or "
+                           "--rho-grid.")
+    if settings.analytic_se and (settings.jk_se or len(settings.outcome) > 1 or
+                                 len(settings.pgi_var) > 1):
+        raise RuntimeError("The --analytic-se flag cannot be combined with --jk-se, multiple "
+                           "outcomes, or PGI scans.")
+    if settings.bootstrap and (settings.jk_se or settings.analytic_se or settings.streaming or
+                               len(settings.outcome) > 1 or len(settings.pgi_var) > 1):
+        raise RuntimeError("The --bootstrap flag cannot be combined with --jk-se, --analytic-se, "
+                           "--streaming, multiple outcomes, or PGI scans.")
+    if settings.absorb and (settings.streaming or settings.bootstrap or
+                            len(settings.outcome) > 1 or len(settings.pgi_var) > 1 or
+                            (settings.jk_se and settings.jk_method != JK_METHOD_REFIT)):
+        raise RuntimeError("The --absorb flag cannot be combined with --streaming, --bootstrap, "
+                           "multiple outcomes, PGI scans, or --jk-method %s." % JK_METHOD_DOWNDATE)
+    if settings.categorical and (settings.streaming or len(settings.pgi_var) > 1):
+        raise RuntimeError("The --categorical flag cannot be combined with --streaming or PGI "
+                           "scans.")
+    if len(settings.pgi_var) > 1 and (settings.streaming or settings.jk_se):
+        raise RuntimeError("A PGI scan cannot be combined with --jk-se or --streaming.")
+
+    # Reduced precision data is only handled by the (float64) cross-product based solver
+    if settings.precision == PRECISION_FLOAT32 and settings.solver != SOLVER_CHOLESKY:
+        if "solver" in user_args:
+            raise RuntimeError("The --precision %s flag needs --solver %s." %
+                               (PRECISION_FLOAT32, SOLVER_CHOLESKY))
+        logging.info("Using the %s solver for %s regression data.", SOLVER_CHOLESKY,
+                     PRECISION_FLOAT32)
+        settings.solver = SOLVER_CHOLESKY
+
     return settings
 
 
@@ -594,26 +1243,60 @@ def determine_col_names_from_input(exprs: List[str], cols: List[str], force: Any
     return list(colname_set)
 
 
-def _get_parser(progname: str) -> argparse.ArgumentParser:
+def _get_parser(progname: str, spec_file_mode: bool = False) -> argparse.ArgumentParser:
     """
     Return a parser configured for this command line utility
 
     :param prog: Value to pass to ArgumentParser for prog (should be sys.argv[0])
+    :param spec_file_mode: If True, flags that are otherwise required are optional (they can be
+                           supplied by the specifications in a --spec-file instead)
 
     :return: argparse ArgumentParser
     """
     parser = argparse.ArgumentParser(prog=progname)
+    required = not spec_file_mode
 
     ifile = parser.add_argument_group(title="Input file specifications",
                                       description="Options for input files.")
-    ifile.add_argument("--reg-data-file", metavar="FILE_PATH", type=str, required=True,
+    ifile.add_argument("--reg-data-file", metavar="FILE_PATH", type=str, required=required,
                        help="Full path to dataset where coefficients are to be corrected.  "
                             "Contains outcome, genetic data / PGI, (optional) interaction terms, "
-                            "covariates, (optional) weights, and (if needed) IDs.")
-    ifile.add_argument("--outcome", metavar="COLUMN_NAME", type=str, required=True, nargs=1,
-                       help="Name of dependent variable column in regression data file.")
-    ifile.add_argument("--pgi-var", metavar="COLUMN_NAME", type=str, required=True, nargs=1,
-                       help="Name of PGI variable column in regression data file.")
+                            "covariates, (optional) weights, and (if needed) IDs.  Can be a "
+                            "delimited text file or (if pyarrow is installed) a Parquet, "
+                            "Feather (V2), or Arrow IPC file.")
+    ifile.add_argument("--reg-data-format", type=str.lower, required=False, default=AUTO_FORMAT,
+                       choices=REG_DATA_FORMATS,
+                       help="Format of --reg-data-file.  Defaults to \"%s\", which detects "
+                            "columnar formats by file extension (%s) and otherwise assumes a "
+                            "delimited text file." %
+                            (AUTO_FORMAT, ", ".join(sorted(COLUMNAR_FORMAT_EXTENSIONS))))
+    ifile.add_argument("--outcome", metavar="COLUMN_NAME", type=str, required=required, nargs="+",
+                       help="Name of dependent variable column in regression data file.  "
+                            "Several columns (or wildcards, as with --covariates) can be "
+                            "listed to correct the same specification for each of them.  The "
+                            "design matrix is then factored once for all outcomes that are "
+                            "missing for the same individuals, and results are written to a "
+                            "separate results file per outcome (named using the --out prefix "
+                            "and the outcome).  This requires --pgi-pheno-var or --R2, and is not "
+                            "compatible with --jk-se or --streaming.")
+    ifile.add_argument("--pgi-var", metavar="COLUMN_NAME", type=str, required=required, nargs="+",
+                       help="Name of PGI variable column in regression data file.  Several "
+                            "columns (or wildcards, as with --covariates) can be listed to scan "
+                            "PGIs: each PGI is then corrected in the specification in place of "
+                            "the others, in vectorized batches, and the results are written to "
+                            "<out>.scan.parquet (or <out>.scan.tsv without pyarrow).  Scans "
+                            "need --h2 or a --pgi-table, and are not compatible with "
+                            "--pgi-interact-vars, multiple outcomes, --jk-se, or --streaming.")
+    ifile.add_argument("--pgi-table", metavar="FILE_PATH", type=str, required=False,
+                       help="Whitespace-delimited file with a header holding the h^2 (and "
+                            "optionally R^2) of each PGI in a PGI scan (columns \"%s\", \"%s\", "
+                            "and \"%s\").  Values missing here are taken from --h2 and --R2, "
+                            "and R^2 is otherwise estimated for each PGI." %
+                            (PGI_TABLE_PGI_COLUMN, PGI_TABLE_H2_COLUMN, PGI_TABLE_R2_COLUMN))
+    ifile.add_argument("--scan-batch-size", metavar="NUM_PGIS", type=int, required=False,
+                       default=DEFAULT_SCAN_BATCH_SIZE,
+                       help="Number of PGIs corrected together in a PGI scan.  Defaults to %s." %
+                            DEFAULT_SCAN_BATCH_SIZE)
     ifile.add_argument("--pgi-pheno-var", metavar="COLUMN_NAME", type=str, required=False, nargs=1,
                        default=[], help="Name of column in regression data file corresponding to "
                                         "the phenotype in the PGI.  If not specified, it is "
@@ -631,13 +1314,31 @@ def _get_parser(progname: str) -> argparse.ArgumentParser:
                                                    "functionality, so limit column characters to "
                                                    "A-Z, a-z, 0-9, _, and -.  If wildcarding is "
                                                    "used, surround each term with quotes.")
-    ifile.add_argument("--covariates", metavar="COLUMN_NAME", type=str, nargs="+", required=True,
+    ifile.add_argument("--covariates", metavar="COLUMN_NAME", type=str, nargs="+",
+                       required=required,
                        help="Column names from the regression data file of covariates to "
                             "be included in the regression (separated by spaces, like "
                             "VAR1 VAR2 VAR3).  Use \"*\" for a general wildcard and \"?\" for a "
                             "single wildcard character.  Regular expressions are used to provide "
                             "this functionality, so limit column characters to A-Z, a-z, 0-9, _, "
                             "and -.  If wildcarding is used, surround each term with quotes.")
+    ifile.add_argument("--categorical", metavar="COLUMN_NAME", type=str, nargs="+",
+                       required=False, default=[],
+                       help="Column names (wildcards as with --covariates) of categorical "
+                            "variables (integer or string codes) to be included in the "
+                            "regression as covariates.  Each is expanded into indicator columns "
+                            "named COLUMN_NAME_LEVEL for all but its first level (in numeric "
+                            "order if all levels are numbers, otherwise in lexical order), so the "
+                            "file only needs to hold the single compact column.")
+    ifile.add_argument("--absorb", metavar="COLUMN_NAME", type=str, nargs="+", required=False,
+                       default=[],
+                       help="Column names (wildcards as with --covariates) of categorical "
+                            "variables whose fixed effects are swept out of the outcome, PGI, "
+                            "interactions, and covariates (by within-transformation, alternating "
+                            "between the variables if there are several) instead of being "
+                            "included as dummy covariates.  Coefficients are only reported for "
+                            "the remaining variables.  With --jk-se, this needs --jk-method %s." %
+                            JK_METHOD_REFIT)
     ifile.add_argument("--weights", metavar="COLUMN_NAME", type=str, nargs="?", default=[],
                        help="Optional flag specifying a column name from regression data file "
                             "to be used for weighted least squares.")
@@ -667,10 +1368,24 @@ def _get_parser(progname: str) -> argparse.ArgumentParser:
     paramopts.add_argument("--R2", metavar="PARAM", type=float, required=False,
                            help="Option to specify the R^2 from the regression of the PGI on its "
                            "corresponding phenotype.  If not specified, it will be calculated.")
+    paramopts.add_argument("--h2-se", metavar="PARAM", type=float, required=False,
+                           help="Standard error of the --h2 value, used by --analytic-se.  If "
+                                "not specified, the --h2 value is treated as known.")
+    grid = paramopts.add_mutually_exclusive_group()
+    grid.add_argument("--h2-grid", metavar="VALUE", type=str, required=False, nargs="+",
+                      help="Also correct the coefficients for each of these h^2 values (a list, or "
+                           "START%sSTOP%sNUM for NUM evenly spaced values) using the same "
+                           "uncorrected regression and R^2, to show how sensitive the corrected "
+                           "coefficients are to h^2.  The results are written to <out>.grid.tsv." %
+                           (GRID_RANGE_SEPARATOR, GRID_RANGE_SEPARATOR))
+    grid.add_argument("--rho-grid", metavar="VALUE", type=str, required=False, nargs="+",
+                      help="Same as --h2-grid, but for values of rho itself.")
     paramopts.add_argument("--grm-cutoff", metavar="PARAM", type=float, required=False,
                            default=.025, help="Relatedness cutoff for heritability estimation.  "
-                                              "Used when heritability is calculated.  "
-                                              "Defaults to 0.025.")
+                                              "Used when heritability is calculated with a GRM, "
+                                              "which is pruned once before any estimation (and "
+                                              "the jack knife blocks then split the individuals "
+                                              "kept in it evenly).  Defaults to 0.025.")
 
     h2software = parser.add_mutually_exclusive_group()
     h2software.add_argument("--gcta-exec", metavar="FILE_PATH", type=str, required=False,
@@ -704,10 +1419,48 @@ def _get_parser(progname: str) -> argparse.ArgumentParser:
                         help="Optional argument to pass full prefix (directory included) of a "
                              "pre-constructed GRM for GCTA heritability estimation "
                              "(does not include .grm.bin, .grm.ID, .grm.N suffixes).")
+    h2opts.add_argument("--grm-sparse", metavar="FILE_PREFIX", type=str, required=False,
+                        help="Full prefix (directory included) of a pre-constructed sparse GRM "
+                             "(.grm.sp and .grm.id files, as written by GCTA's "
+                             "--make-bK-sparse) to use instead of --grm or --bfile with "
+                             "--h2-method %s.  Its memory use and the work of each jack knife "
+                             "iteration scale with the number of related pairs rather than the "
+                             "square of the sample size.  --grm-cutoff isn't applied to it." %
+                             H2_METHOD_REML_EIGEN)
+    h2opts.add_argument("--sparse-grm-cutoff", metavar="PARAM", type=float, required=False,
+                        help="With --h2-method %s and --grm or --bfile, threshold the GRM into a "
+                             "sparse GRM (see --grm-sparse) that keeps only relatedness values "
+                             "above this cutoff (GCTA's --make-bK-sparse uses 0.05), instead of "
+                             "applying --grm-cutoff." % H2_METHOD_REML_EIGEN)
     h2opts.add_argument("--bfile", metavar="FILE_PREFIX", type=str, required=False,
                         help="Full prefix (directory included) of bed/bim/fam files to use in "
                              "heritability calculation "
                              "(does not include .bed, .bim, .fam suffixes)")
+    h2opts.add_argument("--h2-method", type=str.lower, required=False, default=H2_METHOD_REML,
+                        choices=H2_METHODS,
+                        help="Heritability estimation method.  \"%s\" (the default) runs REML in "
+                             "GCTA or BOLT.  \"%s\" runs REML in this process on the "
+                             "eigendecomposed --grm (built in-process from --bfile if need be), "
+                             "caching the eigendecomposition next to the GRM files so each "
+                             "further phenotype is a one-dimensional likelihood search.  \"%s\" "
+                             "uses randomized Haseman-Elston regression in this process, "
+                             "streaming the --bfile genotypes a block of SNPs at a time without "
+                             "ever forming the GRM (so it scales to very large samples), and "
+                             "estimates all jack knife iterations in a single pass over the "
+                             "genotypes (it doesn't apply --grm-cutoff).  The in-process methods "
+                             "need a GCTA-style --pheno-file and regress out an intercept." %
+                             (H2_METHOD_REML, H2_METHOD_REML_EIGEN, H2_METHOD_RHE))
+    h2opts.add_argument("--rhe-probes", metavar="NUM", type=int, required=False,
+                        default=DEFAULT_RHE_PROBES,
+                        help="Number of random probe vectors used by --h2-method %s.  Defaults "
+                             "to %s." % (H2_METHOD_RHE, DEFAULT_RHE_PROBES))
+    h2opts.add_argument("--grm-builder", type=str.lower, required=False,
+                        default=GRM_BUILDER_GCTA, choices=GRM_BUILDERS,
+                        help="How the GRM is constructed from --bfile for GCTA heritability "
+                             "estimation.  \"%s\" (the default) runs GCTA's --make-grm.  \"%s\" "
+                             "builds it in this process from the memory-mapped .bed file (the same "
+                             "GRM as GCTA's default algorithm), a block of SNPs at a time, and "
+                             "writes it in GCTA's format." % (GRM_BUILDER_GCTA, GRM_BUILDER_NATIVE))
     h2opts.add_argument("--pheno-file", metavar="FILE_PATH", type=str, required=False,
                        help="Full path to phenotype file for heritability calculation. The "
                             "phenotype must correspond to the phenotype used in the "
@@ -715,6 +1468,17 @@ def _get_parser(progname: str) -> argparse.ArgumentParser:
                             "(https://cnsgenomics.com/software/gcta/#GREMLanalysis) and BOLT "
                             "specifications (https://alkesgroup.broadinstitute.org/BOLT-LMM/downloads/BOLT-LMM_v2.3.4_manual.pdf) "
                             "depending on which software you want used.")
+    h2opts.add_argument("--h2-cache", metavar="DIR", type=str, required=False,
+                        help="Directory of a persistent cache of heritability estimates.  "
+                             "Estimates (full sample and jack knife blocks) are looked up by a "
+                             "hash of the contents of their inputs (software, GRM or bfile, "
+                             "phenotype file and column, GRM cutoff, and removed individuals), "
+                             "so re-running a specification skips the REML estimation.")
+    h2opts.add_argument("--h2-cache-max-mb", metavar="MB", type=int, required=False,
+                        default=DEFAULT_H2_CACHE_MAX_MB,
+                        help="Maximum size of the --h2-cache directory in megabytes.  The least "
+                             "recently used estimates are evicted when it is exceeded.  Defaults "
+                             "to %s." % DEFAULT_H2_CACHE_MAX_MB)
     h2opts.add_argument("--pheno-file-pheno-col", metavar="COLUMN_NAME", type=str, required=False, default="PHENOTYPE",
                         help="Column name in --pheno-file that corresponds to the phenotype, if you are "
                              "using BOLT to estimate heritability. ")
@@ -724,9 +1488,44 @@ def _get_parser(progname: str) -> argparse.ArgumentParser:
                                        description="Jack knife SE flags.")
     jkopts.add_argument("--jk-se", required=False, action="store_true", help="Calculate jack-"
                         "knife standard errors for R^2, h^2, rho, and corrected alphas.")
+    jkopts.add_argument("--analytic-se", required=False, action="store_true",
+                        help="Calculate standard errors for R^2, rho, and corrected alphas with "
+                             "the delta method instead of jack-knifing, propagating the h^2 "
+                             "standard error reported by GCTA/BOLT (or --h2-se) and the large "
+                             "sample variance of R^2 through rho and the correction matrix.  "
+                             "Needs a single h^2 estimation instead of one per jack-knife block.")
+    jkopts.add_argument("--bootstrap", metavar="NUM_REPLICATES", required=False, type=int,
+                        help="Calculate standard errors for R^2, rho, and the coefficients from "
+                             "this many bootstrap replicates that reweight the observations "
+                             "(instead of resampling them), all calculated together from one "
+                             "pass over the data.  h^2 is held fixed at its --h2 value or "
+                             "full-sample estimate.")
+    jkopts.add_argument("--bootstrap-method", required=False, type=str.lower,
+                        default=BOOTSTRAP_BAYESIAN, choices=BOOTSTRAP_METHODS,
+                        help="Observation weights of the --bootstrap replicates: \"%s\" (the "
+                             "default) uses flat Dirichlet weights and \"%s\" uses Poisson(1) "
+                             "weights." % (BOOTSTRAP_BAYESIAN, BOOTSTRAP_MULTIPLIER))
+    jkopts.add_argument("--bootstrap-seed", metavar="SEED", required=False, type=int,
+                        help="Seed of the random number generator of --bootstrap.")
     jkopts.add_argument("--num-blocks", required=False, type=int, default=DEFAULT_NUM_JK_BLOCKS,
                         help="Number of blocks to use for jack-knifing.  "
                              "Defaults to %s if not specified."  % DEFAULT_NUM_JK_BLOCKS)
+    jkopts.add_argument("--jk-method", required=False, type=str.lower, default=JK_METHOD_DOWNDATE,
+                        choices=JK_METHODS,
+                        help="How the estimates of each jack knife iteration are calculated.  "
+                             "\"%s\" (the default) calculates the moments of each block once "
+                             "and removes them from the full-data moments to get every "
+                             "iteration's estimates together.  \"%s\" re-runs the full "
+                             "procedure on each restricted dataset." %
+                             (JK_METHOD_DOWNDATE, JK_METHOD_REFIT))
+    jkopts.add_argument("--jk-workers", required=False, type=int, default=1,
+                        help="Number of worker processes used to run the jack knife iterations "
+                             "in parallel when --jk-method is \"%s\".  Results are identical "
+                             "to a serial run.  Defaults to 1." % JK_METHOD_REFIT)
+    jkopts.add_argument("--h2-jobs", required=False, type=int, default=1,
+                        help="Number of leave-one-block-out heritability estimations (GCTA jobs) "
+                             "to run simultaneously when h^2 is estimated.  The --num-threads "
+                             "budget is split evenly between them.  Defaults to 1.")
     jkopts.add_argument("--id-col", required=False, nargs="*", metavar="COLUMN_NAME", default=[],
                         help="Column name(s) in regression data corresponding to person-level ID."
                              "This ID field must also correspond to the ID's in your "
@@ -735,6 +1534,20 @@ def _get_parser(progname: str) -> argparse.ArgumentParser:
 
     controlopts = parser.add_argument_group(title="Control options",
                                             description="Flags related to program execution")
+    controlopts.add_argument("--spec-file", metavar="FILE_PATH", type=str, required=False,
+                             help="Run many specifications in one process.  The file (JSON or "
+                                  "YAML list of objects, or tab-separated text with a header "
+                                  "row) holds one specification per entry / row, mapping flag "
+                                  "names (e.g. outcome, pgi-var, covariates, pgi-interact-vars, "
+                                  "weights, output-vars, out) to values.  Flags on the command "
+                                  "line apply to every specification unless a specification "
+                                  "overrides them.  Each regression data file is read once, and "
+                                  "GRMs and h^2 estimates are shared between specifications.  "
+                                  "In text files, separate multiple values with spaces and use "
+                                  "true / false for flags without values.")
+    controlopts.add_argument("--spec-workers", required=False, type=int, default=1,
+                             help="Number of worker processes used to run the specifications of "
+                                  "a --spec-file.  Defaults to 1.")
     controlopts.add_argument("--force", required=False, action="store_true",
                              help="Flag that causes the program to continue executing past many "
                                   "situations that ordinarily cause it to halt (e.g. specifying "
@@ -749,6 +1562,39 @@ def _get_parser(progname: str) -> argparse.ArgumentParser:
                                   "level is the default and is recommended if you are confident "
                                   "in your specification.  Lastly, \"warn\" will print sparsely, "
                                   "only if something problematic is identified.")
+    controlopts.add_argument("--solver", required=False, type=str.lower,
+                             default=SOLVER_MOMENTS, choices=SOLVERS,
+                             help="Least squares solver used for the uncorrected regression and "
+                                  "R^2.  With \"%s\" (the default), the in-memory procedure "
+                                  "works from one pass of cross-products over the data, falling "
+                                  "back to statsmodels if the independent variables are nearly "
+                                  "collinear.  \"%s\" always uses statsmodels.  \"%s\" and "
+                                  "\"%s\" solve directly with LAPACK (Cholesky factorization of "
+                                  "X'X, or the slower but more numerically robust QR "
+                                  "factorization of X), which avoids statsmodels' per-fit "
+                                  "overhead.  \"%s\" always works from the cross-products." %
+                                  (SOLVER_MOMENTS, SOLVER_STATSMODELS, SOLVER_CHOLESKY,
+                                   SOLVER_QR, SOLVER_CHOLESKY))
+    controlopts.add_argument("--precision", required=False, type=str.lower,
+                             default=PRECISION_FLOAT64, choices=PRECISIONS,
+                             help="Precision in which the regression data is stored.  \"%s\" "
+                                  "halves the memory used by the data, while sums, means, and "
+                                  "cross-products are still accumulated in float64 (a block of "
+                                  "rows at a time), so the only extra error comes from rounding "
+                                  "each stored value to a relative precision of about 6e-8 "
+                                  "(results typically agree with \"%s\" (the default) to about "
+                                  "1e-6 relative, more for ill-conditioned designs).  Needs the "
+                                  "\"%s\" solver, which is used by default with this option." %
+                                  (PRECISION_FLOAT32, PRECISION_FLOAT64, SOLVER_CHOLESKY))
+    controlopts.add_argument("--streaming", required=False, action="store_true",
+                             help="Stream the regression data file in chunks (see --chunk-rows) "
+                                  "instead of loading it into memory.  Only the sufficient "
+                                  "statistics of the regression are kept, so memory use does not "
+                                  "grow with the number of rows.  Results are the same as without "
+                                  "this flag.")
+    controlopts.add_argument("--chunk-rows", required=False, type=int, default=DEFAULT_BATCH_ROWS,
+                             help="Number of rows per chunk when --streaming is specified.  "
+                                  "Defaults to %s." % DEFAULT_BATCH_ROWS)
     controlopts.add_argument("--num-threads", required=False, type=int, default=1,
                              help="Optional flag to specify the number of threads for GCTA operations."
                                   "Encouraged for GCTA/BOLT operations over large datasets. As a rule of "
@@ -831,7 +1677,8 @@ def get_user_inputs(argv: List[str], parsed_args: argparse.Namespace) -> str:
 
 
 def estimate_h2(iargs: InternalNamespace, gcta_exec: str, pheno_file: str, temp_dir: str, grm_cutoff: float,
-                grm_prefix: str, num_threads: int, suppress_stdout: Any = None) -> float:
+                grm_prefix: str, num_threads: int, suppress_stdout: Any = None,
+                out_name: str = "h2est") -> float:
     """
     Use GCTA to estimate SNP h^2, assumes GRM is available
 
@@ -839,22 +1686,28 @@ def estimate_h2(iargs: InternalNamespace, gcta_exec: str, pheno_file: str, temp_
     :param gcta_exec: Full path to GCTA executable
     :param pheno_file: Full path to phenotypic file.
     :param temp_dir: Full path to temporary directory to use for GCTA results
-    :param grm_cutoff: Relatedness cutoff
+    :param grm_cutoff: Relatedness cutoff (None if it has already been applied to the GRM)
     :param grm_prefix: Full prefix of GRM files
     :param num_threads: Number of threads for GCTA.
     :param suppress_stdout: If not False-ish, routes GCTA stdout to /dev/null
+    :param out_name: Name (within temp_dir) of the output files of the estimation
 
     :return: GCTA estimate of heritability
     """
 
     # Call GCTA to have it estimate heritability
     logging.info("\nEstimating heritability using %s..." % iargs.software)
-    full_h_prefix = temp_dir + "/h2est"
+    full_h_prefix = temp_dir + "/" + out_name
     hlog_filename = full_h_prefix + ".log"
     if iargs.use_gcta:
-        cmd_str = "%s --grm %s --pheno %s --reml --grm-cutoff %s --out %s --threads %s" \
-                  % (gcta_exec, grm_prefix, pheno_file, grm_cutoff, full_h_prefix, num_threads)
-        _log_and_run_os_cmd(cmd_str, suppress_stdout)
+        cmd_str = "%s --grm %s --pheno %s --reml%s --out %s --threads %s" \
+                  % (gcta_exec, grm_prefix, pheno_file,
+                     "" if grm_cutoff is None else " --grm-cutoff %s" % grm_cutoff, full_h_prefix,
+                     num_threads)
+        exit_status = _log_and_run_os_cmd(cmd_str, suppress_stdout)
+        if exit_status:
+            raise RuntimeError("GCTA heritability estimation failed with exit status %s, see %s" %
+                               (exit_status, hlog_filename))
     else:
         cmd_str = "%s --reml --phenoFile=%s --phenoCol=%s --numThreads=%s --bfile=%s --maxModelSnps=2000000" \
                   % (iargs.bolt_exec, pheno_file, iargs.pheno_file_pheno_col, num_threads, iargs.bfile)
@@ -865,404 +1718,3140 @@ def estimate_h2(iargs: InternalNamespace, gcta_exec: str, pheno_file: str, temp_
 
     # Scan the log file(s) to retrieve the value
     with open(hlog_filename, "r") as logfile:
-        for line in logfile:
-            if iargs.use_gcta:
-                if "V(G)/Vp" in line:
-                    heritability = float(line.split("\t")[1])
-                    logging.debug("Estimated GCTA heritability of the trait is %f", heritability)
-                    return heritability
-            else:
-                if "h2g (1,1):" in line:
-                    heritability = line.split(":")[1].split(" ")[1]
-                    logging.debug("Estimated BOLT heritability of the trait is %f", heritability)
-                    return heritability
+        heritability, _ = parse_h2_log(logfile, iargs.use_gcta, hlog_filename)
+    logging.debug("Estimated %s heritability of the trait is %f", iargs.software, heritability)
 
-    raise LookupError("Could not find heritability in logfile: " + hlog_filename)
+    return heritability
 
 
-def _log_and_run_os_cmd(cmd_str: str, suppress_stdout: Any = None):
+def parse_h2_log(log_lines: Iterable[str], use_gcta: bool, log_name: str) -> Tuple[float, float]:
     """
-    Function to run something from the command line (after logging the command)
+    Retrieves the heritability estimate and its standard error from the log of GCTA or BOLT
 
-    :param cmd_str: The command to run
-    :param suppress_stdout: If not False-ish, send command std output to /dev/null
+    :param log_lines: Lines of the log
+    :param use_gcta: Whether the log is from GCTA (otherwise it is from BOLT)
+    :param log_name: Name of the log (for error messages)
+
+    :return: Tuple of the estimate of h^2 and its standard error (None if it isn't in the log)
     """
-    if suppress_stdout:
-        cmd_str = cmd_str + " >/dev/null"
-    logging.debug(format_os_cmd(cmd_str.split()))
-    os.system(cmd_str)
 
+    for line in log_lines:
+        if use_gcta:
+            if "V(G)/Vp" in line:
+                fields = line.split("\t")
+                return float(fields[1]), float(fields[2]) if len(fields) > 2 else None
+        else:
+            if "h2g (1,1):" in line:
+                fields = line.split(":")[1].split()
+                return float(fields[0]), float(fields[1].strip("()")) if len(fields) > 1 else None
 
-def build_grm(gcta_exec: str, bfile_full_prefix: str, grm_dir: str, num_threads: int,
-              suppress_stdout: Any = None) -> str:
-    """
-    Function to build GRM using GCTA.
+    raise LookupError("Could not find heritability in logfile: " + log_name)
 
-    :param gcta_exec: Full path to GCTA executable
-    :param bfile_full_prefix: Full prefix of bed/bim/fam files.
-    :param grm_dir: Directory in which to place GRM files
-    :param num_threads: Number of threads for GCTA operation.
-    :param suppress_stdout: If not False-ish, sends GCTA std output to /dev/null
 
-    :return: Full prefix of GRM files
+def estimate_full_sample_h2(iargs: InternalNamespace) -> float:
     """
+    Estimates h^2 over the full sample, serving it from the heritability cache if possible
 
-    # Determine full path prefix for the GRM
-    grm_full_prefix = "%s/%s" % (grm_dir, DEFAULT_SHORT_PREFIX)
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
 
-    # Direct GCTA to create the matrix
-    cmd_str = "%s --bfile %s --make-grm --out %s --threads %s" %\
-              (gcta_exec, bfile_full_prefix, grm_full_prefix, num_threads)
-    _log_and_run_os_cmd(cmd_str, suppress_stdout)
+    :return: Estimate of h^2
+    """
 
-    return grm_full_prefix
+    # Estimates already made by this process (e.g. for another specification) are reused
+    memo_key = full_sample_h2_key(iargs)
+    h2_method = getattr(iargs, "h2_method", H2_METHOD_REML)
+    if memo_key not in _full_sample_h2s and h2_method == H2_METHOD_RHE:
+        _full_sample_h2s[memo_key] = (rhe_h2_estimates(iargs, [None])[0], None)
+    elif memo_key not in _full_sample_h2s and h2_method == H2_METHOD_REML_EIGEN:
+        _full_sample_h2s[memo_key] = reml_eigen_h2_estimates(iargs, [None])[0]
+    elif memo_key not in _full_sample_h2s:
+        cache_key = h2_cache_key(iargs)
+        entry = load_cached_h2_entry(iargs, cache_key)
+        if entry is None:
+            h2 = estimate_h2(iargs, iargs.gcta_exec, iargs.pheno_file, iargs.temp_dir,
+                             iargs.grm_cutoff, iargs.grm, iargs.num_threads, iargs.quiet_h2)
+            log_filename = iargs.temp_dir + "/h2est.log"
+            store_cached_h2(iargs, cache_key, h2, log_filename)
+            with open(log_filename, "r") as logfile:
+                _, h2_se = parse_h2_log(logfile, iargs.use_gcta, log_filename)
+        else:
+            h2 = entry["h2"]
+            _, h2_se = parse_h2_log(entry["log"].splitlines(), iargs.use_gcta, cache_key)
+        _full_sample_h2s[memo_key] = (h2, h2_se)
 
+    return _full_sample_h2s[memo_key][0]
 
 
-def estimate_R2(data: pd.DataFrame, pheno: List[str], pgi: List[str]) -> float:
+def full_sample_h2_se(iargs: InternalNamespace) -> float:
     """
-    Returns the R^2 from the regression of phenotype on PGI for the phenotype corresponding to the
-    PGI.
+    Retrieves the standard error of the full sample h^2 estimate (see estimate_full_sample_h2())
+    reported by the software that estimated it
 
-    :param data: Pandas DataFrame containing phenotype and PGI.
-    :param pheno: List containing column name in data corresponding to phenotype.
-    :param pgi: List containing column name in data corresponding to PGI.
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
 
-    :return: R^2 from regression of phenotype on PGI.
+    :return: Standard error of h^2, or None if the software didn't report one
     """
 
-    reg = sm.OLS(data[pheno], data[pgi + CONS_COLS])
-    rsq = reg.fit().rsquared
-
-    return rsq
+    estimate_full_sample_h2(iargs)
+    return _full_sample_h2s[full_sample_h2_key(iargs)][1]
 
 
-def adjust_regression_data(orig_reg_data: pd.DataFrame, iargs: InternalNamespace) -> pd.DataFrame:
+def full_sample_h2_key(iargs: InternalNamespace) -> Tuple:
     """
-    Performs fixes (not necessarily in this order):
-        1) Add a constant to the dataset.
-        2) Check for low variance columns.
-        3) Remove NaN's.
-        4) Standardize PGI
-        5) Generate interaction columns
-        6) Rearrange column order and omit unused columns
+    Determines the inputs a full sample h^2 estimate depends on (used to avoid repeating an
+    estimation within a single process)
 
-    :param orig_reg_data: Dataframe containing raw data
-    :param iargs: Internal namespace for this software
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
 
-    :return: Regression data processed as indicated above
+    :return: Tuple of the inputs
     """
 
-    # Determine the lists of columns in the adjusted dataframe
-    # (make sure order of w's is the same as z_int)
-    iargs.z_cols = iargs.covariates
-    iargs.y_cols = iargs.outcome
-    iargs.wt_cols = iargs.weights
-    iargs.z_int_cols = iargs.pgi_interact_vars
-    interact_dict = {z_int_col : (z_int_col+"_int") for z_int_col in iargs.z_int_cols}
-    iargs.w_cols = [interact_dict[z_int_col] for z_int_col in iargs.z_int_cols]
-    iargs.G_cols = iargs.pgi_var + iargs.w_cols
-    iargs.alpha_cols = iargs.G_cols + iargs.z_cols
-
-    # Create the (blank except for column-labels) adjusted dataframe
-    reg_data_cols = iargs.alpha_cols + iargs.y_cols + CONS_COLS + iargs.wt_cols + iargs.id_col
-    reg_data = pd.DataFrame(columns=reg_data_cols)
+    h2_method = getattr(iargs, "h2_method", H2_METHOD_REML)
+    if h2_method == H2_METHOD_RHE:
+        return (iargs.software, iargs.bfile, iargs.pheno_file, iargs.rhe_probes)
+    if h2_method == H2_METHOD_REML_EIGEN:
+        return (iargs.software, iargs.grm, getattr(iargs, "grm_sparse", None), iargs.pheno_file)
+    if iargs.use_gcta:
+        return (iargs.software, iargs.gcta_exec, iargs.grm, iargs.pheno_file, iargs.grm_cutoff)
+    return (iargs.software, iargs.bolt_exec, iargs.bfile, iargs.pheno_file,
+            iargs.pheno_file_pheno_col)
 
-    # Copy y, z, and wts columns over as-is (side effect: sets the number of rows in the DF)
-    for cols in [iargs.y_cols, iargs.z_cols, iargs.wt_cols, iargs.id_col]:
-        for col in cols:
-            reg_data[col] = orig_reg_data[col].to_numpy()
 
-    # Copy the PGI to the new DF, standardizing it on the way
-    g_col_name = iargs.pgi_var[0]
-    g_mean = np.mean(orig_reg_data[g_col_name])
-    g_std = np.std(orig_reg_data[g_col_name])
-    if g_std == 0.0:
-        raise ValueError("PGI column \"%s\" has variance zero!  Unable to proceed." %
-                         g_col_name)
-    stdized_pgi_vect = (orig_reg_data[g_col_name].to_numpy() - g_mean) / g_std
-    reg_data[g_col_name] = stdized_pgi_vect
+def file_content_hash(filename: str) -> str:
+    """
+    Calculates the SHA-256 hash of a file's contents.  Hashes are remembered (for as long as the
+    file's size and modification time do not change), so each file is only read once per run.
 
-    # Generate the interaction (w) columns
-    # (multiply the correct z_int column component-wise by PGI and copy to new table)
-    for z_int_col in iargs.z_int_cols:
-        reg_data[interact_dict[z_int_col]] = np.multiply(orig_reg_data[z_int_col].to_numpy(),
-                                                         stdized_pgi_vect)
+    :param filename: Path to the file
 
-    # Set constant column (need to do that sometime after at least one other column is copied, so
-    # the number of rows is determined)
-    reg_data[CONS_COL_NAME] = 1
+    :return: Hex digest of the hash
+    """
 
-    # Drop any rows / individuals in data with NaN present as a value
-    reg_data.dropna(inplace=True)
+    file_stat = os.stat(filename)
+    memo_key = (os.path.abspath(filename), file_stat.st_size, file_stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if memo_key in _file_hashes:
+            return _file_hashes[memo_key]
 
-    # Check for 0 variance columns and raise error if any (other than CONS_COL_NAME) exist.
-    var_of_col = dict(reg_data.var())
-    zero_var_cols = {col_name for col_name in var_of_col if col_name != CONS_COL_NAME and
-                     np.isclose(var_of_col[col_name], 0.0)}
-    if zero_var_cols:
-        raise ValueError("Column(s) %s in data has/have a very low variance.  "
-                         "Please remove it to allow matrices to invert." % zero_var_cols)
+    hasher = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for data in iter(lambda: f.read(HASH_READ_BYTES), b""):
+            hasher.update(data)
 
-    return reg_data
+    with _file_hashes_lock:
+        _file_hashes[memo_key] = hasher.hexdigest()
+    return _file_hashes[memo_key]
 
 
-def se_helper(df: pd.DataFrame) -> pd.Series:
+def h2_cache_key(iargs: InternalNamespace, removed_ids: pd.DataFrame = None) -> str:
     """
-    Calculates the standard errors for a set of jack-knife runs
+    Determines the heritability cache key of an estimation: a hash of the contents of everything
+    the estimate depends on (software executable, GRM or genotype files, phenotype file and column,
+    GRM cutoff, and the individuals removed from the sample).
 
-    :param df: DataFrame where each row is a JK iteration
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param removed_ids: DataFrame holding the FID and IID of the individuals removed from the
+                        sample (if any)
 
-    :return: Series containing the JK standard errors
+    :return: Cache key, or None if the heritability cache is not being used
     """
-    num_rows = len(df.index)
-    return np.sqrt(float(num_rows - 1)) * df.std(axis=0, ddof=0)
 
+    if not iargs.h2_cache:
+        return None
 
-def jack_knife_se(iargs: InternalNamespace, reg_data: pd.DataFrame, pgic_result: InternalNamespace):
+    h2_exec = iargs.gcta_exec if iargs.use_gcta else iargs.bolt_exec
+    if h2_exec and not os.path.isfile(h2_exec):
+        h2_exec = shutil.which(h2_exec)
+    if iargs.use_gcta:
+        genetic_files = [iargs.grm + suffix for suffix in
+                         [GRM_BIN_SUFFIX, GRM_N_BIN_SUFFIX, GRM_ID_SUFFIX]]
+    else:
+        genetic_files = [iargs.bfile + suffix for suffix in [".bed", ".bim", ".fam"]]
+    removed = [] if removed_ids is None else sorted(
+        "%s\t%s" % (fid, iid) for fid, iid in removed_ids[["FID", "IID"]].astype(str).itertuples(
+            index=False))
+
+    key_contents = {
+        "software" : iargs.software,
+        "software_exec" : file_content_hash(h2_exec) if h2_exec else iargs.software,
+        "genetic_files" : [file_content_hash(f) for f in genetic_files if os.path.exists(f)],
+        "pheno_file" : file_content_hash(iargs.pheno_file),
+        "pheno_col" : None if iargs.use_gcta else iargs.pheno_file_pheno_col,
+        "grm_cutoff" : iargs.grm_cutoff if iargs.use_gcta else None,
+        "removed_ids" : hashlib.sha256("\n".join(removed).encode()).hexdigest()}
+
+    return hashlib.sha256(json.dumps(key_contents, sort_keys=True).encode()).hexdigest()
+
+
+def load_cached_h2(iargs: InternalNamespace, cache_key: str) -> float:
     """
-    1) Assign each person to a jack knife iteration.
-    2) For each iteration:
-            - restrict bfile, grm, regression data to people _not_ in block
-            - estimate R^2, h^2, rho, alpha_{corr}
-            - store results
-    3) Calculate SE's using formula
+    Looks up a heritability estimate in the heritability cache (marking the entry as recently
+    used if it is found)
 
     :param iargs: Internal namespace object that holds internal values and parsed user inputs
-    :param reg_data: Dataframe containing regression data
-    :param pgic_result: Internal namespace object that holds initial pgic results
+    :param cache_key: Key returned by h2_cache_key()
+
+    :return: Cached estimate of h^2, or None if there isn't one
     """
 
-    logging.info("Beginning jack knife estimation.")
+    entry = load_cached_h2_entry(iargs, cache_key)
+    return entry["h2"] if entry else None
 
-    # Check for a number of blocks that's too large
-    if iargs.num_blocks > reg_data.shape[0]:
-        raise ValueError("You cannot specify more jack knife blocks than there are people in "
-                         "your --reg-data-file. You specified %s blocks, and your data is %s rows" %
-                         (iargs.num_blocks, reg_data.shape[0]))
 
-    # Label iterations and duplicate ID col to make GCTA happy (if needed)
-    reg_data_shuf = reg_data.sample(frac=1).reset_index(drop=True)
-    if iargs.calc_h2:
-        reg_data_shuf["FID"] = reg_data_shuf[iargs.id_col[0]]
-        # If a second ID column is specified, use that, otherwise the two ID columns are equivalent
-        reg_data_shuf["IID"] = reg_data_shuf[iargs.id_col[1]]  if len(iargs.id_col) == 2 else \
-                               reg_data_shuf.FID
+def load_cached_h2_entry(iargs: InternalNamespace, cache_key: str) -> Dict[str, Any]:
+    """
+    Looks up an entry (the estimate of h^2 and the log it was parsed from) in the heritability
+    cache, marking it as recently used if it is found
 
-    block_size = np.ceil(reg_data_shuf.shape[0] / iargs.num_blocks)
-    reg_data_shuf["iteration"] = [int(i / block_size) for i in range(reg_data_shuf.shape[0])]
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param cache_key: Key returned by h2_cache_key()
 
-    # Gather results from each JK iteration
-    uncorr_alpha_cols = ["uncorr_" + c for c in iargs.alpha_cols]
-    corr_alpha_cols = ["corr_" + c for c in iargs.alpha_cols]
-    result_cols = ["h2", "R2", "rho"] + uncorr_alpha_cols + corr_alpha_cols
-    jk_res_table = pd.DataFrame(index=range(iargs.num_blocks), columns=result_cols)
-
-    # Run the jack knife iterations
-    for iter_num in range(iargs.num_blocks):
-        iter_result = leave_out_est(iter_num, iargs, reg_data_shuf, iargs.grm, iargs.z_cols)
-        h2_r2_rho = np.array([iter_result["h2"], iter_result["R2"], iter_result["rho"]])
-        jk_res_table.iloc[iter_num] = np.concatenate(
-            (h2_r2_rho, iter_result["alpha_uncorr"], iter_result["alpha_corr"]))
-    logging.debug("\nJack-knife result table:\n%s", jk_res_table)
+    :return: Cache entry, or None if there isn't one
+    """
 
-    # Calculate standard errors
-    se_vector = se_helper(jk_res_table)
-    logging.debug("\nJack-knife standard errors:\n%s", se_vector)
+    if not cache_key:
+        return None
 
-    # Fill in standard errors in the internal namespace object
-    pgic_result.h2_se = None if iargs.h2 else se_vector["h2"]
-    pgic_result.R2_se = None if iargs.R2 else se_vector["R2"]
-    pgic_result.rho_se = None if iargs.h2 and iargs.R2 else se_vector["rho"]
-    pgic_result.uncorrected_alphas_se = se_vector.loc[uncorr_alpha_cols]
-    pgic_result.corrected_alphas_se = se_vector.loc[corr_alpha_cols].to_numpy()
+    entry_filename = os.path.join(iargs.h2_cache, cache_key + H2_CACHE_ENTRY_SUFFIX)
+    try:
+        with open(entry_filename, "r") as entry_file:
+            entry = json.load(entry_file)
+        os.utime(entry_filename)
+    except (OSError, ValueError):
+        return None
 
+    logging.info("Using heritability estimate %s from the heritability cache (%s)",
+                 entry["h2"], entry_filename)
+    return entry
 
-def leave_out_est(iteration: int, iargs: InternalNamespace, reg_data: pd.DataFrame,
-                  grm_prefix: str, covs: List) -> Dict:
+
+def store_cached_h2(iargs: InternalNamespace, cache_key: str, h2: float, log_filename: str):
     """
-    Remove block from GRM and regression data and run estimation.  Uses temporary directory
-    indicated in iargs and assumes no responsbility for cleanup
+    Stores a heritability estimate and the log it was parsed from in the heritability cache, and
+    then evicts the least recently used entries until the cache fits within its size limit
 
-    :param iteration: Current block number of jack knife iteration.
     :param iargs: Internal namespace object that holds internal values and parsed user inputs
-    :param reg_data: DataFrame of regression data.
-    :param grm: Full prefix to GRM files
-    :param covs: Covariates in specification.
-
-    :return: Parameter estimates as a dictionary
+    :param cache_key: Key returned by h2_cache_key()
+    :param h2: Estimate of h^2
+    :param log_filename: Log file of the software that estimated h^2
+    """
+
+    if not cache_key:
+        return
+
+    with open(log_filename, "r") as logfile:
+        entry = {"h2" : float(h2), "software" : iargs.software, "log" : logfile.read()}
+
+    # Write to a temporary file and then rename it, so readers never see a partial entry
+    os.makedirs(iargs.h2_cache, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=iargs.h2_cache, suffix=".tmp",
+                                     delete=False) as entry_file:
+        json.dump(entry, entry_file)
+    os.replace(entry_file.name, os.path.join(iargs.h2_cache, cache_key + H2_CACHE_ENTRY_SUFFIX))
+
+    evict_h2_cache_entries(iargs.h2_cache, iargs.h2_cache_max_mb * 1024 * 1024)
+
+
+def evict_h2_cache_entries(cache_dir: str, max_bytes: int):
+    """
+    Removes the least recently used heritability cache entries until the total size of the
+    entries is at most max_bytes
+
+    :param cache_dir: Heritability cache directory
+    :param max_bytes: Maximum total size of the cache entries
+    """
+
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(H2_CACHE_ENTRY_SUFFIX):
+            try:
+                entry_stat = entry.stat()
+            except FileNotFoundError:  # Evicted by a concurrent job
+                continue
+            entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        logging.debug("Evicting %s from the heritability cache", path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+def _log_and_run_os_cmd(cmd_str: str, suppress_stdout: Any = None) -> int:
+    """
+    Function to run something from the command line (after logging the command)
+
+    :param cmd_str: The command to run
+    :param suppress_stdout: If not False-ish, send command std output to /dev/null
+
+    :return: Exit status of the command (0 indicates success)
+    """
+    if suppress_stdout:
+        cmd_str = cmd_str + " >/dev/null"
+    logging.debug(format_os_cmd(cmd_str.split()))
+    return os.system(cmd_str)
+
+
+def build_grm(gcta_exec: str, bfile_full_prefix: str, grm_dir: str, num_threads: int,
+              suppress_stdout: Any = None) -> str:
+    """
+    Function to build GRM using GCTA.
+
+    :param gcta_exec: Full path to GCTA executable
+    :param bfile_full_prefix: Full prefix of bed/bim/fam files.
+    :param grm_dir: Directory in which to place GRM files
+    :param num_threads: Number of threads for GCTA operation.
+    :param suppress_stdout: If not False-ish, sends GCTA std output to /dev/null
+
+    :return: Full prefix of GRM files
+    """
+
+    # Determine full path prefix for the GRM
+    grm_full_prefix = "%s/%s" % (grm_dir, DEFAULT_SHORT_PREFIX)
+
+    # Direct GCTA to create the matrix
+    cmd_str = "%s --bfile %s --make-grm --out %s --threads %s" %\
+              (gcta_exec, bfile_full_prefix, grm_full_prefix, num_threads)
+    _log_and_run_os_cmd(cmd_str, suppress_stdout)
+
+    return grm_full_prefix
+
+
+def open_bed(bfile_prefix: str) -> InternalNamespace:
+    """
+    Memory-maps a PLINK .bed file (reading the individuals from the .fam file and counting the
+    SNPs in the .bim file)
+
+    :param bfile_prefix: Full prefix of the bed/bim/fam files
+
+    :return: Object holding the IDs (DataFrame with FID and IID columns), the number of SNPs, and
+             the packed genotypes (memory-mapped 2D uint8 array with one row per SNP)
+    """
+
+    bed = InternalNamespace()
+    bed.ids = pd.read_csv(bfile_prefix + FAM_SUFFIX, sep=r"\s+", header=None, usecols=[0, 1],
+                          names=["FID", "IID"], dtype=str)
+    with open(bfile_prefix + BIM_SUFFIX, "r") as bim_file:
+        bed.num_snps = sum(1 for line in bim_file if line.strip())
+
+    with open(bfile_prefix + BED_SUFFIX, "rb") as bed_file:
+        magic = bed_file.read(len(BED_MAGIC))
+    if magic != BED_MAGIC:
+        raise ValueError("File %s is not a SNP-major PLINK .bed file." %
+                         (bfile_prefix + BED_SUFFIX))
+
+    bytes_per_snp = (len(bed.ids) + 3) // 4
+    bed.packed = np.memmap(bfile_prefix + BED_SUFFIX, dtype=np.uint8, mode="r",
+                           offset=len(BED_MAGIC), shape=(bed.num_snps, bytes_per_snp))
+
+    return bed
+
+
+def decode_bed_genotypes(packed: np.ndarray, num_individuals: int) -> np.ndarray:
+    """
+    Decodes packed PLINK genotypes using a lookup table of the genotypes in each byte value
+
+    :param packed: 2D uint8 array of packed genotypes (one row per SNP)
+    :param num_individuals: Number of individuals
+
+    :return: 2D array (individuals x SNPs) of the number of copies of the first allele (NaN where
+             missing)
+    """
+
+    genotypes = BED_BYTE_GENOTYPES[packed].reshape(packed.shape[0], -1)[:, :num_individuals]
+    return genotypes.T
+
+
+def genotype_block_size(num_individuals: int) -> int:
+    """
+    Determines how many SNPs to decode at a time so that a block holds at most
+    DEFAULT_GENOTYPE_BLOCK_ELEMENTS genotypes
+
+    :param num_individuals: Number of individuals
+
+    :return: Number of SNPs per block
+    """
+
+    return max(1, DEFAULT_GENOTYPE_BLOCK_ELEMENTS // max(1, num_individuals))
+
+
+def standardize_bed_snps(bed: InternalNamespace, snp_block_size: int = None):
+    """
+    Calculates the allele frequencies of the SNPs of a .bed file (a block of SNPs at a time) and
+    records them in bed, along with the (polymorphic) SNPs to use, in blocks
+
+    :param bed: Object returned by open_bed()
+    :param snp_block_size: Number of SNPs decoded at a time (defaults to genotype_block_size())
+    """
+
+    snp_block_size = snp_block_size if snp_block_size else genotype_block_size(len(bed.ids))
+    bed.freqs = np.concatenate([np.nanmean(decode_bed_genotypes(
+        bed.packed[start:start + snp_block_size], len(bed.ids)), axis=0, dtype=np.float64) / 2.0
+        for start in range(0, bed.num_snps, snp_block_size)]) if bed.num_snps else np.empty(0)
+    bed.scales = 2.0 * bed.freqs * (1.0 - bed.freqs)
+    used_snps = np.flatnonzero(np.isfinite(bed.scales) & (bed.scales > 0.0))
+    bed.num_used_snps = used_snps.shape[0]
+    bed.used_snp_blocks = [used_snps[start:start + snp_block_size]
+                           for start in range(0, used_snps.shape[0], snp_block_size)]
+    logging.debug("Skipping %s monomorphic SNPs", bed.num_snps - bed.num_used_snps)
+
+
+def standardized_bed_genotypes(bed: InternalNamespace, snps: np.ndarray) -> np.ndarray:
+    """
+    Decodes and standardizes the genotypes of some SNPs (see standardize_bed_snps())
+
+    :param bed: Object returned by open_bed() and processed by standardize_bed_snps()
+    :param snps: Indices of the SNPs
+
+    :return: 2D GENOTYPE_DTYPE array (individuals x SNPs) of (x - 2p) / sqrt(2p(1 - p)) (NaN
+             where missing), standardized in place
+    """
+
+    genotypes = decode_bed_genotypes(bed.packed[snps], len(bed.ids))
+    genotypes -= (2.0 * bed.freqs[snps]).astype(GENOTYPE_DTYPE)
+    genotypes *= (1.0 / np.sqrt(bed.scales[snps])).astype(GENOTYPE_DTYPE)
+    return genotypes
+
+
+def calculate_grm(bfile_prefix: str, snp_block_size: int = None) -> Tuple[
+        pd.DataFrame, np.ndarray, Union[np.ndarray, float]]:
+    """
+    Calculates the GRM of the individuals in PLINK binary files the way GCTA's --make-grm does:
+    A_jk = 1/N_jk sum_i (x_ij - 2p_i)(x_ik - 2p_i) / (2p_i(1 - p_i)), where N_jk is the number
+    of SNPs genotyped for both individuals (missing genotypes contribute nothing, and
+    monomorphic SNPs are skipped).  A first pass over the memory-mapped .bed file finds the
+    allele frequencies, and a second one accumulates the products of the standardized genotypes
+    a block of SNPs at a time (matrix products of blocks of rows, multi-threaded by BLAS).  Like
+    GCTA's, the GRM is held (and accumulated) in GENOTYPE_DTYPE, and the number-of-SNPs matrix
+    is only formed once a missing genotype is found.
+
+    :param bfile_prefix: Full prefix of the bed/bim/fam files
+    :param snp_block_size: Number of SNPs decoded and accumulated at a time (defaults to
+                           genotype_block_size())
+
+    :return: Tuple of the IDs (FID and IID), the GRM, and the number-of-SNPs matrix (or the
+             number of SNPs used if no genotypes are missing)
+    """
+
+    bed = open_bed(bfile_prefix)
+    num_individuals = len(bed.ids)
+    logging.info("Building GRM of %s individuals from %s SNPs in [%s]...", num_individuals,
+                 bed.num_snps, bfile_prefix)
+
+    # First pass: allele frequencies
+    standardize_bed_snps(bed, snp_block_size)
+
+    # Second pass: accumulate the cross-products of the standardized genotypes and the number of
+    # SNPs genotyped for each pair (a block of rows at a time, to bound the temporary products)
+    grm = np.zeros((num_individuals, num_individuals), dtype=GENOTYPE_DTYPE)
+    n_matrix = None
+    num_snps = 0
+    row_block_size = genotype_block_size(num_individuals)
+    for snps in bed.used_snp_blocks:
+        std_genotypes = standardized_bed_genotypes(bed, snps)
+        present = ~np.isnan(std_genotypes)
+        if not present.all():
+            if n_matrix is None:
+                n_matrix = np.full((num_individuals, num_individuals), num_snps,
+                                   dtype=GENOTYPE_DTYPE)
+            std_genotypes[~present] = 0.0
+            present = present.astype(GENOTYPE_DTYPE)
+        for start in range(0, num_individuals, row_block_size):
+            rows = slice(start, start + row_block_size)
+            grm[rows] += np.matmul(std_genotypes[rows], std_genotypes.T)
+            if n_matrix is not None:
+                n_matrix[rows] += snps.shape[0] if present.dtype == bool else np.matmul(
+                    present[rows], present.T)
+        num_snps += snps.shape[0]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grm /= num_snps if n_matrix is None else n_matrix
+
+    return bed.ids, grm, float(num_snps) if n_matrix is None else n_matrix
+
+
+def build_grm_native(bfile_prefix: str, grm_dir: str, snp_block_size: int = None) -> str:
+    """
+    Builds the GRM with the built-in builder (see calculate_grm()) and writes it in GCTA's binary
+    format (the equivalent of build_grm() without GCTA)
+
+    :param bfile_prefix: Full prefix of bed/bim/fam files.
+    :param grm_dir: Directory in which to place GRM files
+    :param snp_block_size: Number of SNPs decoded and accumulated at a time (defaults to
+                           genotype_block_size())
+
+    :return: Full prefix of GRM files
+    """
+
+    grm_full_prefix = "%s/%s" % (grm_dir, DEFAULT_SHORT_PREFIX)
+    ids, grm, n_matrix = calculate_grm(bfile_prefix, snp_block_size)
+    write_grm(grm_full_prefix, ids, grm, n_matrix)
+
+    return grm_full_prefix
+
+
+def read_h2_pheno_file(pheno_file: str) -> pd.DataFrame:
+    """
+    Reads a GCTA-style phenotype file (no header; FID, IID, and phenotype columns)
+
+    :param pheno_file: Full path to the phenotype file
+
+    :return: DataFrame with FID, IID, and pheno columns (missing phenotypes are NaN)
+    """
+
+    return pd.read_csv(pheno_file, sep=r"\s+", header=None, usecols=[0, 1, 2],
+                       names=["FID", "IID", "pheno"], dtype={"FID" : str, "IID" : str},
+                       na_values=PHENO_FILE_MISSING_VALUES)
+
+
+def rhe_moments(bed: InternalNamespace, pheno: np.ndarray, samples: List[np.ndarray],
+                covariates: np.ndarray = None, num_probes: int = DEFAULT_RHE_PROBES,
+                seed: int = RHE_PROBE_SEED) -> InternalNamespace:
+    """
+    Calculates the statistics of randomized Haseman-Elston regression (Wu and Sankararaman 2018)
+    for several samples of the individuals in a .bed file, without forming the GRM K = ZZ'/M (Z
+    being the standardized genotypes of the M polymorphic SNPs, with missing genotypes set to 0).
+    With P the projection removing the covariates in a sample, tr(PKP), y'PKPy, and y'Py are
+    calculated exactly and tr((PKP)^2) is estimated as the mean of |PKPu|^2 over random probe
+    vectors u.  The samples are processed in batches of at most DEFAULT_RHE_BATCH_ELEMENTS stacked
+    values (one pass over the SNPs per batch, see _rhe_batch_moments()).
+
+    :param bed: Object returned by open_bed() and processed by standardize_bed_snps()
+    :param pheno: Phenotype of each individual in the .bed file
+    :param samples: Indices of the individuals of each sample (all with a phenotype)
+    :param covariates: Optional 2D array of covariates (one row per individual in the .bed file,
+                       include a column of ones for an intercept).  Defaults to an intercept.
+    :param num_probes: Number of random probe vectors per sample
+    :param seed: Seed of the random probe vectors
+
+    :return: Object holding arrays (one value per sample) of n, tr_k (tr(PKP)), tr_k2
+             (estimated tr((PKP)^2)), ypkpy, and ypy, along with the number of covariates
+             (num_covariates)
+    """
+
+    num_individuals = len(bed.ids)
+    covariates = np.ones((num_individuals, 1)) if covariates is None else covariates
+    all_probes = np.random.default_rng(seed).standard_normal((num_individuals, num_probes))
+
+    # Each sample uses the same probe values for an individual, so its estimate doesn't depend on
+    # which other samples are estimated with it
+    batch_size = max(1, DEFAULT_RHE_BATCH_ELEMENTS // (num_individuals * (
+        num_probes + 1 + covariates.shape[1])))
+    batches = [_rhe_batch_moments(bed, pheno, samples[start:start + batch_size], covariates,
+                                  all_probes) for start in range(0, len(samples), batch_size)]
+    if len(batches) > 1:
+        logging.debug("Calculated the randomized Haseman-Elston statistics in %s batches",
+                      len(batches))
+
+    moments = InternalNamespace()
+    moments.num_covariates = covariates.shape[1]
+    for stat_name in ["n", "tr_k", "tr_k2", "ypkpy", "ypy"]:
+        setattr(moments, stat_name, np.concatenate([getattr(batch, stat_name)
+                                                    for batch in batches]))
+
+    return moments
+
+
+def _rhe_batch_moments(bed: InternalNamespace, pheno: np.ndarray, samples: List[np.ndarray],
+                       covariates: np.ndarray, all_probes: np.ndarray) -> InternalNamespace:
+    """
+    Calculates the statistics of rhe_moments() for a batch of samples in one pass over the SNPs.
+    The projected probes, projected phenotypes, and covariate bases of the samples are stacked
+    (in GENOTYPE_DTYPE, like the genotypes), so each block of SNPs takes two matrix products.
+
+    :param bed: Object returned by open_bed() and processed by standardize_bed_snps()
+    :param pheno: Phenotype of each individual in the .bed file
+    :param samples: Indices of the individuals of each sample (all with a phenotype)
+    :param covariates: 2D array of covariates (one row per individual in the .bed file)
+    :param all_probes: 2D array of the probe values (one row per individual in the .bed file)
+
+    :return: Object holding arrays (one value per sample) of n, tr_k, tr_k2, ypkpy, and ypy
+    """
+
+    num_individuals, num_probes = all_probes.shape
+    num_samples, num_covs = len(samples), covariates.shape[1]
+    num_probe_cols = num_samples * num_probes
+
+    # Stack the projected probes, projected phenotype, and covariate basis of each sample (all
+    # zero outside the sample)
+    rhs = np.zeros((num_individuals, num_probe_cols + num_samples * (1 + num_covs)),
+                   dtype=GENOTYPE_DTYPE)
+    proj_pheno = rhs[:, num_probe_cols:num_probe_cols + num_samples]
+    cov_bases = rhs[:, num_probe_cols + num_samples:]
+    ypy = np.empty(num_samples)
+    bases = []
+    for sample_num, idx in enumerate(samples):
+        basis = np.linalg.qr(covariates[idx])[0]
+        bases.append(basis)
+        sample_probes = all_probes[idx]
+        rhs[idx, sample_num * num_probes:(sample_num + 1) * num_probes] = sample_probes - \
+            np.matmul(basis, np.matmul(basis.T, sample_probes))
+        sample_pheno = pheno[idx] - np.matmul(basis, np.matmul(basis.T, pheno[idx]))
+        proj_pheno[idx, sample_num] = sample_pheno
+        ypy[sample_num] = np.sum(sample_pheno ** 2)
+        cov_bases[idx, sample_num * num_covs:(sample_num + 1) * num_covs] = basis
+
+    # Stream the SNPs: accumulate Z Z'(Pu), |Z'Py|^2, |Z'Q|^2, and the squared norms of the rows
+    # of Z (the last two give tr(PKP) = tr(Z'Z) - tr(Q'ZZ'Q) for an orthonormal covariate basis Q)
+    k_probes = np.zeros((num_individuals, num_probe_cols))
+    z_pheno_sq = np.zeros(num_samples)
+    z_cov_sq = np.zeros(num_samples)
+    row_sq = np.zeros(num_individuals)
+    for snps in bed.used_snp_blocks:
+        std_genotypes = np.nan_to_num(standardized_bed_genotypes(bed, snps), copy=False)
+        products = np.matmul(std_genotypes.T, rhs)
+        k_probes += np.matmul(std_genotypes, products[:, :num_probe_cols])
+        z_pheno_sq += np.sum(np.square(products[:, num_probe_cols:num_probe_cols + num_samples],
+                                       dtype=np.float64), axis=0)
+        z_cov_sq += np.sum(np.square(products[:, num_probe_cols + num_samples:],
+                                     dtype=np.float64), axis=0).reshape(
+            num_samples, num_covs).sum(axis=1)
+        row_sq += np.sum(np.square(std_genotypes, dtype=np.float64), axis=1)
+
+    moments = InternalNamespace()
+    moments.n = np.array([idx.shape[0] for idx in samples])
+    moments.tr_k = np.array([row_sq[idx].sum() for idx in samples]) - z_cov_sq
+    moments.tr_k /= bed.num_used_snps
+    moments.ypkpy = z_pheno_sq / bed.num_used_snps
+    moments.ypy = ypy
+    moments.tr_k2 = np.empty(num_samples)
+    for sample_num, idx in enumerate(samples):
+        k_probe = k_probes[idx, sample_num * num_probes:(sample_num + 1) * num_probes]
+        k_probe /= bed.num_used_snps
+        k_probe -= np.matmul(bases[sample_num], np.matmul(bases[sample_num].T, k_probe))
+        moments.tr_k2[sample_num] = np.sum(k_probe ** 2) / num_probes
+
+    return moments
+
+
+def rhe_h2_from_moments(moments: InternalNamespace) -> np.ndarray:
+    """
+    Solves the Haseman-Elston normal equations
+        [tr(PKPPKP)  tr(PKP)] [sigma_g^2]   [y'PKPy]
+        [tr(PKP)     n - c  ] [sigma_e^2] = [y'Py  ]
+    of each sample for h^2 = sigma_g^2 / (sigma_g^2 + sigma_e^2)
+
+    :param moments: Object returned by rhe_moments()
+
+    :return: Array of h^2 estimates (one per sample)
+    """
+
+    lhs = np.stack([np.column_stack((moments.tr_k2, moments.tr_k)),
+                    np.column_stack((moments.tr_k, moments.n - moments.num_covariates))], axis=1)
+    variances = np.linalg.solve(lhs, np.column_stack((moments.ypkpy, moments.ypy))[..., np.newaxis])
+    return variances[:, 0, 0] / variances[:, :, 0].sum(axis=1)
+
+
+def rhe_h2_estimates(iargs: InternalNamespace, removed_ids: List[pd.DataFrame]) -> np.ndarray:
+    """
+    Estimates h^2 by randomized Haseman-Elston regression for the individuals in both the --bfile
+    and the --pheno-file, once per set of removed individuals (all estimates come from the same
+    pass over the genotypes).  An intercept is regressed out of the phenotype.
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param removed_ids: DataFrames holding the FID and IID of the individuals to remove for each
+                        estimate (None to keep everyone)
+
+    :return: Array of h^2 estimates (one per set of removed individuals)
+    """
+
+    bed = open_bed(iargs.bfile)
+    standardize_bed_snps(bed)
+    pheno_data = read_h2_pheno_file(iargs.pheno_file)
+    bed_index = pd.MultiIndex.from_frame(bed.ids)
+    pheno = pheno_data.set_index(["FID", "IID"]).pheno.reindex(bed_index).to_numpy()
+    has_pheno = ~np.isnan(pheno)
+    samples = [np.flatnonzero(has_pheno if removed is None else has_pheno & ~bed_index.isin(
+        pd.MultiIndex.from_frame(removed[["FID", "IID"]].astype(str)))) for removed in removed_ids]
+    logging.info("Estimating heritability of %s sample(s) of up to %s individuals from %s SNPs "
+                 "using randomized Haseman-Elston regression (%s probes)...", len(samples),
+                 np.count_nonzero(has_pheno), bed.num_used_snps, iargs.rhe_probes)
+
+    moments = rhe_moments(bed, np.nan_to_num(pheno), samples, num_probes=iargs.rhe_probes)
+    h2 = rhe_h2_from_moments(moments)
+    logging.debug("Randomized Haseman-Elston heritability estimate(s): %s", h2)
+
+    return h2
+
+
+def open_grm(grm_prefix: str) -> InternalNamespace:
+    """
+    Memory-maps the GCTA GRM files with the given prefix (nothing but the IDs is read into memory)
+
+    :param grm_prefix: Full prefix of the GRM files
+
+    :return: Object holding the IDs (DataFrame with FID and IID columns), the lower triangle of the
+             GRM (bin) and of the number-of-SNPs matrix (N_bin, None if there is no .grm.N.bin
+             file) as flat memory-mapped arrays
+    """
+
+    grm = InternalNamespace()
+    grm.ids = pd.read_csv(grm_prefix + GRM_ID_SUFFIX, sep=r"\s+", header=None, names=["FID", "IID"],
+                          dtype=str)
+    num_elements = len(grm.ids) * (len(grm.ids) + 1) // 2
+
+    def map_lower_triangle(filename: str) -> np.ndarray:
+        tri = np.memmap(filename, dtype=GRM_DTYPE, mode="r")
+        if tri.shape[0] != num_elements:
+            raise ValueError("GRM file %s holds %s values, but %s are expected for the %s "
+                             "individuals in %s" % (filename, tri.shape[0], num_elements,
+                                                   len(grm.ids), grm_prefix + GRM_ID_SUFFIX))
+        return tri
+
+    grm.bin = map_lower_triangle(grm_prefix + GRM_BIN_SUFFIX)
+    grm.N_bin = map_lower_triangle(grm_prefix + GRM_N_BIN_SUFFIX) if os.path.exists(
+        grm_prefix + GRM_N_BIN_SUFFIX) else None
+
+    return grm
+
+
+def grm_lower_triangle_indices(idx: np.ndarray) -> np.ndarray:
+    """
+    Determines the positions in a flat GRM lower triangle of the lower triangle of the GRM
+    restricted to the given (ascending) individual indices
+
+    :param idx: Ascending indices of individuals
+
+    :return: Positions of the restricted lower triangle, in the order they are stored
+    """
+
+    idx = np.asarray(idx, dtype=np.int64)
+    row_starts = idx * (idx + 1) // 2
+    return np.concatenate([row_starts[row] + idx[:row + 1] for row in range(idx.shape[0])]) if \
+           idx.shape[0] else np.empty(0, dtype=np.int64)
+
+
+def grm_to_matrix(grm: InternalNamespace, idx: np.ndarray = None,
+                  dtype: type = np.float64) -> np.ndarray:
+    """
+    Builds the full symmetric GRM (optionally restricted to some individuals) in memory, filling
+    its lower triangle a row at a time from the memory-mapped input and then mirroring it in
+    place (so nothing but the matrix itself is held in memory)
+
+    :param grm: Object returned by open_grm()
+    :param idx: Optional ascending indices of the individuals to restrict the GRM to
+    :param dtype: Data type of the returned matrix
+
+    :return: 2D array holding the (restricted) GRM
+    """
+
+    idx = None if idx is None else np.asarray(idx, dtype=np.int64)
+    num_rows = len(grm.ids) if idx is None else idx.shape[0]
+    row_starts = None if idx is None else idx * (idx + 1) // 2
+    matrix = np.empty((num_rows, num_rows), dtype=dtype)
+    for row in range(num_rows):
+        if idx is None:
+            start = row * (row + 1) // 2
+            matrix[row, :row + 1] = grm.bin[start:start + row + 1]
+        else:
+            matrix[row, :row + 1] = grm.bin[row_starts[row] + idx[:row + 1]]
+        matrix[:row, row] = matrix[row, :row]
+
+    return matrix
+
+
+def write_grm(grm_prefix: str, ids: pd.DataFrame, matrix: np.ndarray,
+              n_matrix: Union[np.ndarray, float] = None):
+    """
+    Writes a GRM (and optionally its number-of-SNPs matrix) in GCTA's binary format, a row of the
+    lower triangle at a time
+
+    :param grm_prefix: Full prefix of the GRM files to write
+    :param ids: DataFrame holding the FID and IID of each individual (in GRM order)
+    :param matrix: Symmetric 2D array holding the GRM
+    :param n_matrix: Optional symmetric 2D array holding the number of SNPs for each pair (or the
+                     number of SNPs of all pairs)
+    """
+
+    with open(grm_prefix + GRM_BIN_SUFFIX, "wb") as bin_file:
+        for row in range(matrix.shape[0]):
+            matrix[row, :row + 1].astype(GRM_DTYPE, copy=False).tofile(bin_file)
+    if n_matrix is not None:
+        with open(grm_prefix + GRM_N_BIN_SUFFIX, "wb") as n_bin_file:
+            for row in range(matrix.shape[0]):
+                (np.full(row + 1, n_matrix, dtype=GRM_DTYPE) if np.ndim(n_matrix) == 0 else
+                 n_matrix[row, :row + 1].astype(GRM_DTYPE, copy=False)).tofile(n_bin_file)
+    ids[["FID", "IID"]].to_csv(grm_prefix + GRM_ID_SUFFIX, sep="\t", header=False, index=False)
+
+
+def write_restricted_grm(grm: InternalNamespace, keep_idx: np.ndarray, out_prefix: str,
+                         chunk_elements: int = DEFAULT_GRM_CHUNK_ELEMENTS):
+    """
+    Writes the GRM restricted to the given individuals in GCTA's binary format, selecting the
+    needed elements of the memory-mapped input and streaming them to the output a chunk of rows
+    at a time (the equivalent of GCTA's --keep / --remove with --make-grm).
+
+    :param grm: Object returned by open_grm()
+    :param keep_idx: Ascending indices of the individuals to keep
+    :param out_prefix: Full prefix of the GRM files to write
+    :param chunk_elements: Approximate number of GRM elements to gather per write
+    """
+
+    keep_idx = np.asarray(keep_idx, dtype=np.int64)
+    tri_files = [(grm.bin, out_prefix + GRM_BIN_SUFFIX)]
+    if grm.N_bin is not None:
+        tri_files.append((grm.N_bin, out_prefix + GRM_N_BIN_SUFFIX))
+
+    # Number of output elements up to and including each output row (row r has r + 1 elements)
+    num_rows = keep_idx.shape[0]
+    row_ends = np.cumsum(np.arange(1, num_rows + 1))
+    row_starts = keep_idx * (keep_idx + 1) // 2
+
+    out_files = [open(filename, "wb") for _, filename in tri_files]
+    try:
+        first_row = 0
+        while first_row < num_rows:
+            elements_done = row_ends[first_row - 1] if first_row else 0
+            last_row = max(first_row + 1, np.searchsorted(row_ends, elements_done + chunk_elements,
+                                                          side="right"))
+            positions = np.concatenate([row_starts[row] + keep_idx[:row + 1] for row in
+                                        range(first_row, last_row)])
+            for (tri, _), out_file in zip(tri_files, out_files):
+                tri[positions].tofile(out_file)
+            first_row = last_row
+    finally:
+        for out_file in out_files:
+            out_file.close()
+
+    grm.ids.iloc[keep_idx].to_csv(out_prefix + GRM_ID_SUFFIX, sep="\t", header=False,
+                                  index=False)
+
+
+def iter_grm_lower_triangle(grm: InternalNamespace,
+                            chunk_elements: int = DEFAULT_GRM_CHUNK_ELEMENTS) -> Iterable[
+        Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Iterates over the memory-mapped lower triangle (including the diagonal) of a GRM a chunk of
+    whole rows at a time
+
+    :param grm: Object returned by open_grm()
+    :param chunk_elements: Approximate number of GRM elements per chunk
+
+    :return: Generator of tuples of the row indices, column indices, and values of each chunk
+    """
+
+    num_rows = len(grm.ids)
+    row_ends = np.cumsum(np.arange(1, num_rows + 1))
+    first_row = 0
+    while first_row < num_rows:
+        start = row_ends[first_row - 1] if first_row else 0
+        last_row = max(first_row + 1, np.searchsorted(row_ends, start + chunk_elements,
+                                                      side="right"))
+        rows = np.repeat(np.arange(first_row, last_row), np.arange(first_row, last_row) + 1)
+        cols = np.arange(start, row_ends[last_row - 1]) - rows * (rows + 1) // 2
+        yield rows, cols, grm.bin[start:row_ends[last_row - 1]]
+        first_row = last_row
+
+
+def grm_related_pairs(grm: InternalNamespace, cutoff: float,
+                      chunk_elements: int = DEFAULT_GRM_CHUNK_ELEMENTS) -> Tuple[np.ndarray,
+                                                                                 np.ndarray]:
+    """
+    Finds the pairs of distinct individuals whose relatedness exceeds a cutoff, scanning the
+    memory-mapped lower triangle of the GRM a chunk of rows at a time
+
+    :param grm: Object returned by open_grm()
+    :param cutoff: Relatedness cutoff
+    :param chunk_elements: Approximate number of GRM elements scanned at a time
+
+    :return: Tuple of the row (larger) and column (smaller) indices of the related pairs
+    """
+
+    pair_rows, pair_cols = [], []
+    for rows, cols, values in iter_grm_lower_triangle(grm, chunk_elements):
+        related = (values > cutoff) & (rows != cols)
+        pair_rows.append(rows[related])
+        pair_cols.append(cols[related])
+
+    return (np.concatenate(pair_rows), np.concatenate(pair_cols)) if pair_rows else \
+           (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+
+def grm_cutoff_keep(grm: InternalNamespace, cutoff: float) -> np.ndarray:
+    """
+    Determines the individuals kept when applying a relatedness cutoff the way GCTA's
+    --grm-cutoff does: of each pair of individuals related beyond the cutoff, the one in more
+    such pairs (the one later in the GRM in case of a tie) is removed
+
+    :param grm: Object returned by open_grm()
+    :param cutoff: Relatedness cutoff
+
+    :return: Ascending indices of the individuals kept
+    """
+
+    rows, cols = grm_related_pairs(grm, cutoff)
+    num_pairs = np.bincount(np.concatenate((rows, cols)), minlength=len(grm.ids))
+    keep = np.ones(len(grm.ids), dtype=bool)
+    keep[np.where(num_pairs[rows] >= num_pairs[cols], rows, cols)] = False
+
+    return np.flatnonzero(keep)
+
+
+def apply_grm_cutoff(iargs: InternalNamespace, out_prefix: str):
+    """
+    Applies the relatedness cutoff to the GRM once, up front, so no heritability estimation (full
+    sample or leave-one-block-out) repeats it.  Afterward, iargs.grm is the pruned GRM (written to
+    out_prefix if anyone was removed), iargs.grm_kept_ids holds the FID and IID of the individuals
+    in it, iargs.grm_source is the unpruned GRM (which the in-process REML restricts itself, so
+    its cached spectrum lives next to the source GRM rather than the pruned one, see
+    reml_eigen_h2_estimates()), and iargs.grm_cutoff is None (as it has been applied).
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param out_prefix: Full prefix of the pruned GRM files to write
+    """
+
+    grm = open_grm(iargs.grm)
+    keep_idx = grm_cutoff_keep(grm, iargs.grm_cutoff)
+    logging.info("Relatedness cutoff %s removes %s of the %s individuals in GRM [%s]",
+                 iargs.grm_cutoff, len(grm.ids) - keep_idx.shape[0], len(grm.ids), iargs.grm)
+    iargs.grm_source = iargs.grm
+    if keep_idx.shape[0] < len(grm.ids):
+        write_restricted_grm(grm, keep_idx, out_prefix)
+        iargs.grm = out_prefix
+    iargs.grm_kept_ids = grm.ids.iloc[keep_idx].reset_index(drop=True)
+    iargs.grm_cutoff = None
+
+
+def read_sparse_grm(grm_prefix: str) -> InternalNamespace:
+    """
+    Reads a sparse GRM (see GRM_SPARSE_SUFFIX)
+
+    :param grm_prefix: Full prefix of the sparse GRM files
+
+    :return: Object holding the IDs (DataFrame with FID and IID columns) and the row (larger) and
+             column (smaller) indices and values of the nonzero lower triangle
+    """
+
+    grm = InternalNamespace()
+    grm.ids = pd.read_csv(grm_prefix + GRM_ID_SUFFIX, sep=r"\s+", header=None, names=["FID", "IID"],
+                          dtype=str)
+    triplets = pd.read_csv(grm_prefix + GRM_SPARSE_SUFFIX, sep=r"\s+", header=None,
+                           names=["row", "col", "value"],
+                           dtype={"row" : np.int64, "col" : np.int64, "value" : np.float64})
+    grm.rows = np.maximum(triplets.row.to_numpy(), triplets.col.to_numpy())
+    grm.cols = np.minimum(triplets.row.to_numpy(), triplets.col.to_numpy())
+    grm.values = triplets.value.to_numpy()
+    if grm.cols.shape[0] and (grm.cols.min() < 0 or grm.rows.max() >= len(grm.ids)):
+        raise ValueError("Sparse GRM file %s refers to individuals outside the %s in %s" %
+                         (grm_prefix + GRM_SPARSE_SUFFIX, len(grm.ids), grm_prefix + GRM_ID_SUFFIX))
+
+    return grm
+
+
+def write_sparse_grm(grm_prefix: str, grm: InternalNamespace):
+    """
+    Writes a sparse GRM (see GRM_SPARSE_SUFFIX)
+
+    :param grm_prefix: Full prefix of the sparse GRM files to write
+    :param grm: Object like the ones returned by read_sparse_grm()
+    """
+
+    pd.DataFrame({"row" : grm.rows, "col" : grm.cols, "value" : grm.values}).to_csv(
+        grm_prefix + GRM_SPARSE_SUFFIX, sep="\t", header=False, index=False)
+    grm.ids[["FID", "IID"]].to_csv(grm_prefix + GRM_ID_SUFFIX, sep="\t", header=False,
+                                   index=False)
+
+
+def sparsify_grm(grm: InternalNamespace, cutoff: float, out_prefix: str,
+                 chunk_elements: int = DEFAULT_GRM_CHUNK_ELEMENTS) -> str:
+    """
+    Writes a sparse version of a dense GRM, keeping the diagonal and the relatedness values above
+    a cutoff (like GCTA's --make-bK-sparse).  The memory-mapped GRM is scanned a chunk at a time,
+    so only the kept values are ever held in memory.
+
+    :param grm: Object returned by open_grm()
+    :param cutoff: Relatedness values at or below this are set to 0
+    :param out_prefix: Full prefix of the sparse GRM files to write
+    :param chunk_elements: Approximate number of GRM elements scanned at a time
+
+    :return: Full prefix of the sparse GRM files
+    """
+
+    kept_rows, kept_cols, kept_values = [], [], []
+    for rows, cols, values in iter_grm_lower_triangle(grm, chunk_elements):
+        kept = (values > cutoff) | (rows == cols)
+        kept_rows.append(rows[kept])
+        kept_cols.append(cols[kept])
+        kept_values.append(values[kept].astype(np.float64))
+
+    sparse_grm = InternalNamespace()
+    sparse_grm.ids = grm.ids
+    sparse_grm.rows = np.concatenate(kept_rows)
+    sparse_grm.cols = np.concatenate(kept_cols)
+    sparse_grm.values = np.concatenate(kept_values)
+    logging.info("Thresholding GRM at %s keeps %s off-diagonal values of %s individuals",
+                 cutoff, sparse_grm.values.shape[0] - len(grm.ids), len(grm.ids))
+    write_sparse_grm(out_prefix, sparse_grm)
+
+    return out_prefix
+
+
+def restrict_sparse_grm(grm: InternalNamespace, keep_idx: np.ndarray) -> InternalNamespace:
+    """
+    Restricts a sparse GRM to some individuals in O(number of nonzero values) (the equivalent of
+    write_restricted_grm() for sparse GRMs, without any files)
+
+    :param grm: Object returned by read_sparse_grm()
+    :param keep_idx: Ascending indices of the individuals to keep
+
+    :return: Object like the ones returned by read_sparse_grm()
+    """
+
+    new_idx = np.full(len(grm.ids), -1, dtype=np.int64)
+    new_idx[keep_idx] = np.arange(len(keep_idx))
+    kept = (new_idx[grm.rows] >= 0) & (new_idx[grm.cols] >= 0)
+
+    restricted = InternalNamespace()
+    restricted.ids = grm.ids.iloc[keep_idx].reset_index(drop=True)
+    restricted.rows = new_idx[grm.rows[kept]]
+    restricted.cols = new_idx[grm.cols[kept]]
+    restricted.values = grm.values[kept]
+
+    return restricted
+
+
+def sparse_grm_eigen_rotation(grm: InternalNamespace, data: np.ndarray) -> Tuple[np.ndarray,
+                                                                                 np.ndarray]:
+    """
+    Eigendecomposes a sparse GRM one connected component (family) at a time, since the GRM is
+    block diagonal over them, and rotates data by the eigenvectors.  Unrelated individuals are
+    handled together (their eigenvectors are unit vectors).
+
+    :param grm: Object returned by read_sparse_grm()
+    :param data: 2D array with one row per individual in the GRM
+
+    :return: Tuple of the eigenvalues and the rotated data (U'data), in matching order
+    """
+
+    num_individuals = len(grm.ids)
+    matrix = scipy.sparse.coo_matrix((grm.values, (grm.rows, grm.cols)),
+                                     shape=(num_individuals, num_individuals)).tocsr()
+    matrix = matrix + scipy.sparse.tril(matrix, k=-1).T
+    num_components, labels = scipy.sparse.csgraph.connected_components(matrix, directed=False)
+    sizes = np.bincount(labels, minlength=num_components)
+    singletons = np.flatnonzero(sizes[labels] == 1)
+    eigenvalues = [matrix.diagonal()[singletons]]
+    rotated = [data[singletons]]
+
+    # Families
+    order = np.argsort(labels, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    for component in np.flatnonzero(sizes > 1):
+        idx = order[bounds[component]:bounds[component + 1]]
+        values, vectors = np.linalg.eigh(matrix[idx][:, idx].toarray())
+        eigenvalues.append(values)
+        rotated.append(np.matmul(vectors.T, data[idx]))
+    logging.debug("Eigendecomposed sparse GRM of %s individuals in %s families (largest: %s)",
+                  num_individuals, np.count_nonzero(sizes > 1), sizes.max(initial=0))
+
+    return np.concatenate(eigenvalues), np.concatenate(rotated)
+
+
+def grm_subset_key(ids: pd.DataFrame) -> str:
+    """
+    Determines the key that the cached eigendecomposition of a GRM restricted to a subset of its
+    individuals is stored under (see GRM_SUBSET_KEY_LENGTH)
+
+    :param ids: DataFrame holding the FID and IID of the individuals in the subset (in GRM order)
+
+    :return: Key
+    """
+
+    id_lines = ["%s\t%s" % (fid, iid) for fid, iid in ids[["FID", "IID"]].astype(str).itertuples(
+        index=False)]
+    return hashlib.sha256("\n".join(id_lines).encode()).hexdigest()[:GRM_SUBSET_KEY_LENGTH]
+
+
+def grm_spectrum(grm_prefix: str, grm: InternalNamespace = None,
+                 keep_idx: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Eigendecomposes a GRM (or the GRM restricted to some of its individuals), caching the result
+    next to the GRM files (keyed by the individuals kept, see grm_subset_key()) so later calls
+    (e.g. for other phenotypes or runs) just memory-map it.  A cache older than the .grm.bin file
+    is recomputed, and a cache that can't be written only triggers a warning.
+
+    :param grm_prefix: Full prefix of the GRM files
+    :param grm: GRM opened by open_grm() (opened from grm_prefix if not specified)
+    :param keep_idx: Optional ascending indices of the individuals to restrict the GRM to
+
+    :return: Tuple of the eigenvalues and the matrix of eigenvectors (one per column)
+    """
+
+    grm = grm if grm else open_grm(grm_prefix)
+    if keep_idx is not None and keep_idx.shape[0] == len(grm.ids):
+        keep_idx = None
+    cache_prefix = grm_prefix if keep_idx is None else "%s.%s" % (
+        grm_prefix, grm_subset_key(grm.ids.iloc[keep_idx]))
+    eigval_file = cache_prefix + GRM_EIGENVALUES_SUFFIX
+    eigvec_file = cache_prefix + GRM_EIGENVECTORS_SUFFIX
+    grm_mtime = os.path.getmtime(grm_prefix + GRM_BIN_SUFFIX)
+    if all(os.path.exists(filename) and os.path.getmtime(filename) >= grm_mtime
+           for filename in [eigval_file, eigvec_file]):
+        logging.debug("Reading cached eigendecomposition [%s] of GRM [%s]", cache_prefix,
+                      grm_prefix)
+        return np.load(eigval_file, mmap_mode="r"), np.load(eigvec_file, mmap_mode="r")
+
+    logging.info("Eigendecomposing GRM [%s] restricted to %s of its %s individuals...",
+                 grm_prefix, len(grm.ids) if keep_idx is None else keep_idx.shape[0],
+                 len(grm.ids))
+    eigenvalues, eigenvectors = np.linalg.eigh(grm_to_matrix(grm, keep_idx))
+    try:
+        for filename, values in [(eigvec_file, eigenvectors), (eigval_file, eigenvalues)]:
+            np.save(filename + ".tmp.npy", values)
+            os.replace(filename + ".tmp.npy", filename)
+    except OSError as e:
+        logging.warning("Could not cache the eigendecomposition of GRM [%s]: %s", grm_prefix, e)
+
+    return eigenvalues, eigenvectors
+
+
+def reml_eigen_loglik(log_delta: float, eigenvalues: np.ndarray, rotated_pheno: np.ndarray,
+                      rotated_covariates: np.ndarray) -> float:
+    """
+    Calculates the restricted log-likelihood (up to a constant, with sigma_g^2 profiled out) of
+    the model V = sigma_g^2 (K + delta I) in the eigenbasis of K, where V is diagonal.  Costs
+    O(n) for a fixed number of covariates.
+
+    :param log_delta: log(delta), where delta = sigma_e^2 / sigma_g^2
+    :param eigenvalues: Eigenvalues of K
+    :param rotated_pheno: Phenotype rotated by the eigenvectors of K (U'y)
+    :param rotated_covariates: 2D array of covariates rotated by the eigenvectors of K (U'X)
+
+    :return: Restricted log-likelihood (-inf where K + delta I isn't positive definite)
+    """
+
+    diag = eigenvalues + np.exp(log_delta)
+    if np.any(diag <= 0.0):
+        return -np.inf
+    weighted_covariates = rotated_covariates / diag[:, np.newaxis]
+    xtwx = np.matmul(rotated_covariates.T, weighted_covariates)
+    beta = np.linalg.solve(xtwx, np.matmul(weighted_covariates.T, rotated_pheno))
+    resid = rotated_pheno - np.matmul(rotated_covariates, beta)
+    dof = rotated_pheno.shape[0] - rotated_covariates.shape[1]
+    sigma_g2 = np.sum(resid ** 2 / diag) / dof
+
+    return -0.5 * (dof * np.log(sigma_g2) + np.sum(np.log(diag)) + np.linalg.slogdet(xtwx)[1])
+
+
+def reml_eigen_fit(eigenvalues: np.ndarray, rotated_pheno: np.ndarray,
+                   rotated_covariates: np.ndarray) -> Tuple[float, float]:
+    """
+    Fits the REML model y ~ N(X beta, sigma_g^2 K + sigma_e^2 I) by a one-dimensional search over
+    delta = sigma_e^2 / sigma_g^2 in the eigenbasis of K (as in FaST-LMM), constraining h^2 to
+    [0, 1] like GCTA does.  The standard error of h^2 comes from the inverse of the REML Fisher
+    information of (sigma_g^2, sigma_e^2) and the delta method.
+
+    :param eigenvalues: Eigenvalues of K
+    :param rotated_pheno: Phenotype rotated by the eigenvectors of K (U'y)
+    :param rotated_covariates: 2D array of covariates rotated by the eigenvectors of K (U'X)
+
+    :return: Tuple of the estimate of h^2 and its standard error
+    """
+
+    def neg_loglik(log_delta):
+        return -reml_eigen_loglik(log_delta, eigenvalues, rotated_pheno, rotated_covariates)
+
+    # Grid search, then refine around the best grid point
+    grid = np.linspace(*REML_EIGEN_LOG_DELTA_BOUNDS, REML_EIGEN_GRID_POINTS)
+    best = np.argmin([neg_loglik(log_delta) for log_delta in grid])
+    bounds = (grid[max(best - 1, 0)], grid[min(best + 1, grid.shape[0] - 1)])
+    log_delta = scipy.optimize.minimize_scalar(neg_loglik, bounds=bounds, method="bounded").x
+    delta = np.exp(log_delta)
+
+    # Variance components at the optimum
+    diag = eigenvalues + delta
+    weighted_covariates = rotated_covariates / diag[:, np.newaxis]
+    xtwx_inv = np.linalg.inv(np.matmul(rotated_covariates.T, weighted_covariates))
+    resid = rotated_pheno - np.matmul(rotated_covariates, np.matmul(
+        xtwx_inv, np.matmul(weighted_covariates.T, rotated_pheno)))
+    sigma_g2 = np.sum(resid ** 2 / diag) / (rotated_pheno.shape[0] - rotated_covariates.shape[1])
+    sigma_e2 = delta * sigma_g2
+
+    # Fisher information I_ij = tr(P V_i P V_j) / 2 with P = W - W X (X'WX)^-1 X'W, W = V^-1
+    weights = 1.0 / (sigma_g2 * diag)
+    weighted_covariates = rotated_covariates * weights[:, np.newaxis]
+    cov_inv = np.linalg.inv(np.matmul(rotated_covariates.T, weighted_covariates))
+    hat_diag = np.sum(np.matmul(weighted_covariates, cov_inv) * weighted_covariates, axis=1)
+    derivs = [eigenvalues, np.ones_like(eigenvalues)]
+    info = np.empty((2, 2))
+    for i, j in itertools.product(range(2), repeat=2):
+        cross_i = np.matmul(weighted_covariates.T, derivs[i][:, np.newaxis] * weighted_covariates)
+        cross_j = np.matmul(weighted_covariates.T, derivs[j][:, np.newaxis] * weighted_covariates)
+        info[i, j] = 0.5 * (np.sum(weights ** 2 * derivs[i] * derivs[j])
+                            - 2.0 * np.sum(hat_diag * derivs[i] * weights * derivs[j])
+                            + np.trace(np.matmul(np.matmul(cov_inv, cross_i),
+                                                 np.matmul(cov_inv, cross_j))))
+    h2 = sigma_g2 / (sigma_g2 + sigma_e2)
+    grad = np.array([sigma_e2, -sigma_g2]) / (sigma_g2 + sigma_e2) ** 2
+    h2_se = np.sqrt(np.matmul(grad, np.linalg.solve(info, grad)))
+
+    return h2, h2_se
+
+
+def reml_eigen_h2_estimates(iargs: InternalNamespace,
+                            removed_ids: List[pd.DataFrame]) -> List[Tuple[float, float]]:
+    """
+    Estimates h^2 by REML on the eigendecomposed --grm for the individuals in both the GRM and the
+    --pheno-file, once per set of removed individuals.  An intercept is the only covariate (as in
+    the GCTA call).  The spectrum of the GRM restricted to the individuals with a phenotype is
+    cached (see grm_spectrum()), and the estimates with individuals removed eigendecompose that
+    restricted GRM (formed once) restricted further in memory.  If a relatedness cutoff has been
+    applied (see apply_grm_cutoff()), the source GRM is restricted to the individuals kept
+    instead, so the cached spectrum outlives the pruned GRM.  A sparse GRM
+    (--grm-sparse, used instead if set) is restricted in O(number of nonzero values) and
+    eigendecomposed a family at a time.  Each fit then costs one rotation of the phenotype and
+    O(n) per likelihood evaluation.
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param removed_ids: DataFrames holding the FID and IID of the individuals to remove for each
+                        estimate (None to keep everyone)
+
+    :return: List of tuples of the h^2 estimate and its standard error (one per set of removed
+             individuals)
+    """
+
+    grm_sparse = getattr(iargs, "grm_sparse", None)
+    grm_prefix = getattr(iargs, "grm_source", None) or iargs.grm
+    grm = read_sparse_grm(grm_sparse) if grm_sparse else open_grm(grm_prefix)
+    grm_index = pd.MultiIndex.from_frame(grm.ids)
+    pheno_data = read_h2_pheno_file(iargs.pheno_file)
+    pheno = pheno_data.set_index(["FID", "IID"]).pheno.reindex(grm_index).to_numpy()
+    has_pheno = ~np.isnan(pheno)
+    if not grm_sparse and grm_prefix != iargs.grm:
+        has_pheno &= grm_index.isin(pd.MultiIndex.from_frame(iargs.grm_kept_ids[["FID", "IID"]]))
+
+    estimates = []
+    pheno_idx = np.flatnonzero(has_pheno)
+    matrix = None
+    for removed in removed_ids:
+        keep = has_pheno if removed is None else has_pheno & ~grm_index.isin(
+            pd.MultiIndex.from_frame(removed[["FID", "IID"]].astype(str)))
+        pheno_cons = np.column_stack((pheno[keep], np.ones(np.count_nonzero(keep))))
+        if grm_sparse:
+            eigenvalues, rotated = sparse_grm_eigen_rotation(
+                restrict_sparse_grm(grm, np.flatnonzero(keep)), pheno_cons)
+            estimates.append(reml_eigen_fit(eigenvalues, rotated[:, 0], rotated[:, 1:]))
+            logging.debug("REML (sparse GRM) h^2 estimate: %s (SE %s)", *estimates[-1])
+            continue
+        if np.array_equal(keep, has_pheno):
+            eigenvalues, eigenvectors = grm_spectrum(grm_prefix, grm, pheno_idx)
+        else:
+            logging.debug("Eigendecomposing GRM restricted to %s of %s individuals",
+                          np.count_nonzero(keep), keep.shape[0])
+            matrix = grm_to_matrix(grm, pheno_idx) if matrix is None else matrix
+            pheno_keep = keep[pheno_idx]
+            eigenvalues, eigenvectors = np.linalg.eigh(matrix[np.ix_(pheno_keep, pheno_keep)])
+        rotated = np.matmul(np.asarray(eigenvectors).T, pheno_cons)
+        estimates.append(reml_eigen_fit(np.asarray(eigenvalues), rotated[:, 0], rotated[:, 1:]))
+        logging.debug("REML (eigendecomposed GRM) h^2 estimate: %s (SE %s)", *estimates[-1])
+
+    return estimates
+
+
+def estimate_R2(data: pd.DataFrame, pheno: List[str], pgi: List[str],
+                solver: str = SOLVER_STATSMODELS) -> float:
+    """
+    Returns the R^2 from the regression of phenotype on PGI for the phenotype corresponding to the
+    PGI.
+
+    :param data: Pandas DataFrame containing phenotype and PGI.
+    :param pheno: List containing column name in data corresponding to phenotype.
+    :param pgi: List containing column name in data corresponding to PGI.
+    :param solver: Least squares solver to use (one of SOLVERS)
+
+    :return: R^2 from regression of phenotype on PGI.
+    """
+
+    if solver == SOLVER_STATSMODELS:
+        reg = sm.OLS(data[pheno], data[pgi + CONS_COLS])
+        rsq = reg.fit().rsquared
+    else:
+        y = data[pheno[0]].to_numpy(dtype=np.float64)
+        fit = solve_least_squares(y, design_matrix(data, pgi + CONS_COLS), solver=solver)
+        y_centered = y - y.mean()
+        rsq = 1.0 - fit.ssr / np.dot(y_centered, y_centered)
+
+    return rsq
+
+
+def design_matrix(data: pd.DataFrame, cols: List[str]) -> np.ndarray:
+    """
+    Extracts columns of a DataFrame as a float matrix.  Columns that are adjacent (in order) in
+    the block of the regression data (see adjust_regression_data()) are returned as a read-only
+    view of that block (so in its precision), and other columns as a C-contiguous float64 copy.
+
+    :param data: DataFrame holding the columns
+    :param cols: Columns to extract (in order)
+
+    :return: 2D array
+    """
+
+    # Columns of a float block are views, so check whether they sit next to each other in it
+    col_vals = [data[col].to_numpy() for col in cols]
+    if col_vals and all(vals.dtype in (np.float64, np.float32) and
+                        vals.dtype == col_vals[0].dtype and vals.strides == col_vals[0].strides
+                        for vals in col_vals):
+        first_address = col_vals[0].__array_interface__["data"][0]
+        if all(vals.__array_interface__["data"][0] == first_address + idx * vals.itemsize
+               for idx, vals in enumerate(col_vals)):
+            return np.lib.stride_tricks.as_strided(
+                col_vals[0], shape=(col_vals[0].shape[0], len(cols)),
+                strides=(col_vals[0].strides[0], col_vals[0].itemsize), writeable=False)
+
+    return np.ascontiguousarray(data[cols].to_numpy(dtype=np.float64))
+
+
+def solve_least_squares(y: np.ndarray, X: np.ndarray, weights: np.ndarray = None,
+                        solver: str = SOLVER_CHOLESKY) -> InternalNamespace:
+    """
+    Lean (weighted) least squares fit that computes only what this software needs: coefficients,
+    their classical variance-covariance matrix, and the sum of squared residuals.  Weighted
+    regressions are fit by scaling the rows of y and X by the square roots of the weights.
+
+    :param y: 1D array holding the dependent variable, or 2D array holding one dependent variable
+              per column (all are fit using a single factorization of X)
+    :param X: 2D array holding the design matrix (include a column of ones for a constant)
+    :param weights: Optional 1D array of weights
+    :param solver: SOLVER_CHOLESKY (factors X'X) or SOLVER_QR (factors X, more robust to
+                   ill-conditioning)
+
+    :return: Object holding params, bse, cov_params, ssr, and the shared (X'X)^-1 (xtx_inv).  For
+             a 2D y, params has one column per dependent variable, while ssr, bse and
+             cov_params have a leading dimension indexing the dependent variables.
+    """
+
+    y = np.asarray(y, dtype=np.float64)
+    X = np.asarray(X, dtype=np.float64)
+    if weights is not None:
+        sqrt_wts = np.sqrt(weights)
+        y = y * (sqrt_wts if y.ndim == 1 else sqrt_wts[:, np.newaxis])
+        X = X * sqrt_wts[:, np.newaxis]
+    num_obs, num_params = X.shape
+    identity = np.identity(num_params)
+
+    if solver == SOLVER_CHOLESKY:
+        xtx_factor = scipy.linalg.cho_factor(np.matmul(X.T, X), check_finite=False)
+        params = scipy.linalg.cho_solve(xtx_factor, np.matmul(X.T, y), check_finite=False)
+        xtx_inv = scipy.linalg.cho_solve(xtx_factor, identity, check_finite=False)
+    elif solver == SOLVER_QR:
+        q, r = np.linalg.qr(X)
+        params = scipy.linalg.solve_triangular(r, np.matmul(q.T, y), check_finite=False)
+        r_inv = scipy.linalg.solve_triangular(r, identity, check_finite=False)
+        xtx_inv = np.matmul(r_inv, r_inv.T)
+    else:
+        raise ValueError("Unknown least squares solver [%s], expected one of %s" %
+                         (solver, [SOLVER_CHOLESKY, SOLVER_QR]))
+
+    resid = y - np.matmul(X, params)
+
+    fit = InternalNamespace()
+    fit.params = params
+    fit.xtx_inv = xtx_inv
+    fit.ssr = np.sum(resid * resid, axis=0)
+    fit.cov_params = np.multiply.outer(fit.ssr / (num_obs - num_params), xtx_inv)
+    fit.bse = np.sqrt(np.diagonal(fit.cov_params, axis1=-2, axis2=-1))
+
+    return fit
+
+
+def adjust_regression_data(orig_reg_data: pd.DataFrame, iargs: InternalNamespace,
+                           pgi_stats: Tuple[float, float] = None,
+                           check_variance: bool = True) -> pd.DataFrame:
+    """
+    Performs fixes (not necessarily in this order):
+        1) Add a constant to the dataset.
+        2) Check for low variance columns.
+        3) Remove NaN's.
+        4) Standardize PGI
+        5) Generate interaction columns
+        6) Expand categorical columns into dummy covariates
+        7) Rearrange column order and omit unused columns
+    The rows to keep are found once, and the numeric columns are written into a single
+    preallocated block of the --precision (in the order G, z, y, PGI phenotype, constant,
+    weights) that the returned DataFrame wraps without copying, so design_matrix() can return
+    views of it.
+
+    :param orig_reg_data: Dataframe containing raw data
+    :param iargs: Internal namespace for this software
+    :param pgi_stats: Optional (mean, standard deviation) to standardize the PGI with.  If not
+                      specified, these are calculated from orig_reg_data (this should be specified
+                      when orig_reg_data is only a chunk of the full data).
+    :param check_variance: If True, raise an error for any (non-constant) column with ~0 variance
+
+    :return: Regression data processed as indicated above
+    """
+
+    # Determine the lists of columns in the adjusted dataframe
+    # (make sure order of w's is the same as z_int)
+    iargs.z_cols = iargs.covariates
+    iargs.y_cols = iargs.outcome
+    iargs.wt_cols = iargs.weights
+    iargs.z_int_cols = iargs.pgi_interact_vars
+    interact_dict = {z_int_col : (z_int_col+"_int") for z_int_col in iargs.z_int_cols}
+    iargs.w_cols = [interact_dict[z_int_col] for z_int_col in iargs.z_int_cols]
+    iargs.G_cols = iargs.pgi_var + iargs.w_cols
+    iargs.alpha_cols = iargs.G_cols + iargs.z_cols
+
+    # The PGI phenotype column is only needed (for R^2) if it isn't the outcome
+    iargs.pheno_cols = [] if iargs.R2 else [col for col in iargs.pgi_pheno_var
+                                            if col not in iargs.y_cols]
+
+    # Find the rows to keep (those without missing values) once from the source columns (with
+    # multiple outcomes, missing outcome values are handled per outcome later)
+    categorical_cols = getattr(iargs, "categorical", [])
+    string_cols = iargs.id_col + getattr(iargs, "absorb", [])
+    source_cols = list(dict.fromkeys(
+        iargs.pgi_var + iargs.z_int_cols + iargs.z_cols + iargs.pheno_cols + iargs.wt_cols +
+        string_cols + categorical_cols + (iargs.y_cols if len(iargs.y_cols) == 1 else [])))
+    rows = np.flatnonzero(orig_reg_data[source_cols].notna().all(axis=1).to_numpy())
+
+    # Replace the categorical columns by dummy covariates for the levels left in the data
+    dummies = None
+    if categorical_cols:
+        dummies = expand_categorical_columns(
+            orig_reg_data[categorical_cols].iloc[rows], categorical_cols,
+            iargs.alpha_cols + iargs.y_cols + iargs.pheno_cols + iargs.wt_cols + CONS_COLS +
+            string_cols)
+        iargs.z_cols = iargs.covariates + list(dummies.columns)
+        iargs.alpha_cols = iargs.G_cols + iargs.z_cols
+
+    # Preallocate the (C-contiguous) block holding all numeric columns of the adjusted data, along
+    # with the map of its column indices
+    float_cols = iargs.alpha_cols + iargs.y_cols + iargs.pheno_cols + CONS_COLS + iargs.wt_cols
+    col_idx = {col : idx for idx, col in enumerate(float_cols)}
+    block = np.empty((rows.shape[0], len(float_cols)), dtype=reg_data_float_dtype(iargs))
+
+    # Copy the kept rows of the y, z, and wts columns over as-is
+    for col in iargs.y_cols + iargs.pheno_cols + iargs.covariates + iargs.wt_cols:
+        block[:, col_idx[col]] = orig_reg_data[col].to_numpy()[rows]
+    if dummies is not None:
+        block[:, [col_idx[col] for col in dummies.columns]] = dummies.to_numpy()
+
+    # Copy the PGI to the block, standardizing it (in float64) on the way
+    g_col_name = iargs.pgi_var[0]
+    g_vals = orig_reg_data[g_col_name].to_numpy(dtype=np.float64)
+    g_mean, g_std = pgi_stats if pgi_stats else (np.nanmean(g_vals), np.nanstd(g_vals))
+    if g_std == 0.0:
+        raise ValueError("PGI column \"%s\" has variance zero!  Unable to proceed." %
+                         g_col_name)
+    stdized_pgi_vect = (g_vals[rows] - g_mean) / g_std
+    block[:, col_idx[g_col_name]] = stdized_pgi_vect
+
+    # Generate the interaction (w) columns
+    # (multiply the correct z_int column component-wise by PGI)
+    for z_int_col in iargs.z_int_cols:
+        block[:, col_idx[interact_dict[z_int_col]]] = np.multiply(
+            orig_reg_data[z_int_col].to_numpy(dtype=np.float64)[rows], stdized_pgi_vect)
+
+    # Set constant column
+    block[:, col_idx[CONS_COL_NAME]] = 1.0
+
+    # Check for 0 variance columns and raise error if any (other than CONS_COL_NAME) exist.
+    if check_variance:
+        col_vars = (np.var if len(iargs.y_cols) == 1 else np.nanvar)(block, axis=0, ddof=1,
+                                                                     dtype=np.float64)
+        check_column_variances(dict(zip(float_cols, col_vars)))
+
+    # Wrap the block (without copying it) in a DataFrame, and add the kept rows of the string
+    # columns (as blocks of their own, so the numeric block stays shared)
+    reg_data = pd.DataFrame(block, index=rows, columns=float_cols, copy=False)
+    for col in string_cols:
+        reg_data[col] = orig_reg_data[col].to_numpy()[rows]
+
+    return reg_data
+
+
+def expand_categorical_columns(reg_data: pd.DataFrame, categorical_cols: List[str],
+                               reserved_cols: List[str] = None) -> pd.DataFrame:
+    """
+    Builds indicator (dummy) columns for all but the first level of each categorical column.
+    Levels are ordered numerically if they are all numbers, and lexically otherwise.  Each
+    variable's indicators are built as a single block from its level codes.
+
+    :param reg_data: DataFrame holding the categorical columns (without missing values)
+    :param categorical_cols: Names of the categorical columns
+    :param reserved_cols: Optional names of the other columns of the adjusted data, which no
+                          dummy column may share
+
+    :return: DataFrame (with the index of reg_data) holding the COLUMN_LEVEL indicator columns
+    """
+
+    taken_cols = set(reg_data.columns) | set(reserved_cols if reserved_cols else [])
+    blocks = []
+    for col in categorical_cols:
+        codes, levels = pd.factorize(reg_data[col])
+        numeric_levels = pd.to_numeric(pd.Series(levels), errors="coerce")
+        order = np.argsort(numeric_levels.to_numpy() if numeric_levels.notna().all() else
+                           levels.astype(str), kind="stable")
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(order.shape[0])
+        dummy_names = ["%s_%s" % (col, levels[idx]) for idx in order[1:]]
+        clashes = set(dummy_names) & taken_cols
+        if clashes:
+            raise ValueError("Dummy column(s) %s for categorical column %s clash with existing "
+                             "columns." % (clashes, col))
+        taken_cols.update(dummy_names)
+        logging.info("Expanding categorical column %s into %s dummy column(s) (base level %s)",
+                     col, len(dummy_names), levels[order[0]] if len(order) else None)
+        blocks.append(pd.DataFrame(np.equal.outer(ranks[codes], np.arange(1, order.shape[0])),
+                                   index=reg_data.index, columns=dummy_names, dtype=np.float64))
+
+    return pd.concat(blocks, axis=1)
+
+
+def check_column_variances(var_of_col: Dict[str, float]):
+    """
+    Raises an error if any column (other than CONS_COL_NAME) has a variance of (almost) zero
+
+    :param var_of_col: Dictionary mapping column names to their variances
+    """
+
+    zero_var_cols = {col_name for col_name in var_of_col if col_name != CONS_COL_NAME and
+                     np.isclose(var_of_col[col_name], 0.0)}
+    if zero_var_cols:
+        raise ValueError("Column(s) %s in data has/have a very low variance.  "
+                         "Please remove it to allow matrices to invert." % zero_var_cols)
+
+
+def calculate_moments(data: np.ndarray, weights: np.ndarray = None) -> InternalNamespace:
+    """
+    Calculates the (optionally weighted) sufficient statistics of the columns of a data matrix:
+    the number of rows, the sum of the weights, the column means, and the centered sums of
+    squares and cross-products.  Everything is accumulated in float64 (data of a lower precision
+    is converted a block of rows at a time).
+
+    :param data: 2D array whose columns are the variables of interest
+    :param weights: Optional 1D array of row weights (if not specified, all weights are 1)
+
+    :return: Object holding n, sw (sum of weights), mean, and css (centered cross-products)
+    """
+
+    data = np.asarray(data)
+    if not np.issubdtype(data.dtype, np.floating):
+        data = data.astype(np.float64)
+    moments = InternalNamespace()
+    moments.n, num_cols = data.shape
+    weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+    moments.sw = float(moments.n) if weights is None else weights.sum()
+
+    # Rows are converted to float64 a block at a time (so float32 data is never copied whole):
+    # one pass for the means, and one for the cross-products centered on them
+    row_blocks = [slice(start, start + MOMENTS_BLOCK_ROWS)
+                  for start in range(0, moments.n, MOMENTS_BLOCK_ROWS)]
+    totals = np.zeros(num_cols)
+    for rows in row_blocks:
+        block = np.asarray(data[rows], dtype=np.float64)
+        totals += block.sum(axis=0) if weights is None else np.matmul(weights[rows], block)
+    moments.mean = totals / moments.sw if moments.n else totals
+
+    moments.css = np.zeros((num_cols, num_cols))
+    for rows in row_blocks:
+        centered = np.asarray(data[rows], dtype=np.float64) - moments.mean
+        moments.css += np.matmul(centered.T if weights is None else centered.T * weights[rows],
+                                 centered)
+
+    return moments
+
+
+def combine_moments(left: InternalNamespace, right: InternalNamespace) -> InternalNamespace:
+    """
+    Combines the sufficient statistics of two disjoint sets of rows (pairwise update of Chan et
+    al., which avoids the cancellation error of accumulating raw sums of squares)
+
+    :param left: Moments of the first set of rows (as returned by calculate_moments())
+    :param right: Moments of the second set of rows
+
+    :return: Moments of the union of the two sets of rows
+    """
+
+    if not left.n:
+        return right
+    if not right.n:
+        return left
+
+    combined = InternalNamespace()
+    combined.n = left.n + right.n
+    combined.sw = left.sw + right.sw
+    delta = right.mean - left.mean
+    combined.mean = left.mean + delta * (right.sw / combined.sw)
+    combined.css = left.css + right.css + np.outer(delta, delta) * (left.sw * right.sw /
+                                                                    combined.sw)
+
+    return combined
+
+
+def remove_moments(total: InternalNamespace, part: InternalNamespace) -> InternalNamespace:
+    """
+    Inverse of combine_moments(): downdates the sufficient statistics of a set of rows to remove
+    a subset of those rows.  The moments of the subset can be stacked (leading dimension on each
+    attribute), in which case stacked moments are returned, one per removed subset.
+
+    :param total: Moments of the full set of rows
+    :param part: Moments of the subset(s) of rows to remove
+
+    :return: Moments of the rows that remain after removing each subset
+    """
+
+    part_sw = np.asarray(part.sw, dtype=np.float64)
+
+    remaining = InternalNamespace()
+    remaining.n = total.n - np.asarray(part.n)
+    remaining.sw = total.sw - part_sw
+    remaining.mean = (total.sw * total.mean - part_sw[..., np.newaxis] * part.mean) / \
+                     remaining.sw[..., np.newaxis]
+    delta = part.mean - remaining.mean
+    remaining.css = total.css - part.css - np.einsum("...i,...j->...ij", delta, delta) * \
+                    (remaining.sw * part_sw / total.sw)[..., np.newaxis, np.newaxis]
+
+    return remaining
+
+
+def stack_moments(moments_list: List[InternalNamespace]) -> InternalNamespace:
+    """
+    Stacks a list of moments (as returned by calculate_moments()) so that each attribute gets a
+    leading dimension indexing the list
+
+    :param moments_list: List of moments to stack
+
+    :return: Stacked moments
+    """
+
+    stacked = InternalNamespace()
+    for attr in ["n", "sw", "mean", "css"]:
+        setattr(stacked, attr, np.stack([getattr(moments, attr) for moments in moments_list]))
+
+    return stacked
+
+
+def _moment_indices(cols: List[str], moment_cols: List[str]) -> List[int]:
+    """
+    Maps column names to their positions in the list of columns that moments were calculated for
+
+    :param cols: Column names to look up
+    :param moment_cols: Columns (in order) of the data the moments were calculated from
+
+    :return: List of indices
+    """
+
+    return [moment_cols.index(col) for col in cols]
+
+
+def estimate_R2_from_moments(moments: InternalNamespace, moment_cols: List[str],
+                             pheno: List[str], pgi: List[str]) -> float:
+    """
+    Equivalent of estimate_R2() that works from (unweighted) sufficient statistics.  If the
+    moments are stacked, an array holding the R^2 of each is returned.
+
+    :param moments: Unweighted moments of the regression data
+    :param moment_cols: Columns (in order) of the data the moments were calculated from
+    :param pheno: List containing column name corresponding to phenotype.
+    :param pgi: List containing column name corresponding to PGI.
+
+    :return: R^2 from regression of phenotype on PGI.
+    """
+
+    pheno_idx, pgi_idx = _moment_indices(pheno + pgi, moment_cols)
+    css = moments.css
+
+    return css[..., pheno_idx, pgi_idx] ** 2 / (css[..., pheno_idx, pheno_idx] *
+                                                css[..., pgi_idx, pgi_idx])
+
+
+def streaming_error_correction(iargs: InternalNamespace) -> InternalNamespace:
+    """
+    Runs the error correction procedure without loading the regression data into memory.  The
+    data file is streamed twice in chunks of iargs.chunk_rows rows: first to get the mean and
+    standard deviation of the PGI, then to adjust each chunk (see adjust_regression_data()) and
+    accumulate the sufficient statistics that the procedure needs.
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+
+    :return: Object holding corrected and uncorrected coefficients and standard errors along with
+             rho, h^2, R^2, and sample size (n)
+    """
+
+    # First pass: PGI mean and (population) standard deviation over all non-missing PGI values,
+    # just as adjust_regression_data() would calculate them
+    g_col_name = iargs.pgi_var[0]
+    pgi_moments = calculate_moments(np.empty((0, 1)))
+    for chunk in iter_regression_data_batches(iargs, iargs.chunk_rows):
+        pgi_vals = chunk[g_col_name].to_numpy(dtype=np.float64)
+        pgi_moments = combine_moments(pgi_moments, calculate_moments(
+            pgi_vals[~np.isnan(pgi_vals), np.newaxis]))
+    pgi_stats = (pgi_moments.mean[0], np.sqrt(pgi_moments.css[0, 0] / pgi_moments.n))
+
+    # Second pass: accumulate moments of the adjusted data (weights are included in the unweighted
+    # moments only so that their variance can be checked)
+    moments = wt_moments = moment_cols = None
+    for chunk in iter_regression_data_batches(iargs, iargs.chunk_rows):
+        chunk_data = adjust_regression_data(chunk, iargs, pgi_stats, check_variance=False)
+        moment_cols = iargs.G_cols + iargs.z_cols + iargs.y_cols + iargs.pheno_cols + \
+                      iargs.wt_cols
+        values = chunk_data[moment_cols].to_numpy(dtype=np.float64)
+
+        chunk_moments = calculate_moments(values)
+        moments = combine_moments(moments, chunk_moments) if moments else chunk_moments
+        if iargs.wt_cols:
+            chunk_wt_moments = calculate_moments(values, values[:, -1])
+            wt_moments = combine_moments(wt_moments, chunk_wt_moments) if wt_moments else \
+                         chunk_wt_moments
+
+    if not moments or moments.n < 2:
+        raise ValueError("Not enough rows without missing values in the regression data file.")
+    logging.info("Read in data for %s individuals.\n", moments.n)
+
+    check_column_variances(dict(zip(moment_cols, np.diagonal(moments.css) / (moments.n - 1))))
+
+    return error_correction_from_moments(iargs, moments, wt_moments if wt_moments else moments,
+                                         moment_cols)
+
+
+def se_helper(df: pd.DataFrame) -> pd.Series:
+    """
+    Calculates the standard errors for a set of jack-knife runs
+
+    :param df: DataFrame where each row is a JK iteration
+
+    :return: Series containing the JK standard errors
+    """
+    num_rows = len(df.index)
+    return np.sqrt(float(num_rows - 1)) * df.std(axis=0, ddof=0)
+
+
+def jack_knife_se(iargs: InternalNamespace, reg_data: pd.DataFrame, pgic_result: InternalNamespace):
+    """
+    1) Assign each person to a jack knife iteration.
+    2) For each iteration:
+            - restrict bfile, grm, regression data to people _not_ in block
+            - estimate R^2, h^2, rho, alpha_{corr}
+            - store results
+    3) Calculate SE's using formula
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: Dataframe containing regression data
+    :param pgic_result: Internal namespace object that holds initial pgic results
+    """
+
+    logging.info("Beginning jack knife estimation.")
+
+    # Check for a number of blocks that's too large
+    if iargs.num_blocks > reg_data.shape[0]:
+        raise ValueError("You cannot specify more jack knife blocks than there are people in "
+                         "your --reg-data-file. You specified %s blocks, and your data is %s rows" %
+                         (iargs.num_blocks, reg_data.shape[0]))
+
+    # Label iterations and duplicate ID col to make GCTA happy (if needed)
+    reg_data_shuf = reg_data.sample(frac=1).reset_index(drop=True)
+    if iargs.calc_h2:
+        reg_data_shuf["FID"] = reg_data_shuf[iargs.id_col[0]]
+        # If a second ID column is specified, use that, otherwise the two ID columns are equivalent
+        reg_data_shuf["IID"] = reg_data_shuf[iargs.id_col[1]]  if len(iargs.id_col) == 2 else \
+                               reg_data_shuf.FID
+
+    # If the relatedness cutoff has been applied to the GRM, the individuals kept in it are
+    # spread evenly over the blocks (and the others separately), so each leave-one-block-out h^2
+    # estimation drops the same share of the pruned GRM
+    kept_ids = getattr(iargs, "grm_kept_ids", None)
+    if iargs.calc_h2 and kept_ids is not None:
+        in_grm = pd.MultiIndex.from_frame(reg_data_shuf[["FID", "IID"]].astype(str)).isin(
+            pd.MultiIndex.from_frame(kept_ids))
+        iteration = np.empty(reg_data_shuf.shape[0], dtype=int)
+        for group in [in_grm, ~in_grm]:
+            iteration[group] = np.arange(np.count_nonzero(group)) * iargs.num_blocks // \
+                               max(np.count_nonzero(group), 1)
+        reg_data_shuf["iteration"] = iteration
+        logging.debug("Assigned the %s individuals in the pruned GRM evenly to the jack knife "
+                      "blocks", np.count_nonzero(in_grm))
+    else:
+        block_size = np.ceil(reg_data_shuf.shape[0] / iargs.num_blocks)
+        reg_data_shuf["iteration"] = [int(i / block_size) for i in range(reg_data_shuf.shape[0])]
+
+    # Gather results from each JK iteration
+    uncorr_alpha_cols = ["uncorr_" + c for c in iargs.alpha_cols]
+    corr_alpha_cols = ["corr_" + c for c in iargs.alpha_cols]
+    result_cols = ["h2", "R2", "rho"] + uncorr_alpha_cols + corr_alpha_cols
+
+    if iargs.jk_method == JK_METHOD_REFIT:
+        # Estimate h^2 of all iterations first (concurrently), if needed
+        lo_h2 = leave_out_h2_estimates(iargs, reg_data_shuf) if iargs.calc_h2 else \
+                [None] * iargs.num_blocks
+
+        # Run the jack knife iterations (in a pool of worker processes if requested)
+        jk_workers = getattr(iargs, "jk_workers", 1)
+        if jk_workers > 1:
+            iter_results = parallel_leave_out_est(iargs, reg_data_shuf, jk_workers, lo_h2)
+        else:
+            iter_results = [leave_out_est(iter_num, iargs, reg_data_shuf, iargs.grm, iargs.z_cols,
+                                          lo_h2[iter_num]) for iter_num in range(iargs.num_blocks)]
+
+        jk_res_table = pd.DataFrame(index=range(iargs.num_blocks), columns=result_cols)
+        for iter_num, iter_result in enumerate(iter_results):
+            h2_r2_rho = np.array([iter_result["h2"], iter_result["R2"], iter_result["rho"]])
+            jk_res_table.iloc[iter_num] = np.concatenate(
+                (h2_r2_rho, iter_result["alpha_uncorr"], iter_result["alpha_corr"]))
+    else:
+        jk_res_table = pd.DataFrame(downdated_jack_knife_estimates(iargs, reg_data_shuf),
+                                    columns=result_cols)
+    logging.debug("\nJack-knife result table:\n%s", jk_res_table)
+
+    # Calculate standard errors
+    se_vector = se_helper(jk_res_table)
+    logging.debug("\nJack-knife standard errors:\n%s", se_vector)
+
+    # Fill in standard errors in the internal namespace object
+    pgic_result.h2_se = None if iargs.h2 else se_vector["h2"]
+    pgic_result.R2_se = None if iargs.R2 else se_vector["R2"]
+    pgic_result.rho_se = None if iargs.h2 and iargs.R2 else se_vector["rho"]
+    pgic_result.uncorrected_alphas_se = se_vector.loc[uncorr_alpha_cols]
+    pgic_result.corrected_alphas_se = se_vector.loc[corr_alpha_cols].to_numpy()
+
+
+def bootstrap_se(iargs: InternalNamespace, reg_data: pd.DataFrame,
+                 pgic_result: InternalNamespace):
+    """
+    Calculates standard errors from the replicates of a bootstrap that reweights the observations
+    (see bootstrap_estimates()) and stores them in pgic_result
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: Dataframe containing regression data
+    :param pgic_result: Internal namespace object that holds initial pgic results
+    """
+
+    logging.info("Beginning %s bootstrap estimation with %s replicates.", iargs.bootstrap_method,
+                 iargs.bootstrap)
+
+    uncorr_alpha_cols = ["uncorr_" + c for c in iargs.alpha_cols]
+    corr_alpha_cols = ["corr_" + c for c in iargs.alpha_cols]
+    boot_res_table = pd.DataFrame(bootstrap_estimates(iargs, reg_data, pgic_result.h2),
+                                  columns=["R2", "rho"] + uncorr_alpha_cols + corr_alpha_cols)
+    logging.debug("\nBootstrap result table:\n%s", boot_res_table)
+
+    se_vector = boot_res_table.std(axis=0, ddof=1)
+    logging.debug("\nBootstrap standard errors:\n%s", se_vector)
+
+    # Fill in standard errors in the internal namespace object (h^2 is held fixed)
+    pgic_result.h2_se = None
+    pgic_result.R2_se = None if iargs.R2 else se_vector["R2"]
+    pgic_result.rho_se = None if iargs.R2 else se_vector["rho"]
+    pgic_result.uncorrected_alphas_se = se_vector.loc[uncorr_alpha_cols]
+    pgic_result.corrected_alphas_se = se_vector.loc[corr_alpha_cols].to_numpy()
+
+
+def bootstrap_estimates(iargs: InternalNamespace, reg_data: pd.DataFrame, h2: float) -> np.ndarray:
+    """
+    Calculates the estimates of every replicate of a bootstrap that reweights the observations
+    instead of resampling them.  The weighted moments of all replicates are accumulated together
+    (for each chunk of rows, one matrix product of the replicates' weights and the rows' values
+    and pairwise products), and R^2, rho, and the uncorrected and corrected coefficients of all
+    replicates are then calculated from those stacked moments.  Only the upper triangle of the
+    pairwise products is accumulated, and chunks are sized so that both the replicates' weights
+    and the rows' values and products stay within DEFAULT_BOOTSTRAP_CHUNK_ELEMENTS.  The weights
+    are drawn a row at a time, so they don't depend on the chunk size.
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: DataFrame of regression data
+    :param h2: Value of h^2 (held fixed across the replicates)
+
+    :return: Array with one row per replicate holding R^2, rho, the uncorrected coefficients, and
+             the corrected coefficients
+    """
+
+    # Columns needed for the moments, centered on their means to limit cancellation error
+    moment_cols = iargs.G_cols + iargs.z_cols + iargs.y_cols
+    if not iargs.R2:
+        moment_cols += [col for col in iargs.pgi_pheno_var if col not in moment_cols]
+    values = design_matrix(reg_data, moment_cols)
+    weights = reg_data[iargs.wt_cols[0]].to_numpy(dtype=np.float64) if iargs.wt_cols else None
+    shift = values.mean(axis=0, dtype=np.float64)
+    num_rows, num_cols = values.shape
+
+    # Accumulate the weighted sums of 1, the values, and their pairwise products (upper triangle)
+    # of all replicates
+    rng = np.random.default_rng(iargs.bootstrap_seed)
+    upper_rows, upper_cols = np.triu_indices(num_cols)
+    row_elements = 1 + num_cols + upper_rows.shape[0]
+    chunk_rows = max(1, DEFAULT_BOOTSTRAP_CHUNK_ELEMENTS // (iargs.bootstrap + row_elements))
+    totals = np.zeros((iargs.bootstrap, row_elements))
+    wt_totals = np.zeros_like(totals) if iargs.wt_cols else totals
+    for start in range(0, num_rows, chunk_rows):
+        centered = values[start:start + chunk_rows] - shift
+        chunk_values = np.column_stack((np.ones(centered.shape[0]), centered,
+                                        centered[:, upper_rows] * centered[:, upper_cols]))
+        if iargs.bootstrap_method == BOOTSTRAP_BAYESIAN:
+            boot_weights = rng.standard_exponential((centered.shape[0], iargs.bootstrap)).T
+        else:
+            boot_weights = rng.poisson(1.0, (centered.shape[0], iargs.bootstrap)).T.astype(
+                np.float64)
+        totals += np.matmul(boot_weights, chunk_values)
+        if iargs.wt_cols:
+            wt_totals += np.matmul(boot_weights * weights[start:start + chunk_rows], chunk_values)
+
+    # Flat Dirichlet weights are the exponential draws normalized to sum to the sample size
+    if iargs.bootstrap_method == BOOTSTRAP_BAYESIAN:
+        scale = num_rows / totals[:, 0]
+        totals = totals * scale[:, np.newaxis]
+        wt_totals = wt_totals * scale[:, np.newaxis] if iargs.wt_cols else totals
+
+    # Determine R^2 of each replicate (estimating it if necessary) and then rho
+    moments = _moments_from_weighted_totals(totals, shift, totals[:, 0])
+    wt_moments = _moments_from_weighted_totals(wt_totals, shift, totals[:, 0]) if iargs.wt_cols \
+                 else moments
+    R2 = np.full(iargs.bootstrap, iargs.R2) if iargs.R2 else estimate_R2_from_moments(
+        moments, moment_cols, iargs.pgi_pheno_var, iargs.pgi_var)
+    rho = calculate_rho(h2=h2, r2=R2)
+    low_rho_count = np.count_nonzero(rho < 1.0)
+    if low_rho_count:
+        warn_or_raise(iargs.force, "It is unexpected that the estimated rho is less than 1.0 in "
+            "%s bootstrap replicate(s).  You should double-check that the dependent variable in "
+            "the R^2 calculation corresponds to the PGI phenotype.", low_rho_count)
+
+    # Calculate the uncorrected and corrected coefficients of all replicates
+    alpha_uncorr = regression_from_moments(wt_moments, _moment_indices(iargs.alpha_cols,
+                                                                       moment_cols),
+                                           _moment_indices(iargs.y_cols, moment_cols)[0])[0]
+    corr_matrices = calculate_correction_matrix_from_moments(
+        iargs.G_cols, iargs.z_cols, iargs.z_int_cols, moments, moment_cols, rho)
+    alpha_corr = np.einsum("bij,bj->bi", corr_matrices, alpha_uncorr)
+
+    return np.column_stack((R2, rho, alpha_uncorr, alpha_corr))
+
+
+def _moments_from_weighted_totals(totals: np.ndarray, shift: np.ndarray,
+                                  n: np.ndarray) -> InternalNamespace:
+    """
+    Converts stacked weighted sums of 1, of the (shifted) values, and of the upper triangle of
+    their pairwise products (as accumulated by bootstrap_estimates()) into stacked moments (see
+    calculate_moments())
+
+    :param totals: Array with one row of sums per replicate
+    :param shift: Values that were subtracted from the columns before summing
+    :param n: Number of observations that each replicate represents
+
+    :return: Stacked moments
+    """
+
+    num_cols = shift.shape[0]
+    sw = totals[:, 0]
+    sums = totals[:, 1:num_cols + 1]
+    moments = InternalNamespace()
+    moments.n = n
+    moments.sw = sw
+    moments.mean = shift + sums / sw[:, np.newaxis]
+    upper_rows, upper_cols = np.triu_indices(num_cols)
+    products = np.empty((totals.shape[0], num_cols, num_cols))
+    products[:, upper_rows, upper_cols] = totals[:, num_cols + 1:]
+    products[:, upper_cols, upper_rows] = totals[:, num_cols + 1:]
+    moments.css = products - np.einsum("bi,bj->bij", sums, sums) / sw[:, np.newaxis, np.newaxis]
+
+    return moments
+
+
+def parallel_leave_out_est(iargs: InternalNamespace, reg_data: pd.DataFrame,
+                           num_workers: int, lo_h2: List[float]) -> List[Dict]:
+    """
+    Runs leave_out_est() for every jack knife iteration in a pool of worker processes.  The
+    shuffled regression data is published to the workers once through files in the temporary
+    directory (the floating point columns as a memory-mapped array) rather than being sent along
+    with each task.  Results are returned in iteration order, so they match a serial run.
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: DataFrame of shuffled regression data with the "iteration" column
+    :param num_workers: Number of worker processes
+    :param lo_h2: h^2 of each iteration (None entries if h^2 does not need to be estimated)
+
+    :return: List of leave_out_est() results, one per iteration
+    """
+
+    logging.info("Running %s jack knife iterations using %s worker processes...",
+                 iargs.num_blocks, num_workers)
+
+    float_file, float_cols, other_file = _publish_jk_reg_data(iargs, reg_data)
+    try:
+        with multiprocessing.Pool(num_workers, initializer=_init_jk_worker,
+                                  initargs=(iargs, float_file, float_cols, other_file,
+                                            lo_h2)) as pool:
+            return pool.map(_jk_worker_leave_out_est, range(iargs.num_blocks), chunksize=1)
+    finally:
+        os.remove(float_file)
+        os.remove(other_file)
+
+
+def _publish_jk_reg_data(iargs: InternalNamespace, reg_data: pd.DataFrame) -> Tuple[
+        str, List[str], str]:
+    """
+    Writes the regression data for the jack knife workers to the temporary directory: the
+    columns of the regression data's floating point type (see reg_data_float_dtype()) to a .npy
+    file that the workers memory-map, and the remaining columns to a pickle file
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: DataFrame of shuffled regression data with the "iteration" column
+
+    :return: Tuple of the .npy file, the names of the columns in it, and the pickle file
+    """
+
+    float_dtype = reg_data_float_dtype(iargs)
+    float_cols = [col for col in reg_data.columns if reg_data[col].dtype == float_dtype]
+    other_cols = [col for col in reg_data.columns if col not in float_cols]
+    float_file = os.path.join(iargs.temp_dir, "jk_reg_data.npy")
+    other_file = os.path.join(iargs.temp_dir, "jk_reg_data_other.pkl")
+    np.save(float_file, np.ascontiguousarray(reg_data[float_cols].to_numpy(dtype=float_dtype)))
+    reg_data[other_cols].to_pickle(other_file)
+
+    return float_file, float_cols, other_file
+
+
+def _init_jk_worker(iargs: InternalNamespace, float_file: str, float_cols: List[str],
+                    other_file: str, lo_h2: List[float]):
+    """
+    Initializer of jack knife worker processes that attaches to the published regression data
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param float_file: .npy file holding the floating point columns of the regression data
+    :param float_cols: Names of the columns in float_file
+    :param other_file: Pickle file holding the remaining columns of the regression data
+    :param lo_h2: h^2 of each iteration (None entries if h^2 does not need to be estimated)
+    """
+
+    global _jk_worker_state
+
+    # Wrap the memory-mapped array (without copying it, so the pages are shared between the
+    # workers) in a DataFrame, and add the remaining columns
+    other_data = pd.read_pickle(other_file)
+    reg_data = pd.DataFrame(np.load(float_file, mmap_mode="r"), index=other_data.index,
+                            columns=float_cols, copy=False)
+    for col in other_data.columns:
+        reg_data[col] = other_data[col]
+
+    _jk_worker_state = InternalNamespace()
+    _jk_worker_state.iargs = iargs
+    _jk_worker_state.reg_data = reg_data
+    _jk_worker_state.lo_h2 = lo_h2
+
+
+def _jk_worker_leave_out_est(iteration: int) -> Dict:
+    """
+    Runs leave_out_est() for one jack knife iteration in a worker process
+
+    :param iteration: Jack knife iteration
+
+    :return: Result of leave_out_est()
+    """
+
+    iargs = _jk_worker_state.iargs
+    return leave_out_est(iteration, iargs, _jk_worker_state.reg_data, iargs.grm, iargs.z_cols,
+                         _jk_worker_state.lo_h2[iteration])
+
+
+def downdated_jack_knife_estimates(iargs: InternalNamespace, reg_data: pd.DataFrame) -> np.ndarray:
+    """
+    Calculates the leave-one-block-out estimates of every jack knife iteration without re-running
+    the procedure on each restricted dataset.  The moments of each block are calculated once, the
+    moments of each leave-one-block-out dataset are derived by removing the block's moments from
+    the totals, and then R^2, rho, and the uncorrected and corrected coefficients of all iterations
+    are calculated together from those stacked moments.  Only h^2 (if it needs to be estimated)
+    is still estimated one iteration at a time.
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: DataFrame of shuffled regression data with the "iteration" column
+
+    :return: Array with one row per iteration holding h^2, R^2, rho, the uncorrected
+             coefficients, and the corrected coefficients
+    """
+
+    # Columns needed for the moments
+    moment_cols = iargs.G_cols + iargs.z_cols + iargs.y_cols
+    if not iargs.R2:
+        moment_cols += [col for col in iargs.pgi_pheno_var if col not in moment_cols]
+    values = design_matrix(reg_data, moment_cols)
+    weights = reg_data[iargs.wt_cols[0]].to_numpy(dtype=np.float64) if iargs.wt_cols else None
+
+    # Calculate the moments of each block and of the full dataset
+    block_rows = [np.flatnonzero(reg_data.iteration.to_numpy() == iter_num)
+                  for iter_num in range(iargs.num_blocks)]
+    moments = calculate_moments(values)
+    block_moments = stack_moments([calculate_moments(values[rows]) for rows in block_rows])
+    lo_moments = remove_moments(moments, block_moments)
+    if iargs.wt_cols:
+        wt_block_moments = stack_moments([calculate_moments(values[rows], weights[rows])
+                                          for rows in block_rows])
+        lo_wt_moments = remove_moments(calculate_moments(values, weights), wt_block_moments)
+    else:
+        lo_wt_moments = lo_moments
+
+    # Determine h^2 and R^2 of each iteration (estimating them if necessary) and then rho
+    h2 = np.full(iargs.num_blocks, iargs.h2) if iargs.h2 else \
+         leave_out_h2_estimates(iargs, reg_data)
+    R2 = np.full(iargs.num_blocks, iargs.R2) if iargs.R2 else estimate_R2_from_moments(
+        lo_moments, moment_cols, iargs.pgi_pheno_var, iargs.pgi_var)
+    rho = calculate_rho(h2=h2, r2=R2)
+    low_rho_count = np.count_nonzero(rho < 1.0)
+    if low_rho_count:
+        warn_or_raise(iargs.force, "It is unexpected that the estimated rho is less than 1.0 in "
+            "%s jack knife iteration(s).  You should double-check that the dependent variable in "
+            "the R^2 calculation corresponds to the PGI phenotype.", low_rho_count)
+
+    # Calculate the uncorrected and corrected coefficients of all iterations
+    alpha_uncorr = regression_from_moments(lo_wt_moments, _moment_indices(iargs.alpha_cols,
+                                                                          moment_cols),
+                                           _moment_indices(iargs.y_cols, moment_cols)[0])[0]
+    corr_matrices = calculate_correction_matrix_from_moments(
+        iargs.G_cols, iargs.z_cols, iargs.z_int_cols, lo_moments, moment_cols, rho)
+    alpha_corr = np.einsum("bij,bj->bi", corr_matrices, alpha_uncorr)
+
+    return np.column_stack((h2, R2, rho, alpha_uncorr, alpha_corr))
+
+
+def leave_out_h2_estimates(iargs: InternalNamespace, reg_data: pd.DataFrame) -> np.ndarray:
+    """
+    Estimates h^2 with each jack knife block removed.  The external jobs of the iterations are
+    run concurrently (--h2-jobs at a time), with the --num-threads budget split between them.
+    Every iteration is attempted; failures are reported together afterward.
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: DataFrame of regression data (with FID, IID, and iteration columns).
+
+    :return: Array holding the h^2 estimate of each iteration
+    """
+
+    # In-process estimators handle all iterations in a single call (randomized Haseman-Elston
+    # regression in one pass over the genotypes)
+    h2_method = getattr(iargs, "h2_method", H2_METHOD_REML)
+    if h2_method != H2_METHOD_REML:
+        logging.info("Estimating leave-one-block-out heritability for %s jack knife iterations...",
+                     iargs.num_blocks)
+        removed_ids = [reg_data.loc[reg_data.iteration == iter_num, ["FID", "IID"]]
+                       for iter_num in range(iargs.num_blocks)]
+        if h2_method == H2_METHOD_RHE:
+            return rhe_h2_estimates(iargs, removed_ids)
+        return np.array([h2 for h2, _ in reml_eigen_h2_estimates(iargs, removed_ids)])
+
+    num_jobs = min(iargs.h2_jobs, iargs.num_threads, iargs.num_blocks)
+    if num_jobs < iargs.h2_jobs:
+        logging.warning("Running %s simultaneous heritability jobs instead of the requested %s "
+                        "(limited by --num-threads and --num-blocks).", num_jobs, iargs.h2_jobs)
+    threads_per_job = iargs.num_threads // num_jobs
+    logging.info("Estimating leave-one-block-out heritability for %s jack knife iterations "
+                 "(%s simultaneous job(s) using %s thread(s) each)...", iargs.num_blocks, num_jobs,
+                 threads_per_job)
+
+    grm = open_grm(iargs.grm)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_jobs) as executor:
+        jobs = [executor.submit(leave_out_h2, iter_num, iargs, reg_data, iargs.grm,
+                                threads_per_job, grm) for iter_num in range(iargs.num_blocks)]
+
+        h2 = np.full(iargs.num_blocks, np.nan)
+        failures = []
+        for iter_num, job in enumerate(jobs):
+            try:
+                h2[iter_num] = job.result()
+            except Exception as e:
+                failures.append("iteration %s: %s" % (iter_num, e))
+
+    if failures:
+        raise RuntimeError("Leave-one-block-out heritability estimation failed for %s of %s jack "
+                           "knife iterations:\n%s" % (len(failures), iargs.num_blocks,
+                                                       "\n".join(failures)))
+
+    return h2
+
+
+def leave_out_h2(iteration: int, iargs: InternalNamespace, reg_data: pd.DataFrame,
+                 grm_prefix: str, num_threads: int = None, grm: InternalNamespace = None) -> float:
+    """
+    Remove block from GRM and estimate h^2.  Uses temporary directory indicated in iargs and
+    assumes no responsbility for cleanup.  All files written are specific to the iteration, so
+    iterations can be run concurrently.
+
+    :param iteration: Current block number of jack knife iteration.
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: DataFrame of regression data (with FID, IID, and iteration columns).
+    :param grm_prefix: Full prefix to GRM files
+    :param num_threads: Number of threads for GCTA (defaults to --num-threads)
+    :param grm: GRM opened by open_grm() (opened from grm_prefix if not specified)
+
+    :return: Estimate of h^2 with the block removed
+    """
+
+    # Check for a cached estimate first
+    remove = reg_data.loc[reg_data.iteration == iteration, ["FID", "IID"]].astype(str)
+    cache_key = h2_cache_key(iargs, remove)
+    h2 = load_cached_h2(iargs, cache_key)
+    if h2 is not None:
+        return h2
+
+    num_threads = num_threads if num_threads else iargs.num_threads
+    grm = grm if grm else open_grm(grm_prefix)
+    full_prefix_to_restricted_grm = "%s/removed_grm_%s" % (iargs.temp_dir, iteration)
+
+    # Write the GRM without the individuals in the block
+    keep_idx = np.flatnonzero(~pd.MultiIndex.from_frame(grm.ids).isin(
+        pd.MultiIndex.from_frame(remove)))
+    logging.debug("Writing GRM for jack knife iteration %s (%s of %s individuals kept) to %s",
+                  iteration, keep_idx.shape[0], len(grm.ids), full_prefix_to_restricted_grm)
+    write_restricted_grm(grm, keep_idx, full_prefix_to_restricted_grm)
+
+    # Estimate h^2 and then discard the (large) restricted GRM matrices
+    try:
+        h2 = estimate_h2(iargs, iargs.gcta_exec, iargs.pheno_file, iargs.temp_dir,
+                         iargs.grm_cutoff, full_prefix_to_restricted_grm, num_threads,
+                         iargs.quiet_h2, "h2est_%s" % iteration)
+        store_cached_h2(iargs, cache_key, h2, "%s/h2est_%s.log" % (iargs.temp_dir, iteration))
+        return h2
+    finally:
+        for suffix in [GRM_BIN_SUFFIX, GRM_N_BIN_SUFFIX]:
+            if os.path.exists(full_prefix_to_restricted_grm + suffix):
+                os.remove(full_prefix_to_restricted_grm + suffix)
+
+
+def leave_out_est(iteration: int, iargs: InternalNamespace, reg_data: pd.DataFrame,
+                  grm_prefix: str, covs: List, h2: float = None) -> Dict:
+    """
+    Remove block from GRM and regression data and run estimation.  Uses temporary directory
+    indicated in iargs and assumes no responsbility for cleanup
+
+    :param iteration: Current block number of jack knife iteration.
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param reg_data: DataFrame of regression data.
+    :param grm: Full prefix to GRM files
+    :param covs: Covariates in specification.
+    :param h2: h^2 of the iteration if it was already estimated with the block removed
+
+    :return: Parameter estimates as a dictionary
     """
 
     logging.info("\n============= JK ITERATION %s =============\n", iteration)
 
-    # Make copy of internal namespace
-    iargs_copy = copy.copy(iargs)
+    # Make copy of internal namespace (the sensitivity grid is only for the full sample)
+    iargs_copy = copy.copy(iargs)
+    iargs_copy.h2_grid = iargs_copy.rho_grid = None
+
+    # If h^2 needs to be estimated, do that now with a restricted GRM
+    if h2 is not None:
+        iargs_copy.h2 = h2
+    elif iargs.calc_h2:
+        iargs_copy.h2 = leave_out_h2(iteration, iargs, reg_data, grm_prefix)
+
+    # Call the main procedure with a pared down dataframe
+    restricted_reg_data = reg_data[reg_data.iteration != iteration]
+    iargs_copy.reg_data_file = None
+    corr_result = error_correction_procedure(iargs_copy, restricted_reg_data)
+
+    # Return the results in dictionary form
+    return {"h2" : corr_result.h2, "R2" : corr_result.R2, "rho" : corr_result.rho,
+            "alpha_corr" : corr_result.corrected_alphas,
+            "alpha_uncorr" : corr_result.uncorrected_alphas}
+
+
+def calculate_corrected_coefficients(corr_matrix: np.ndarray,
+                                     coefficients: np.ndarray) -> np.ndarray:
+    """
+    Generates corrected coefficients from a correction matrix and uncorrected coefficients
+
+    :param corr_matrix: Correction matrix to use
+    :param coefficients: Coefficients to be corrected
+
+    :return: Array of corrected coefficients
+    """
+
+    return np.matmul(corr_matrix, coefficients)
+
+
+def calculate_corrected_coeff_stderrs(corr_matrix: np.ndarray,
+                                      var_cov_matrix: np.ndarray) -> np.ndarray:
+    """
+    Generates corrected coefficient standard errors
+
+    :param corr_matrix: Correction matrix to use
+    :param var_cov_matrix: Variance-covariance matrix of coefficients to correct
+
+    :return: Array of corrected coefficient standard errors
+    """
+
+    prod = np.linalg.multi_dot([corr_matrix, var_cov_matrix, corr_matrix.T])
+
+    return np.sqrt(np.diagonal(prod))
+
+
+
+def calculate_center_matrix(V_ghat: np.ndarray, rho: float, z_int_mean: np.ndarray,
+                            z_int_cov: np.ndarray, g_var: float = None) -> np.ndarray:
+    """
+    Calculates the center matrix component of the product that is the final correction matrix.
+    Also works on stacks of inputs (leading dimensions of the arrays and of rho are broadcast),
+    in which case a stack of center matrices is returned.
+
+    :param V_ghat: Covariance matrix of [G, z]
+    :param rho: Value of rho to use
+    :param z_int_mean: Mean of z_int
+    :param z_int_cov: Covariance matrix of z_int
+    :param g_var: Variance of the (standardized) PGI in V_ghat if it isn't 1, as after fixed
+                  effects are swept out.  Only the PGI's measurement error variance
+                  (1 - 1/rho^2) is then removed from it.
+
+    :return: Center matrix to use in correction matrix product
+    """
+
+    # Calculate values used later
+    rho_sq_recip = pow(rho, -2)
+    one_minus_rho_sq_recip = np.asarray(1.0 - rho_sq_recip)
+    z_int_count = z_int_cov.shape[-1] if z_int_cov.shape else 1 # Shape is () if 1x1 matrix
+    z_int_mean = np.asarray(z_int_mean)
+
+    # Take V_ghat, replace (0,0) entry with 1/rho^2, and modify the rest of the matrix as needed
+    mod_copy_of_V_ghat = np.array(np.broadcast_to(
+        V_ghat, one_minus_rho_sq_recip.shape + V_ghat.shape[-2:]), dtype=np.float64)
+
+    mod_copy_of_V_ghat[..., 0, 0] = rho_sq_recip if g_var is None else \
+                                    g_var - one_minus_rho_sq_recip
+
+    mod_copy_of_V_ghat[..., 0, 1:z_int_count+1] -= (one_minus_rho_sq_recip[..., np.newaxis] *
+                                                    z_int_mean)
+    mod_copy_of_V_ghat[..., 1:z_int_count+1, 0] = mod_copy_of_V_ghat[..., 0, 1:z_int_count+1]
+
+    mod_copy_of_V_ghat[..., 1:z_int_count+1, 1:z_int_count+1] -= \
+        one_minus_rho_sq_recip[..., np.newaxis, np.newaxis] * (
+            z_int_cov + np.einsum("...i,...j->...ij", z_int_mean, z_int_mean))
+
+    # Return inverse of the previously calculated matrix
+    if mod_copy_of_V_ghat.ndim == 2:
+        logging.debug("\nuninverted center matrix = \n%s", mod_copy_of_V_ghat)
+    return np.linalg.inv(mod_copy_of_V_ghat)
+
+
+def calculate_correction_matrix(G_cols: List[str], z_cols: List[str], z_int_cols: List[str],
+                                df: pd.DataFrame, rho: float) -> np.ndarray:
+    """
+    Generates the correction matrix
+
+    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
+    :param z_cols: List of columns in z vector = covariate columns
+    :param z_int_cols: List of z columns that correspond (in order) to the non-pgi elements of G
+    :param df: DataFrame with the required regression data
+    :param rho: Value of rho
+
+    :return: Matrix used to correct coefficients and standard errors
+    """
+
+    return build_correction_matrix(len(G_cols), *correction_matrix_inputs(G_cols, z_cols,
+                                                                          z_int_cols, df), rho)
+
+
+def correction_matrix_inputs(G_cols: List[str], z_cols: List[str], z_int_cols: List[str],
+                             df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calculates the statistics of the regression data that the correction matrix is built from
+
+    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
+    :param z_cols: List of columns in z vector = covariate columns
+    :param z_int_cols: List of z columns that correspond (in order) to the non-pgi elements of G
+    :param df: DataFrame with the required regression data
+
+    :return: Tuple of V_ghat and the mean and covariance matrix of z_int
+    """
+
+    # Calculate the V_ghat matrix (rightmost matrix of the 3-matrix product) along with the
+    # mean and covariance of z_int (used in the center matrix) from one pass over the data (the
+    # z_int columns are normally among the covariates already)
+    moment_cols = G_cols + z_cols + [col for col in z_int_cols if col not in z_cols]
+    moments = calculate_moments(design_matrix(df, moment_cols))
+
+    return correction_matrix_inputs_from_moments(G_cols, z_cols, z_int_cols, moments, moment_cols)
+
+
+def calculate_correction_matrix_from_moments(G_cols: List[str], z_cols: List[str],
+                                             z_int_cols: List[str], moments: InternalNamespace,
+                                             moment_cols: List[str], rho: float) -> np.ndarray:
+    """
+    Equivalent of calculate_correction_matrix() that works from (unweighted) sufficient statistics.
+    If the moments (and rho) are stacked, a stack of correction matrices is returned.
+
+    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
+    :param z_cols: List of columns in z vector = covariate columns
+    :param z_int_cols: List of z columns that correspond (in order) to the non-pgi elements of G
+    :param moments: Unweighted moments of the regression data
+    :param moment_cols: Columns (in order) of the data the moments were calculated from
+    :param rho: Value of rho
+
+    :return: Matrix used to correct coefficients and standard errors
+    """
+
+    return build_correction_matrix(len(G_cols), *correction_matrix_inputs_from_moments(
+        G_cols, z_cols, z_int_cols, moments, moment_cols), rho)
+
+
+def correction_matrix_inputs_from_moments(G_cols: List[str], z_cols: List[str],
+                                          z_int_cols: List[str], moments: InternalNamespace,
+                                          moment_cols: List[str]) -> Tuple[np.ndarray, np.ndarray,
+                                                                           np.ndarray]:
+    """
+    Equivalent of correction_matrix_inputs() that works from (unweighted) sufficient statistics
+
+    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
+    :param z_cols: List of columns in z vector = covariate columns
+    :param z_int_cols: List of z columns that correspond (in order) to the non-pgi elements of G
+    :param moments: Unweighted moments of the regression data
+    :param moment_cols: Columns (in order) of the data the moments were calculated from
+
+    :return: Tuple of V_ghat and the mean and covariance matrix of z_int
+    """
+
+    Gz_idx = _moment_indices(G_cols + z_cols, moment_cols)
+    z_int_idx = _moment_indices(z_int_cols, moment_cols)
+    dof = np.asarray(moments.n - 1, dtype=np.float64)[..., np.newaxis, np.newaxis]
+
+    V_ghat = moments.css[..., Gz_idx, :][..., Gz_idx] / dof
+    z_int_mean = moments.mean[..., z_int_idx]
+    z_int_cov = moments.css[..., z_int_idx, :][..., z_int_idx] / dof
+
+    return V_ghat, z_int_mean, z_int_cov
+
+
+def build_correction_matrix(size_of_G: int, V_ghat: np.ndarray, z_int_mean: np.ndarray,
+                            z_int_cov: np.ndarray, rho: float, g_var: float = None) -> np.ndarray:
+    """
+    Generates the correction matrix from the covariance matrix of [G, z] and the mean and
+    covariance matrix of z_int
+
+    :param size_of_G: Number of columns in G vector
+    :param V_ghat: Covariance matrix of [G, z]
+    :param z_int_mean: Mean of z_int
+    :param z_int_cov: Covariance matrix of z_int
+    :param rho: Value of rho
+    :param g_var: Variance of the PGI in V_ghat if it isn't 1 (see calculate_center_matrix())
+
+    :return: Matrix used to correct coefficients and standard errors
+    """
+
+    # Only log single (not stacked) matrices
+    log_matrices = V_ghat.ndim == 2
+    if log_matrices:
+        logging.debug("\nV_ghat = \n%s", V_ghat)
+        logging.debug("\nz_int_mean = \n%s", z_int_mean)
+        logging.debug("\nz_int_cov = \n%s", z_int_cov)
+
+    # Calculate center matrix (start with V_ghat, since it shares much of that matrix)
+    center_matrix = calculate_center_matrix(V_ghat, rho, z_int_mean, z_int_cov, g_var)
+    if log_matrices:
+        logging.debug("\ncenter_matrix = \n%s", center_matrix)
+
+    # Calculate the correction matrix
+    corr_matrix = np.matmul(center_matrix, V_ghat)   # Almost correct, needs one more multiplication
+    corr_matrix[..., 0:size_of_G, :] *= np.reciprocal(
+        np.asarray(rho, dtype=np.float64))[..., np.newaxis, np.newaxis] # Adjust for lefthand matmul
+    if log_matrices:
+        logging.debug("\nCorrection matrix = \n%s", corr_matrix)
+
+    return corr_matrix
+
+
+def build_correction_matrix_derivative(size_of_G: int, V_ghat: np.ndarray,
+                                      z_int_mean: np.ndarray, z_int_cov: np.ndarray,
+                                      rho: float, g_var: float = None) -> np.ndarray:
+    """
+    Calculates the derivative of the correction matrix (see build_correction_matrix()) with
+    respect to rho, for the delta method.  The correction matrix is diag(1/rho for G) * inv(M) *
+    V_ghat, where M is the uninverted center matrix, and d inv(M) = -inv(M) (dM) inv(M).
+
+    :param size_of_G: Number of columns in G vector
+    :param V_ghat: Covariance matrix of [G, z]
+    :param z_int_mean: Mean of z_int
+    :param z_int_cov: Covariance matrix of z_int
+    :param rho: Value of rho
+    :param g_var: Variance of the PGI in V_ghat if it isn't 1 (see calculate_center_matrix())
+
+    :return: Derivative of the correction matrix with respect to rho
+    """
+
+    center_matrix = calculate_center_matrix(V_ghat, rho, z_int_mean, z_int_cov, g_var)
+    product = np.matmul(center_matrix, V_ghat)
+
+    # Derivative of M: only the entries involving 1/rho^2 (see calculate_center_matrix()) change
+    z_int_count = z_int_cov.shape[-1] if z_int_cov.shape else 1 # Shape is () if 1x1 matrix
+    z_int_mean = np.asarray(z_int_mean)
+    d_center_inv = np.zeros_like(V_ghat, dtype=np.float64)
+    d_center_inv[0, 0] = 1.0
+    d_center_inv[0, 1:z_int_count+1] = z_int_mean
+    d_center_inv[1:z_int_count+1, 0] = z_int_mean
+    d_center_inv[1:z_int_count+1, 1:z_int_count+1] = z_int_cov + np.outer(z_int_mean, z_int_mean)
+    d_center_inv *= -2.0 * pow(rho, -3)
+
+    # Product rule (the G rows are also scaled by 1/rho)
+    d_corr_matrix = -np.linalg.multi_dot([center_matrix, d_center_inv, product])
+    d_corr_matrix[0:size_of_G, :] = (d_corr_matrix[0:size_of_G, :] - product[0:size_of_G, :] /
+                                     rho) / rho
+
+    return d_corr_matrix
+
+
+def get_alpha_ghat(y_cols: List[str], G_cols: List[str], z_cols: List[str], wt_cols: List[str],
+                   reg_data: pd.DataFrame, solver: str = SOLVER_STATSMODELS) -> Tuple[
+                       np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs the regression to get the initial estimate of coefficients and standard errors
+
+    :param y_cols: List containing the name of the outcome column
+    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
+    :param z_cols: List of columns in z vector = covariate columns
+    :param wt_cols: List containing the weights column if the regression should be weighted
+    :param reg_data: DataFrame with the required regression data
+    :param solver: Least squares solver to use (one of SOLVERS)
+
+    :return: Calculated coefficients, standard errors, and variance-covariance matrix
+    """
+
+    # Use the lean solver if requested (the constant is the last column of the design matrix)
+    if solver != SOLVER_STATSMODELS:
+        x_cols = G_cols + z_cols
+        fit = solve_least_squares(
+            reg_data[y_cols[0]].to_numpy(dtype=np.float64),
+            design_matrix(reg_data, x_cols + CONS_COLS),
+            reg_data[wt_cols[0]].to_numpy(dtype=np.float64) if wt_cols else None, solver)
+        return (pd.Series(fit.params[:-1], index=x_cols, name=UNCORR_COEF_COLUMN),
+                pd.Series(fit.bse[:-1], index=x_cols, name=UNCORR_COEF_SE_COLUMN),
+                pd.DataFrame(fit.cov_params[:-1, :-1], index=x_cols, columns=x_cols))
+
+    # Set up the regression
+    if wt_cols:
+        reg = sm.WLS(reg_data[y_cols], reg_data[G_cols + z_cols + CONS_COLS], weights=reg_data[wt_cols])
+    else:
+        reg = sm.OLS(reg_data[y_cols], reg_data[G_cols + z_cols + CONS_COLS])
+
+    # Calculate the regression
+    reg_fit = reg.fit()
+
+    return (reg_fit.params.drop(CONS_COL_NAME).rename(UNCORR_COEF_COLUMN, inplace=True),
+            reg_fit.bse.drop(CONS_COL_NAME).rename(UNCORR_COEF_SE_COLUMN, inplace=True),
+            reg_fit.cov_params().drop(CONS_COL_NAME).drop(CONS_COL_NAME, axis=1))
+
+
+def get_alpha_ghat_from_moments(y_cols: List[str], G_cols: List[str], z_cols: List[str],
+                                moments: InternalNamespace, moment_cols: List[str]) -> Tuple[
+                                    pd.Series, pd.Series, pd.DataFrame]:
+    """
+    Equivalent of get_alpha_ghat() that works from sufficient statistics.  The slopes of a
+    regression with a constant only depend on the centered cross-products, and the
+    variance-covariance matrix of the slopes is the corresponding block of the full one.
+
+    :param y_cols: List containing the name of the outcome column
+    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
+    :param z_cols: List of columns in z vector = covariate columns
+    :param moments: Moments of the regression data (weighted by the regression weights, if any)
+    :param moment_cols: Columns (in order) of the data the moments were calculated from
+
+    :return: Calculated coefficients, standard errors, and variance-covariance matrix
+    """
+
+    x_cols = G_cols + z_cols
+    coefs, var_cov_matrix = regression_from_moments(moments, _moment_indices(x_cols, moment_cols),
+                                                    _moment_indices(y_cols, moment_cols)[0])
+
+    return (pd.Series(coefs, index=x_cols, name=UNCORR_COEF_COLUMN),
+            pd.Series(np.sqrt(np.diagonal(var_cov_matrix)), index=x_cols,
+                      name=UNCORR_COEF_SE_COLUMN),
+            pd.DataFrame(var_cov_matrix, index=x_cols, columns=x_cols))
+
+
+def moments_condition_number(moments: InternalNamespace, x_idx: List[int]) -> float:
+    """
+    Calculates the condition number of the correlation matrix of the independent variables from
+    the sufficient statistics of the data (infinite if any of them is constant)
+
+    :param moments: Moments of the data (weighted by the regression weights, if any)
+    :param x_idx: Indices of the independent variables in the moments
+
+    :return: Condition number
+    """
+
+    css_xx = moments.css[np.ix_(x_idx, x_idx)]
+    scales = np.sqrt(np.diagonal(css_xx))
+    if not np.all(scales > 0.0):
+        return np.inf
+    condition = np.linalg.cond(css_xx / np.outer(scales, scales))
+
+    return condition if np.isfinite(condition) else np.inf
+
+
+def regression_from_moments(moments: InternalNamespace, x_idx: List[int],
+                            y_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates the slopes of the (weighted) least squares regression (with a constant) of one
+    column on others, along with the variance-covariance matrix of the slopes, from the
+    sufficient statistics of the data.  Works on stacked moments as well.
+
+    :param moments: Moments of the data (weighted by the regression weights, if any)
+    :param x_idx: Indices of the independent variables in the moments
+    :param y_idx: Index of the dependent variable in the moments
+
+    :return: Slopes and their variance-covariance matrix
+    """
+
+    # Solve the normal equations (in centered form)
+    css_xx = moments.css[..., x_idx, :][..., x_idx]
+    css_xy = moments.css[..., x_idx, y_idx]
+    css_xx_inv = np.linalg.inv(css_xx)
+    coefs = np.einsum("...ij,...j->...i", css_xx_inv, css_xy)
 
-    # If we need a restricted GRM, make that now
-    if iargs.calc_h2:
-        full_path_to_restricted_person_list = "%s/removed_%s.txt" % (iargs.temp_dir, iteration)
-        full_prefix_to_restricted_grm = "%s/removed_grm_%s" % (iargs.temp_dir, iteration)
-
-        remove = reg_data[reg_data.iteration == iteration]
-        remove[["FID", "IID"]].to_csv(full_path_to_restricted_person_list, sep=" ",
-                                      index=False, header=None)
-        grm_transformation_cmd = "%s --grm %s --remove %s --out %s --make-grm --threads %s" % (
-            iargs.gcta_exec, grm_prefix, full_path_to_restricted_person_list,
-            full_prefix_to_restricted_grm, iargs.num_threads)
-        _log_and_run_os_cmd(grm_transformation_cmd, iargs.quiet_h2)
-        iargs_copy.grm = full_prefix_to_restricted_grm
-
-    # Call the main procedure with a pared down dataframe and GRM (only included if it's needed)
-    restricted_reg_data = reg_data[reg_data.iteration != iteration]
-    iargs_copy.reg_data_file = None
-    corr_result = error_correction_procedure(iargs_copy, restricted_reg_data)
+    # Residual variance (the constant accounts for one degree of freedom)
+    ssr = moments.css[..., y_idx, y_idx] - np.einsum("...i,...i->...", coefs, css_xy)
+    scale = ssr / (moments.n - len(x_idx) - 1)
+    var_cov_matrix = np.asarray(scale)[..., np.newaxis, np.newaxis] * css_xx_inv
 
-    # Return the results in dictionary form
-    return {"h2" : corr_result.h2, "R2" : corr_result.R2, "rho" : corr_result.rho,
-            "alpha_corr" : corr_result.corrected_alphas,
-            "alpha_uncorr" : corr_result.uncorrected_alphas}
+    return coefs, var_cov_matrix
 
 
-def calculate_corrected_coefficients(corr_matrix: np.ndarray,
-                                     coefficients: np.ndarray) -> np.ndarray:
+def error_correction_procedure(iargs: InternalNamespace, reg_data: pd.DataFrame):
     """
-    Generates corrected coefficients from a correction matrix and uncorrected coefficients
+    Implementation of error correction procedure.
 
-    :param corr_matrix: Correction matrix to use
-    :param coefficients: Coefficients to be corrected
+    :param iargs: Holds arguments passed in by user.
+    :param reg_data: Regression data.
 
-    :return: Array of corrected coefficients
+    :return: Object holding corrected and uncorrected coefficients and standard errors along with
+             rho, h^2, R^2, and sample size (n)
     """
 
-    return np.matmul(corr_matrix, coefficients)
+    # Fixed effects are swept out of the data first if there are any to absorb
+    if getattr(iargs, "absorb", []):
+        return absorbed_error_correction(iargs, reg_data)
+
+    # Least squares solver (namespaces built without one use statsmodels)
+    solver = getattr(iargs, "solver", SOLVER_STATSMODELS)
+
+    # The moments and Cholesky solvers derive everything (R^2, the regression, and the correction
+    # matrix) from the cross-products of one pass over the data.  The moments solver falls back
+    # to statsmodels if the independent variables are too close to collinear for that.
+    if solver in (SOLVER_MOMENTS, SOLVER_CHOLESKY):
+        moments, wt_moments, moment_cols = regression_data_moments(iargs, reg_data)
+        condition = np.nan if solver == SOLVER_CHOLESKY else moments_condition_number(
+            wt_moments, _moment_indices(iargs.G_cols + iargs.z_cols, moment_cols))
+        if solver == SOLVER_CHOLESKY or condition < MOMENTS_MAX_CONDITION:
+            return error_correction_from_moments(iargs, moments, wt_moments, moment_cols)
+        logging.warning("The independent variables are nearly collinear (condition number %g), "
+                        "so the cross-products are discarded and the regression is refit with "
+                        "statsmodels.", condition)
+        solver = SOLVER_STATSMODELS
+
+    # Create object to hold all the return values
+    result = InternalNamespace()
+
+    # If heritability is specified, add it to results, otherwise estimate it.
+    result.h2 = iargs.h2 if iargs.h2 else estimate_full_sample_h2(iargs)
+    # Store sample size of data to report in results.
+    result.n = reg_data.shape[0]
 
+    # Determine R^2 (calculate if necessary)
+    result.R2 = iargs.R2 if iargs.R2 else estimate_R2(reg_data, iargs.pgi_pheno_var, iargs.pgi_var,
+                                                      solver)
 
-def calculate_corrected_coeff_stderrs(corr_matrix: np.ndarray,
-                                      var_cov_matrix: np.ndarray) -> np.ndarray:
+    # Calculate rho based on h^2 and R^2
+    _set_result_rho(iargs, result)
+
+    # Calculate initial regression values
+    logging.debug("Calculating uncorrected coefficients(s) and standard error(s)...")
+    result.uncorrected_alphas, result.uncorrected_alphas_se, var_cov_matrix = get_alpha_ghat(
+        iargs.y_cols, iargs.G_cols, iargs.z_cols, iargs.wt_cols, reg_data, solver)
+
+    # Calculate the correction matrix (stacked with those of the sensitivity grid, if any)
+    logging.debug("Getting correction matrix...")
+    grid_rho = calculate_grid_rho(iargs, result)
+    corr_inputs = correction_matrix_inputs(iargs.G_cols, iargs.z_cols, iargs.z_int_cols, reg_data)
+    corr_matrix = build_correction_matrix(len(iargs.G_cols), *corr_inputs, result.rho if grid_rho
+                                          is None else np.append(result.rho, grid_rho))
+
+    # Use that correction matrix to correct coefficients and standard errors
+    _correct_result(result, corr_matrix, var_cov_matrix, grid_rho)
+
+    # Replace the standard errors with delta method ones if requested
+    if getattr(iargs, "analytic_se", False):
+        _set_analytic_se(iargs, result, corr_inputs)
+
+    return result
+
+
+def absorbed_error_correction(iargs: InternalNamespace,
+                              reg_data: pd.DataFrame) -> InternalNamespace:
     """
-    Generates corrected coefficient standard errors
+    Implementation of the error correction procedure with the fixed effects of the --absorb
+    columns swept out of the outcome and the independent variables (so no dummy covariates, or
+    constant, are needed).  The measurement error of the PGI is unaffected by the fixed effects,
+    so the correction uses the within-transformed V_ghat (the PGI's unit variance less the part
+    explained by the fixed effects) with only the measurement error variance removed, along with
+    the (untransformed) mean and covariance matrix of z_int.  This gives the same results as
+    including dummies for the fixed effects as covariates.
 
-    :param corr_matrix: Correction matrix to use
-    :param var_cov_matrix: Variance-covariance matrix of coefficients to correct
+    :param iargs: Holds arguments passed in by user.
+    :param reg_data: Regression data (including the absorbed columns).
 
-    :return: Array of corrected coefficient standard errors
+    :return: Object holding the same results as error_correction_procedure()
     """
 
-    prod = np.linalg.multi_dot([corr_matrix, var_cov_matrix, corr_matrix.T])
+    # Create object to hold all the return values
+    result = InternalNamespace()
+    result.h2 = iargs.h2 if iargs.h2 else estimate_full_sample_h2(iargs)
+    result.n = reg_data.shape[0]
 
-    return np.sqrt(np.diagonal(prod))
+    # The regression of the transformed data needs the lean solver
+    solver = getattr(iargs, "solver", SOLVER_STATSMODELS)
+    solver = SOLVER_CHOLESKY if solver in (SOLVER_MOMENTS, SOLVER_STATSMODELS) else solver
+
+    # The R^2 of the PGI doesn't involve the fixed effects
+    result.R2 = iargs.R2 if iargs.R2 else estimate_R2(reg_data, iargs.pgi_pheno_var, iargs.pgi_var,
+                                                      solver)
+    _set_result_rho(iargs, result)
+
+    # Sweep out the fixed effects (weighted by the regression weights for the regression, and
+    # unweighted for V_ghat)
+    factor_codes = [pd.factorize(reg_data[col])[0] for col in iargs.absorb]
+    num_absorbed = sum(codes.max() + 1 for codes in factor_codes) - len(factor_codes) + 1
+    logging.info("Absorbing %s fixed effects of %s.", num_absorbed, iargs.absorb)
+    values = design_matrix(reg_data, iargs.alpha_cols + iargs.y_cols)
+    within = absorb_fixed_effects(values, factor_codes)
+    check_column_variances(dict(zip(iargs.alpha_cols, np.var(within[:, :-1], axis=0))))
+    weights = reg_data[iargs.wt_cols[0]].to_numpy(dtype=np.float64) if iargs.wt_cols else None
+    wt_within = absorb_fixed_effects(values, factor_codes, weights) if iargs.wt_cols else within
+
+    # Calculate initial regression values (the absorbed fixed effects use up degrees of freedom)
+    logging.debug("Calculating uncorrected coefficients(s) and standard error(s)...")
+    fit = solve_least_squares(wt_within[:, -1], wt_within[:, :-1], weights, solver)
+    var_cov_matrix = fit.ssr / (result.n - len(iargs.alpha_cols) - num_absorbed) * fit.xtx_inv
+    result.uncorrected_alphas = pd.Series(fit.params, index=iargs.alpha_cols,
+                                          name=UNCORR_COEF_COLUMN)
+    result.uncorrected_alphas_se = pd.Series(np.sqrt(np.diagonal(var_cov_matrix)),
+                                             index=iargs.alpha_cols, name=UNCORR_COEF_SE_COLUMN)
+
+    # Calculate the correction matrix (stacked with those of the sensitivity grid, if any)
+    logging.debug("Getting correction matrix...")
+    # (the PGI is taken to have unit variance as usual, less the part explained by the fixed
+    # effects)
+    V_ghat = np.matmul(within[:, :-1].T, within[:, :-1]) / (result.n - 1)
+    g_var = 1.0 - np.var(values[:, 0], ddof=1, dtype=np.float64) + V_ghat[0, 0]
+    z_int_moments = calculate_moments(design_matrix(reg_data, iargs.z_int_cols))
+    corr_inputs = (V_ghat, z_int_moments.mean, z_int_moments.css / (result.n - 1))
+    grid_rho = calculate_grid_rho(iargs, result)
+    corr_matrix = build_correction_matrix(len(iargs.G_cols), *corr_inputs, result.rho if grid_rho
+                                          is None else np.append(result.rho, grid_rho), g_var)
+
+    # Use that correction matrix to correct coefficients and standard errors
+    _correct_result(result, corr_matrix, var_cov_matrix, grid_rho)
+    if getattr(iargs, "analytic_se", False):
+        _set_analytic_se(iargs, result, corr_inputs, g_var)
 
+    return result
 
 
-def calculate_center_matrix(V_ghat: np.ndarray, rho: float, z_int_mean: np.ndarray,
-                            z_int_cov: np.ndarray) -> np.ndarray:
+def absorb_fixed_effects(values: np.ndarray, factor_codes: List[np.ndarray],
+                         weights: np.ndarray = None) -> np.ndarray:
     """
-    Calculates the center matrix component of the product that is the final correction matrix.
+    Sweeps the fixed effects of one or more categorical variables out of the columns of a data
+    matrix (within-transformation).  A single variable takes one pass of subtracting the
+    (weighted) group means.  Several variables are swept out by alternating projections: the
+    group means of each variable are subtracted in turn until they are all negligible.
 
-    :param V_ghat: Covariance matrix of [G, z]
-    :param rho: Value of rho to use
-    :param z_int_mean: Mean of z_int
-    :param z_int_cov: Covariance matrix of z_int
+    :param values: 2D array whose columns are to be transformed
+    :param factor_codes: Group codes (0 to number of groups - 1) of each row, per variable
+    :param weights: Optional 1D array of row weights
 
-    :return: Center matrix to use in correction matrix product
+    :return: Transformed copy of values
     """
 
-    # Calculate values used later
-    rho_sq_recip = pow(rho, -2)
-    one_minus_rho_sq_recip = 1.0 - rho_sq_recip
-    z_int_count = z_int_cov.shape[0] if z_int_cov.shape else 1 # Shape is () if 1x1 matrix
+    within = np.array(values, dtype=np.float64)
+    weights = np.ones(within.shape[0]) if weights is None else weights
+    group_weights = [np.bincount(codes, weights=weights) for codes in factor_codes]
+    tolerance = ABSORB_TOLERANCE * np.maximum(np.std(within, axis=0), 1.0)
+
+    for iter_num in range(ABSORB_MAX_ITERATIONS):
+        converged = True
+        for codes, group_weight in zip(factor_codes, group_weights):
+            for col in range(within.shape[1]):
+                group_means = np.bincount(codes, weights=weights * within[:, col]) / group_weight
+                within[:, col] -= group_means[codes]
+                converged &= bool(np.max(np.abs(group_means)) <= tolerance[col])
+        if len(factor_codes) == 1 or converged:
+            logging.debug("Fixed effects swept out after %s iteration(s)", iter_num + 1)
+            return within
+
+    logging.warning("Sweeping out the fixed effects did not converge in %s iterations.",
+                    ABSORB_MAX_ITERATIONS)
+    return within
+
+
+def regression_data_moments(iargs: InternalNamespace, reg_data: pd.DataFrame) -> Tuple[
+        InternalNamespace, InternalNamespace, List[str]]:
+    """
+    Calculates the sufficient statistics that error_correction_from_moments() works from, with
+    the data of each needed column extracted from reg_data once
 
-    # Take V_ghat, replace (0,0) entry with 1/rho^2, and modify the rest of the matrix as needed
-    mod_copy_of_V_ghat = V_ghat.copy()
+    :param iargs: Holds arguments passed in by user.
+    :param reg_data: Regression data.
 
-    mod_copy_of_V_ghat[0, 0] = rho_sq_recip
+    :return: Tuple of the unweighted moments, the moments weighted by the regression weights (the
+             same object if the regression is unweighted), and the columns of the moments
+    """
 
-    mod_copy_of_V_ghat[0, 1:z_int_count+1] -= (one_minus_rho_sq_recip * z_int_mean)
-    mod_copy_of_V_ghat[1:z_int_count+1, 0] = mod_copy_of_V_ghat[0, 1:z_int_count+1].T
+    moment_cols = iargs.G_cols + iargs.z_cols + iargs.y_cols
+    moment_cols += [col for col in ([] if iargs.R2 else iargs.pgi_pheno_var) + iargs.z_int_cols
+                    if col not in moment_cols]
+    values = design_matrix(reg_data, moment_cols)
 
-    mod_copy_of_V_ghat[1:z_int_count+1, 1:z_int_count+1] -= one_minus_rho_sq_recip * (z_int_cov +
-                                                            np.outer(z_int_mean, z_int_mean))
+    moments = calculate_moments(values)
+    wt_moments = calculate_moments(values, reg_data[iargs.wt_cols[0]].to_numpy(
+        dtype=np.float64)) if iargs.wt_cols else moments
 
-    # Return inverse of the previously calculated matrix
-    logging.debug("\nuninverted center matrix = \n%s", mod_copy_of_V_ghat)
-    return np.linalg.inv(mod_copy_of_V_ghat)
+    return moments, wt_moments, moment_cols
 
 
-def calculate_correction_matrix(G_cols: List[str], z_cols: List[str], z_int_cols: List[str],
-                                df: pd.DataFrame, rho: float) -> np.ndarray:
+def multi_outcome_error_correction(iargs: InternalNamespace,
+                                   reg_data: pd.DataFrame) -> Dict[str, InternalNamespace]:
     """
-    Generates the correction matrix
+    Implementation of the error correction procedure for several outcomes that share the PGI,
+    covariates, and weights.  Outcomes are grouped by which individuals they are missing for.
+    Within each group, R^2, rho, and the correction matrix are calculated once, the design matrix
+    is factored once and solved for all of the group's outcomes together, and the corrected
+    standard errors are derived from one product of the correction matrix and (X'X)^-1.
 
-    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
-    :param z_cols: List of columns in z vector = covariate columns
-    :param z_int_cols: List of z columns that correspond (in order) to the non-pgi elements of G
-    :param df: DataFrame with the required regression data
-    :param rho: Value of rho
+    :param iargs: Holds arguments passed in by user.
+    :param reg_data: Regression data (outcome columns may contain NaN's).
 
-    :return: Matrix used to correct coefficients and standard errors
+    :return: Dictionary mapping each outcome (in y_cols order) to an object holding the same
+             results as error_correction_procedure()
+    """
+
+    # The shared factorization needs the lean solver
+    solver = getattr(iargs, "solver", SOLVER_STATSMODELS)
+    solver = SOLVER_CHOLESKY if solver in (SOLVER_MOMENTS, SOLVER_STATSMODELS) else solver
+    h2 = iargs.h2 if iargs.h2 else estimate_full_sample_h2(iargs)
+    x_cols = iargs.G_cols + iargs.z_cols
+
+    # Group the outcomes by their missingness patterns
+    present = reg_data[iargs.y_cols].notna().to_numpy()
+    outcome_groups = {}
+    for outcome_num in range(len(iargs.y_cols)):
+        outcome_groups.setdefault(present[:, outcome_num].tobytes(), []).append(outcome_num)
+    logging.info("Correcting %s outcomes in %s group(s) with distinct missingness patterns.",
+                 len(iargs.y_cols), len(outcome_groups))
+
+    results = {}
+    for outcome_nums in outcome_groups.values():
+        group_outcomes = [iargs.y_cols[outcome_num] for outcome_num in outcome_nums]
+        group_data = reg_data[present[:, outcome_nums[0]]]
+        logging.debug("Correcting outcome(s) %s using %s individuals", group_outcomes,
+                      group_data.shape[0])
+
+        # Values shared by the group: h^2, R^2, rho, and the correction matrix
+        shared = InternalNamespace()
+        shared.h2 = h2
+        shared.n = group_data.shape[0]
+        shared.R2 = iargs.R2 if iargs.R2 else estimate_R2(group_data, iargs.pgi_pheno_var,
+                                                          iargs.pgi_var, solver)
+        _set_result_rho(iargs, shared)
+        corr_matrix = calculate_correction_matrix(iargs.G_cols, iargs.z_cols, iargs.z_int_cols,
+                                                  group_data, shared.rho)
+
+        # Fit all of the group's outcomes at once and correct them
+        fit = solve_least_squares(
+            group_data[group_outcomes].to_numpy(dtype=np.float64),
+            design_matrix(group_data, x_cols + CONS_COLS),
+            group_data[iargs.wt_cols[0]].to_numpy(dtype=np.float64) if iargs.wt_cols else None,
+            solver)
+        uncorrected = fit.params[:-1]
+        corrected = np.matmul(corr_matrix, uncorrected)
+        corrected_var_unscaled = np.diagonal(np.linalg.multi_dot(
+            [corr_matrix, fit.xtx_inv[:-1, :-1], corr_matrix.T]))
+        corrected_se = np.sqrt(np.multiply.outer(fit.ssr / (shared.n - len(x_cols) - 1),
+                                                 corrected_var_unscaled))
+
+        for group_num, outcome in enumerate(group_outcomes):
+            result = copy.copy(shared)
+            result.uncorrected_alphas = pd.Series(uncorrected[:, group_num], index=x_cols,
+                                                  name=UNCORR_COEF_COLUMN)
+            result.uncorrected_alphas_se = pd.Series(fit.bse[group_num, :-1], index=x_cols,
+                                                     name=UNCORR_COEF_SE_COLUMN)
+            result.corrected_alphas = corrected[:, group_num]
+            result.corrected_alphas_se = corrected_se[group_num]
+            result.h2_se = None
+            result.R2_se = None
+            result.rho_se = None
+            results[outcome] = result
+
+    return {outcome : results[outcome] for outcome in iargs.y_cols}
+
+
+def read_pgi_table(iargs: InternalNamespace) -> pd.DataFrame:
     """
+    Determines the h^2 and R^2 to use for each PGI of a PGI scan from the --pgi-table (if any),
+    falling back to --h2 and --R2.  A missing R^2 (NaN) means it should be estimated.
 
-    # Determine the needed relevant smaller DFs from column subsets
-    df_Gz = df[G_cols + z_cols]
-    df_z_int = df[z_int_cols]
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
 
-    # Useful values
-    size_of_G = len(G_cols)
+    :return: DataFrame indexed by PGI (in pgi_var order) with h2 and R2 columns
+    """
 
-    # Calculate the V_ghat matrix (rightmost matrix of the 3-matrix product)
-    V_ghat = np.cov(df_Gz, rowvar=False)
-    logging.debug("\nV_ghat = \n%s", V_ghat)
+    pgi_table = pd.DataFrame(index=pd.Index(iargs.pgi_var, name=PGI_TABLE_PGI_COLUMN))
+    pgi_table[PGI_TABLE_H2_COLUMN] = iargs.h2 if iargs.h2 else np.nan
+    pgi_table[PGI_TABLE_R2_COLUMN] = iargs.R2 if iargs.R2 else np.nan
 
-    # Calculate center matrix (start with V_ghat, since it shares much of that matrix)
-    z_int_mean = np.mean(df_z_int, axis=0)
-    logging.debug("\nz_int_mean = \n%s", z_int_mean)
-    z_int_cov = np.cov(df_z_int, rowvar=False)
-    logging.debug("\nz_int_cov = \n%s", z_int_cov)
-    center_matrix = calculate_center_matrix(V_ghat, rho, z_int_mean, z_int_cov)
-    logging.debug("\ncenter_matrix = \n%s", center_matrix)
+    if iargs.pgi_table:
+        user_table = pd.read_csv(iargs.pgi_table, sep=r"\s+")
+        if PGI_TABLE_PGI_COLUMN not in user_table.columns:
+            raise LookupError("The PGI table [%s] needs a \"%s\" column." %
+                              (iargs.pgi_table, PGI_TABLE_PGI_COLUMN))
+        user_table = user_table.astype({PGI_TABLE_PGI_COLUMN : str}).set_index(
+            PGI_TABLE_PGI_COLUMN)
+        for col in [PGI_TABLE_H2_COLUMN, PGI_TABLE_R2_COLUMN]:
+            if col in user_table.columns:
+                pgi_table[col] = user_table[col].reindex(pgi_table.index).fillna(pgi_table[col])
 
-    # Calculate the correction matrix
-    corr_matrix = np.matmul(center_matrix, V_ghat)   # Almost correct, needs one more multiplication
-    corr_matrix[0:size_of_G] *= np.reciprocal(rho) # Adjust to account for lefthand matmul
-    logging.debug("\nCorrection matrix = \n%s", corr_matrix)
+    missing_h2 = pgi_table.index[pgi_table[PGI_TABLE_H2_COLUMN].isna()]
+    if len(missing_h2):
+        raise LookupError("No h^2 specified for PGI(s) %s (use --h2 or the PGI table's \"%s\" "
+                          "column)." % (list(missing_h2), PGI_TABLE_H2_COLUMN))
 
-    return corr_matrix
+    return pgi_table
 
 
-def get_alpha_ghat(y_cols: List[str], G_cols: List[str], z_cols: List[str], wt_cols: List[str],
-                   reg_data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+def pgi_scan(iargs: InternalNamespace, orig_reg_data: pd.DataFrame):
     """
-    Runs the regression to get the initial estimate of coefficients and standard errors
+    Corrects the coefficient of each of many PGIs in the same specification (outcome, covariates,
+    and weights), streaming the results to <out>.scan.parquet (or <out>.scan.tsv if pyarrow is
+    not installed) a batch at a time.  Each PGI is standardized as in adjust_regression_data().
+    The regression on the covariates is done once (Frisch-Waugh-Lovell), so each batch of PGIs
+    only needs its cross-products with the outcome and covariates, from which the uncorrected
+    coefficients and their variances, and a stack of correction matrices (see
+    build_correction_matrix()), are calculated for the whole batch.  PGIs are grouped by which
+    individuals they are missing for (each group uses its own sample), and the results are
+    written in the order the PGIs were specified.
 
-    :param y_cols: List containing the name of the outcome column
-    :param G_cols: List of columns in G vector = pgi_var column followed by interaction columns
-    :param z_cols: List of columns in z vector = covariate columns
-    :param wt_cols: List containing the weights column if the regression should be weighted
-    :param reg_data: DataFrame with the required regression data
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param orig_reg_data: Unadjusted regression data
+    """
 
-    :return: Calculated coefficients, standard errors, and variance-covariance matrix
+    pgi_table = read_pgi_table(iargs)
+    pheno_col = iargs.pgi_pheno_var[0]
+    estimate_r2 = pgi_table[PGI_TABLE_R2_COLUMN].isna().any()
+    iargs.y_cols = iargs.outcome
+    iargs.z_cols = iargs.covariates
+    iargs.wt_cols = iargs.weights
+    base_cols = iargs.y_cols + iargs.z_cols + iargs.wt_cols + (
+        [pheno_col] if estimate_r2 and pheno_col not in iargs.y_cols else [])
+
+    # Standardize every PGI (using all individuals with a value, as adjust_regression_data() does)
+    pgis = orig_reg_data[iargs.pgi_var].to_numpy(dtype=np.float64)
+    pgi_means = np.nanmean(pgis, axis=0)
+    pgi_stds = np.nanstd(pgis, axis=0)
+    if np.any(pgi_stds == 0.0):
+        raise ValueError("PGI column(s) %s have variance zero!  Unable to proceed." %
+                         [pgi for pgi, std in zip(iargs.pgi_var, pgi_stds) if std == 0.0])
+    pgis = (pgis - pgi_means) / pgi_stds
+
+    # Group the PGIs by the individuals they can be used for (the phenotype is only needed for
+    # PGIs whose R^2 is estimated)
+    base_present = orig_reg_data[iargs.y_cols + iargs.z_cols + iargs.wt_cols].notna().all(
+        axis=1).to_numpy()
+    present = ~np.isnan(pgis) & base_present[:, np.newaxis]
+    needs_r2 = pgi_table[PGI_TABLE_R2_COLUMN].isna().to_numpy()
+    if estimate_r2:
+        present[:, needs_r2] &= orig_reg_data[pheno_col].notna().to_numpy()[:, np.newaxis]
+    pgi_groups = {}
+    for pgi_num in range(len(iargs.pgi_var)):
+        pgi_groups.setdefault(present[:, pgi_num].tobytes(), []).append(pgi_num)
+    logging.info("Scanning %s PGIs in %s group(s) with distinct missingness patterns.",
+                 len(iargs.pgi_var), len(pgi_groups))
+    pgi_group_nums = np.empty(len(iargs.pgi_var), dtype=int)
+    for group_num, pgi_nums in enumerate(pgi_groups.values()):
+        pgi_group_nums[pgi_nums] = group_num
+
+    out_file = iargs.out + (".scan.parquet" if pyarrow else ".scan.tsv")
+    parquet_writer = None
+    wrote_header = False
+    group_shared = {}
+    try:
+        # Batches of PGIs (in the specified order) are corrected a missingness group at a time,
+        # keeping the shared values of the most recently used groups
+        for batch_start in range(0, len(iargs.pgi_var), iargs.scan_batch_size):
+            batch_nums = np.arange(batch_start, min(batch_start + iargs.scan_batch_size,
+                                                    len(iargs.pgi_var)))
+            group_results, result_nums = [], []
+            for group_num in dict.fromkeys(pgi_group_nums[batch_nums]):
+                group_batch_nums = batch_nums[pgi_group_nums[batch_nums] == group_num]
+                rows = present[:, group_batch_nums[0]]
+                if group_num not in group_shared:
+                    if len(group_shared) >= SCAN_SHARED_GROUPS:
+                        del group_shared[next(iter(group_shared))]
+                    base_data = orig_reg_data.loc[rows, base_cols]
+                    check_column_variances(dict(base_data[iargs.z_cols].var()))
+                    group_shared[group_num] = _pgi_scan_shared_values(
+                        iargs, base_data, pheno_col,
+                        needs_r2[pgi_group_nums == group_num].any())
+                group_shared[group_num] = group_shared.pop(group_num)  # Most recently used
+                group_results.append(_pgi_scan_batch(
+                    iargs, group_shared[group_num], pgis[np.ix_(rows, group_batch_nums)],
+                    pgi_table.iloc[group_batch_nums]))
+                result_nums.append(group_batch_nums)
+            batch_results = pd.concat(group_results, ignore_index=True).iloc[
+                np.argsort(np.concatenate(result_nums))].reset_index(drop=True)
+            logging.debug("Corrected PGIs %s", list(batch_results[VAR_OUTPUT_COLUMN]))
+
+            # Append the batch's results to the output file
+            if pyarrow:
+                table = pyarrow.Table.from_pandas(batch_results, preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pyarrow.parquet.ParquetWriter(out_file, table.schema)
+                parquet_writer.write_table(table)
+            else:
+                batch_results.to_csv(out_file, sep="\t", index=False,
+                                     mode="a" if wrote_header else "w",
+                                     header=not wrote_header)
+            wrote_header = True
+    finally:
+        if parquet_writer:
+            parquet_writer.close()
+
+    logging.info("Check output file [%s] for the PGI scan results.", out_file)
+
+
+def _pgi_scan_shared_values(iargs: InternalNamespace, base_data: pd.DataFrame, pheno_col: str,
+                            estimate_r2: bool) -> InternalNamespace:
     """
+    Calculates the values a PGI scan shares across the PGIs using the same individuals: the
+    centered covariates and phenotype (for the correction matrices and R^2) and the weighted
+    regression of the outcome on the covariates and constant
 
-    # Set up the regression
-    if wt_cols:
-        reg = sm.WLS(reg_data[y_cols], reg_data[G_cols + z_cols + CONS_COLS], weights=reg_data[wt_cols])
-    else:
-        reg = sm.OLS(reg_data[y_cols], reg_data[G_cols + z_cols + CONS_COLS])
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param base_data: Outcome, covariate, weights, and (if needed) phenotype columns of the
+                      individuals
+    :param pheno_col: Column holding the phenotype corresponding to the PGIs
+    :param estimate_r2: Whether R^2 needs to be estimated for any PGI
 
-    # Calculate the regression
-    reg_fit = reg.fit()
+    :return: Object holding the shared values
+    """
 
-    return (reg_fit.params.drop(CONS_COL_NAME).rename(UNCORR_COEF_COLUMN, inplace=True),
-            reg_fit.bse.drop(CONS_COL_NAME).rename(UNCORR_COEF_SE_COLUMN, inplace=True),
-            reg_fit.cov_params().drop(CONS_COL_NAME).drop(CONS_COL_NAME, axis=1))
+    shared = InternalNamespace()
+    shared.n = base_data.shape[0]
 
+    # Unweighted values, for the correction matrices (V_ghat) and R^2
+    z = base_data[iargs.z_cols].to_numpy(dtype=np.float64)
+    shared.z_centered = z - z.mean(axis=0)
+    shared.z_cov = np.atleast_2d(np.cov(z, rowvar=False))
+    if estimate_r2:
+        pheno = base_data[pheno_col].to_numpy(dtype=np.float64)
+        shared.pheno_centered = pheno - pheno.mean()
 
-def error_correction_procedure(iargs: InternalNamespace, reg_data: pd.DataFrame):
+    # Weighted values, for the regression (outcome and design scaled by the root of the weights)
+    shared.sqrt_wts = np.sqrt(base_data[iargs.wt_cols[0]].to_numpy(dtype=np.float64)) if \
+                      iargs.wt_cols else np.ones(shared.n)
+    shared.zc_w = np.column_stack((z, np.ones(shared.n))) * shared.sqrt_wts[:, np.newaxis]
+    shared.y_w = base_data[iargs.y_cols[0]].to_numpy(dtype=np.float64) * shared.sqrt_wts
+    shared.zc_inv = np.linalg.inv(np.matmul(shared.zc_w.T, shared.zc_w))
+    shared.zc_y = np.matmul(shared.zc_w.T, shared.y_w)
+    shared.y_coefs = np.matmul(shared.zc_inv, shared.zc_y)
+    shared.y_resid_ss = np.dot(shared.y_w, shared.y_w) - np.dot(shared.zc_y, shared.y_coefs)
+
+    return shared
+
+
+def _pgi_scan_batch(iargs: InternalNamespace, shared: InternalNamespace, g: np.ndarray,
+                    pgi_table: pd.DataFrame) -> pd.DataFrame:
     """
-    Implementation of error correction procedure.
+    Corrects a batch of PGIs of a PGI scan
+
+    :param iargs: Internal namespace object that holds internal values and parsed user inputs
+    :param shared: Values returned by _pgi_scan_shared_values()
+    :param g: Matrix holding one standardized PGI per column (for the individuals in shared)
+    :param pgi_table: h^2 and R^2 (NaN if it should be estimated) of each PGI in the batch
+
+    :return: DataFrame holding one row of results per PGI
+    """
+
+    n = shared.n
+    num_z = len(iargs.z_cols)
+
+    # Stack of V_ghat = cov([g, z]) matrices, one per PGI
+    g_centered = g - g.mean(axis=0)
+    g_var = np.einsum("ij,ij->j", g_centered, g_centered) / (n - 1)
+    gz_cov = np.matmul(g_centered.T, shared.z_centered) / (n - 1)
+    V_ghat = np.empty((g.shape[1], num_z + 1, num_z + 1))
+    V_ghat[:, 0, 0] = g_var
+    V_ghat[:, 0, 1:] = gz_cov
+    V_ghat[:, 1:, 0] = gz_cov
+    V_ghat[:, 1:, 1:] = shared.z_cov
+
+    # h^2, R^2 (regression of phenotype on PGI, i.e. a squared correlation), and rho
+    h2 = pgi_table[PGI_TABLE_H2_COLUMN].to_numpy(dtype=np.float64)
+    R2 = pgi_table[PGI_TABLE_R2_COLUMN].to_numpy(dtype=np.float64)
+    if np.isnan(R2).any():
+        g_pheno_cov = np.matmul(g_centered.T, shared.pheno_centered) / (n - 1)
+        estimated_R2 = g_pheno_cov ** 2 / (g_var * np.dot(shared.pheno_centered,
+                                                          shared.pheno_centered) / (n - 1))
+        R2 = np.where(np.isnan(R2), estimated_R2, R2)
+    rho = calculate_rho(h2=h2, r2=R2)
+    low_rho_count = np.count_nonzero(rho < 1.0)
+    if low_rho_count:
+        warn_or_raise(iargs.force, "It is unexpected that the estimated rho is less than 1.0 for "
+            "%s PGI(s).  You should double-check that the dependent variable in the R^2 "
+            "calculation corresponds to the PGI phenotype.", low_rho_count)
+
+    # First rows of the correction matrices (the only ones needed for the PGI coefficients)
+    corr_rows = build_correction_matrix(1, V_ghat, np.zeros(0), np.zeros((0, 0)), rho)[:, 0, :]
+
+    # Uncorrected coefficients (Frisch-Waugh-Lovell: regress out the covariates and constant)
+    g_w = g * shared.sqrt_wts[:, np.newaxis]
+    zc_g = np.matmul(shared.zc_w.T, g_w)
+    g_on_zc = np.matmul(shared.zc_inv, zc_g)
+    g_resid_ss = np.einsum("ij,ij->j", g_w, g_w) - np.einsum("ij,ij->j", zc_g, g_on_zc)
+    g_y_resid = np.matmul(g_w.T, shared.y_w) - np.matmul(g_on_zc.T, shared.zc_y)
+    alpha_g = g_y_resid / g_resid_ss
+    alpha_z = (shared.y_coefs[:, np.newaxis] - g_on_zc * alpha_g)[:num_z]
+    scale = (shared.y_resid_ss - alpha_g * g_y_resid) / (n - num_z - 2)
+
+    # Corrected coefficients and standard errors from the partitioned inverse of X'X
+    corr_g, corr_z = corr_rows[:, 0], corr_rows[:, 1:]
+    corrected = corr_g * alpha_g + np.einsum("bi,ib->b", corr_z, alpha_z)
+    corr_z_on_g = np.einsum("bi,ib->b", corr_z, g_on_zc[:num_z])
+    corrected_var = scale * ((corr_g - corr_z_on_g) ** 2 / g_resid_ss + np.einsum(
+        "bi,ij,bj->b", corr_z, shared.zc_inv[:num_z, :num_z], corr_z))
+
+    return pd.DataFrame({VAR_OUTPUT_COLUMN : pgi_table.index.to_numpy(),
+                         "n" : n, PGI_TABLE_H2_COLUMN : h2, PGI_TABLE_R2_COLUMN : R2, "rho" : rho,
+                         UNCORR_COEF_COLUMN : alpha_g,
+                         UNCORR_COEF_SE_COLUMN : np.sqrt(scale / g_resid_ss),
+                         CORR_COEF_COLUMN : corrected,
+                         CORR_COEF_SE_COLUMN : np.sqrt(corrected_var)})
+
+
+def report_multi_outcome_results(iargs: InternalNamespace,
+                                 results: Dict[str, InternalNamespace]):
+    """
+    Reports the results of multi_outcome_error_correction(), writing one results file per outcome
+    (named using the output prefix and the outcome)
+
+    :param iargs: Internal namespace of values directly or indirectly from parsed inputs
+    :param results: Dictionary mapping each outcome to its results
+    """
+
+    for outcome, result in results.items():
+        logging.info("\n============= OUTCOME %s =============\n", outcome)
+        outcome_iargs = copy.copy(iargs)
+        outcome_iargs.out = "%s_%s" % (iargs.out, outcome)
+        report_results(outcome_iargs, result)
+
+
+def error_correction_from_moments(iargs: InternalNamespace, moments: InternalNamespace,
+                                  wt_moments: InternalNamespace, moment_cols: List[str]):
+    """
+    Implementation of error correction procedure that works from the sufficient statistics of the
+    regression data instead of the data itself (gives the same results as
+    error_correction_procedure())
 
     :param iargs: Holds arguments passed in by user.
-    :param reg_data: Regression data.
+    :param moments: Unweighted moments of the regression data
+    :param wt_moments: Moments weighted by the regression weights (or the same as moments if the
+                       regression is unweighted)
+    :param moment_cols: Columns (in order) of the data the moments were calculated from
 
     :return: Object holding corrected and uncorrected coefficients and standard errors along with
              rho, h^2, R^2, and sample size (n)
@@ -1272,16 +4861,50 @@ def error_correction_procedure(iargs: InternalNamespace, reg_data: pd.DataFrame)
     result = InternalNamespace()
 
     # If heritability is specified, add it to results, otherwise estimate it.
-    result.h2 = iargs.h2 if iargs.h2 else estimate_h2(iargs, iargs.gcta_exec, iargs.pheno_file, iargs.temp_dir,
-                                                      iargs.grm_cutoff, iargs.grm, iargs.num_threads,
-                                                      iargs.quiet_h2)
+    result.h2 = iargs.h2 if iargs.h2 else estimate_full_sample_h2(iargs)
     # Store sample size of data to report in results.
-    result.n = reg_data.shape[0]
+    result.n = moments.n
 
     # Determine R^2 (calculate if necessary)
-    result.R2 = iargs.R2 if iargs.R2 else estimate_R2(reg_data, iargs.pgi_pheno_var, iargs.pgi_var)
+    result.R2 = iargs.R2 if iargs.R2 else estimate_R2_from_moments(
+        moments, moment_cols, iargs.pgi_pheno_var, iargs.pgi_var)
 
     # Calculate rho based on h^2 and R^2
+    _set_result_rho(iargs, result)
+
+    # Calculate initial regression values
+    logging.debug("Calculating uncorrected coefficients(s) and standard error(s)...")
+    result.uncorrected_alphas, result.uncorrected_alphas_se, var_cov_matrix = \
+        get_alpha_ghat_from_moments(iargs.y_cols, iargs.G_cols, iargs.z_cols, wt_moments,
+                                    moment_cols)
+
+    # Calculate the correction matrix (stacked with those of the sensitivity grid, if any)
+    logging.debug("Getting correction matrix...")
+    grid_rho = calculate_grid_rho(iargs, result)
+    corr_inputs = correction_matrix_inputs_from_moments(iargs.G_cols, iargs.z_cols,
+                                                        iargs.z_int_cols, moments, moment_cols)
+    corr_matrix = build_correction_matrix(len(iargs.G_cols), *corr_inputs, result.rho if grid_rho
+                                          is None else np.append(result.rho, grid_rho))
+
+    # Use that correction matrix to correct coefficients and standard errors
+    _correct_result(result, corr_matrix, var_cov_matrix, grid_rho)
+
+    # Replace the standard errors with delta method ones if requested
+    if getattr(iargs, "analytic_se", False):
+        _set_analytic_se(iargs, result, corr_inputs)
+
+    return result
+
+
+def _set_result_rho(iargs: InternalNamespace, result: InternalNamespace):
+    """
+    Calculates rho from the h^2 and R^2 in result (and stores it there), warning or raising an
+    error if it is less than one
+
+    :param iargs: Holds arguments passed in by user.
+    :param result: Object holding h^2 and R^2
+    """
+
     result.rho = calculate_rho(h2=result.h2, r2=result.R2)
     logging.debug("rho is estimated to be sqrt(%f/%f) = %f", result.h2, result.R2, result.rho)
     if result.rho < 1.0:
@@ -1289,17 +4912,47 @@ def error_correction_procedure(iargs: InternalNamespace, reg_data: pd.DataFrame)
             "is less than 1.0.  You should double-check that the dependent variable in the R^2 "
             "calculation corresponds to the PGI phenotype.", result.rho, result.h2, result.R2)
 
-    # Calculate initial regression values
-    logging.debug("Calculating uncorrected coefficients(s) and standard error(s)...")
-    result.uncorrected_alphas, result.uncorrected_alphas_se, var_cov_matrix = get_alpha_ghat(
-        iargs.y_cols, iargs.G_cols, iargs.z_cols, iargs.wt_cols, reg_data)
 
-    # Calculate the correction matrix
-    logging.debug("Getting correction matrix...")
-    corr_matrix = calculate_correction_matrix(iargs.G_cols, iargs.z_cols, iargs.z_int_cols,
-                                              reg_data, result.rho)
+def calculate_grid_rho(iargs: InternalNamespace, result: InternalNamespace) -> np.ndarray:
+    """
+    Determines the values of rho in the sensitivity grid (if any) given the R^2 in result
+
+    :param iargs: Holds arguments passed in by user.
+    :param result: Object holding R^2
+
+    :return: Array of rho values, or None if there is no grid
+    """
+
+    h2_grid = getattr(iargs, "h2_grid", None)
+    if h2_grid is not None:
+        return calculate_rho(h2=h2_grid, r2=result.R2)
+
+    return getattr(iargs, "rho_grid", None)
+
+
+def _correct_result(result: InternalNamespace, corr_matrix: np.ndarray,
+                    var_cov_matrix: np.ndarray, grid_rho: np.ndarray = None):
+    """
+    Uses the correction matrix to correct the uncorrected coefficients and standard errors in
+    result (and stores them there)
+
+    :param result: Object holding the uncorrected coefficients
+    :param corr_matrix: Correction matrix to use, or a stack of them whose first matrix is the one
+                        to use and whose others correspond to the values of grid_rho
+    :param var_cov_matrix: Variance-covariance matrix of the uncorrected coefficients
+    :param grid_rho: Values of rho in the sensitivity grid (if any)
+    """
+
+    if grid_rho is not None:
+        corr_matrix, grid_corr_matrices = corr_matrix[0], corr_matrix[1:]
+        logging.debug("Correcting coefficients and standard error(s) for %s grid values...",
+                      len(grid_rho))
+        result.grid_rho = grid_rho
+        result.grid_corrected_alphas = np.matmul(grid_corr_matrices,
+                                                 result.uncorrected_alphas.to_numpy())
+        result.grid_corrected_alphas_se = np.sqrt(np.einsum(
+            "kij,jl,kil->ki", grid_corr_matrices, var_cov_matrix, grid_corr_matrices))
 
-    # Use that correction matrix to correct coefficients and standard errors
     logging.debug("Correcting coefficients and standard error(s)...")
     result.corrected_alphas = calculate_corrected_coefficients(corr_matrix,
                                                                result.uncorrected_alphas)
@@ -1310,7 +4963,41 @@ def error_correction_procedure(iargs: InternalNamespace, reg_data: pd.DataFrame)
     result.R2_se = None
     result.rho_se = None
 
-    return result
+
+def _set_analytic_se(iargs: InternalNamespace, result: InternalNamespace,
+                     corr_inputs: Tuple[np.ndarray, np.ndarray, np.ndarray], g_var: float = None):
+    """
+    Calculates delta method standard errors for h^2, R^2, rho, and the corrected coefficients (and
+    stores them in result).  h^2 and R^2 are treated as independent of each other and of the
+    uncorrected coefficients, and V_ghat as known.
+
+    :param iargs: Holds arguments passed in by user.
+    :param result: Object holding the corrected and uncorrected coefficients
+    :param corr_inputs: Statistics the correction matrix was built from (see
+                        correction_matrix_inputs())
+    :param g_var: Variance of the PGI in V_ghat if it isn't 1 (see calculate_center_matrix())
+    """
+
+    # Standard error of h^2 from the estimation software (or the user)
+    result.h2_se = iargs.h2_se if iargs.h2 else full_sample_h2_se(iargs)
+    if not result.h2_se:
+        logging.info("No standard error available for h^2, so it is treated as known.")
+
+    # Large sample variance of an estimated R^2, 4 R^2 (1 - R^2)^2 / n
+    result.R2_se = None if iargs.R2 else np.sqrt(4.0 * result.R2 * (1.0 - result.R2) ** 2 /
+                                                 result.n)
+
+    # rho = sqrt(h^2 / R^2), so var(rho) = rho^2 / 4 * (var(h^2) / h^2^2 + var(R^2) / R^2^2)
+    rel_var = sum((se / est) ** 2 for se, est in [(result.h2_se, result.h2),
+                                                  (result.R2_se, result.R2)] if se)
+    rho_var = result.rho ** 2 * rel_var / 4.0
+    result.rho_se = np.sqrt(rho_var)
+
+    # Variance of the corrected coefficients adds that of rho through the correction matrix
+    d_alphas = np.matmul(build_correction_matrix_derivative(len(iargs.G_cols), *corr_inputs,
+                                                            result.rho, g_var),
+                         result.uncorrected_alphas.to_numpy())
+    result.corrected_alphas_se = np.sqrt(result.corrected_alphas_se ** 2 + rho_var * d_alphas ** 2)
 
 
 def calculate_rho(h2: float, r2: float) -> float:
@@ -1376,6 +5063,281 @@ def report_results(iargs: InternalNamespace, pgic_result: InternalNamespace):
     logging.info("Check output file [%s] for recorded results, including corrected coefficients.",
                  full_outputfile_path)
 
+    # Write the sensitivity grid results (if any) as one row per grid value and variable
+    grid_rho = getattr(pgic_result, "grid_rho", None)
+    if grid_rho is not None:
+        grid_outputfile_path = iargs.out + ".grid.tsv"
+        out_vars = out_data[VAR_OUTPUT_COLUMN].to_numpy()
+        var_idx = pgic_result.uncorrected_alphas.index.get_indexer(out_vars)
+        grid_data = pd.DataFrame(columns=GRID_OUTPUT_COLUMNNAMES)
+        grid_data["h2"] = np.repeat(grid_rho ** 2 * pgic_result.R2, len(out_vars))
+        grid_data["R2"] = pgic_result.R2
+        grid_data["rho"] = np.repeat(grid_rho, len(out_vars))
+        grid_data[VAR_OUTPUT_COLUMN] = np.tile(out_vars, len(grid_rho))
+        grid_data[CORR_COEF_COLUMN] = pgic_result.grid_corrected_alphas[:, var_idx].ravel()
+        grid_data[CORR_COEF_SE_COLUMN] = pgic_result.grid_corrected_alphas_se[:, var_idx].ravel()
+        grid_data.to_csv(grid_outputfile_path, sep="\t", index=False)
+        logging.info("Check output file [%s] for the corrected coefficients over the %s grid "
+                     "values.", grid_outputfile_path, len(grid_rho))
+
+
+def read_spec_file(spec_file: str) -> List[Dict[str, Any]]:
+    """
+    Reads a specification file: a JSON or YAML list of objects, or tab-separated text with a
+    header row of flag names (multiple values in a cell are separated by spaces, and empty cells
+    are ignored)
+
+    :param spec_file: Path to the specification file
+
+    :return: List of specifications, each a dictionary mapping flag names to values
+    """
+
+    extension = os.path.splitext(spec_file)[1].lower()
+    if extension in JSON_SPEC_EXTENSIONS:
+        with open(spec_file, "r") as f:
+            specs = json.load(f)
+    elif extension in YAML_SPEC_EXTENSIONS:
+        if not yaml:
+            raise ImportError("Reading YAML specification file [%s] requires the PyYAML package "
+                              "to be installed." % spec_file)
+        with open(spec_file, "r") as f:
+            specs = yaml.safe_load(f)
+    else:
+        spec_table = pd.read_csv(spec_file, sep="\t", dtype=str, keep_default_na=False)
+        specs = [{flag : value.split() for flag, value in row.items() if value.strip()}
+                 for row in spec_table.to_dict(orient="records")]
+
+    if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+        raise ValueError("Specification file [%s] should hold a list of specifications (flag "
+                         "name to value mappings)." % spec_file)
+    if not specs:
+        raise ValueError("Specification file [%s] holds no specifications." % spec_file)
+
+    return specs
+
+
+def spec_to_argv(spec: Dict[str, Any]) -> List[str]:
+    """
+    Converts a specification into command line flags.  True / False values (or single "true" /
+    "false" strings) include / omit a flag without values, and lists give multiple values.
+
+    :param spec: Dictionary mapping flag names (with or without leading dashes) to values
+
+    :return: List of flags and values
+    """
+
+    argv = []
+    for flag, values in spec.items():
+        values = values if isinstance(values, list) else [values]
+        flag = "--" + to_flag(flag.lstrip("-"))
+        if len(values) == 1 and str(values[0]).lower() in ("true", "false"):
+            argv += [flag] if str(values[0]).lower() == "true" else []
+        else:
+            argv += [flag] + [str(value) for value in values]
+
+    return argv
+
+
+def run_spec_file(argv: List[str]):
+    """
+    Runs every specification in a --spec-file.  All specifications are validated first.  Then each
+    distinct regression data file is read once (all the columns any of its specifications need),
+    h^2 software, GRMs, and full sample h^2 estimates are obtained once and shared, and finally
+    the specifications are run (in a pool of worker processes if requested), each writing its
+    results file as soon as it finishes.
+
+    :param argv: List of arguments passed to the program (meant to be sys.argv)
+    """
+
+    parser = _get_parser(argv[0])
+    base_iargs = validate_inputs_for_spec_file(argv)
+    specs = read_spec_file(base_iargs.spec_file)
+    logging.info("Read %s specifications from [%s]", len(specs), base_iargs.spec_file)
+
+    # Validate every specification (flags in the specification override command line ones)
+    all_iargs = []
+    for spec_num, spec in enumerate(specs):
+        spec_argv = argv + spec_to_argv(spec)
+        if "out" not in {to_arg(flag.lstrip("-")) for flag in spec}:
+            spec_argv += ["--out", "%s_spec%s" % (base_iargs.out, spec_num)]
+        logging.debug("Specification %s: %s", spec_num, format_os_cmd(spec_argv))
+        spec_parsed_args = parser.parse_args(spec_argv[1:])
+        all_iargs.append(validate_inputs(spec_parsed_args,
+                                         get_user_inputs(spec_argv, spec_parsed_args)))
+
+    temp_dir_object = None
+    try:
+        # Temporary directories (one shared, plus one per specification)
+        if any(iargs.calc_h2 or iargs.jk_se for iargs in all_iargs):
+            temp_dir_object = tempfile.TemporaryDirectory(dir=base_iargs.out_dir)
+            for spec_num, iargs in enumerate(all_iargs):
+                iargs.temp_dir = os.path.join(temp_dir_object.name, "spec%s" % spec_num)
+                os.mkdir(iargs.temp_dir)
+
+        # Read each regression data file once (with the columns all of its specifications need)
+        reg_data_by_file = {}
+        for data_key in {(iargs.reg_data_file, iargs.reg_data_format) for iargs in all_iargs
+                         if not iargs.streaming}:
+            file_iargs = [iargs for iargs in all_iargs if
+                          (iargs.reg_data_file, iargs.reg_data_format) == data_key]
+            needed = set(itertools.chain.from_iterable(
+                determine_reg_data_usecols(iargs) for iargs in file_iargs))
+            load_iargs = copy.copy(file_iargs[0])
+            load_iargs.id_col = sorted(set(itertools.chain.from_iterable(
+                iargs.id_col for iargs in file_iargs)))
+            logging.info("Loading regression data file [%s] into memory...", data_key[0])
+            reg_data_by_file[data_key] = load_regression_data(
+                load_iargs, [col for col in load_iargs.reg_data_columns if col in needed])
+
+        # Obtain h^2 software and GRMs, and estimate full sample h^2, once for all specifications
+        h2_execs = {}
+        grms = {}
+        for iargs in all_iargs:
+            if not iargs.calc_h2:
+                continue
+            if iargs.download_gcta or iargs.download_bolt:
+                if iargs.use_gcta not in h2_execs:
+                    logging.info("Retrieving %s...", "GCTA" if iargs.use_gcta else "BOLT-LMM")
+                    h2_execs[iargs.use_gcta] = get_h2_software(temp_dir_object.name,
+                                                               iargs.use_gcta)
+                if iargs.use_gcta:
+                    iargs.gcta_exec = h2_execs[iargs.use_gcta]
+                else:
+                    iargs.bolt_exec = h2_execs[iargs.use_gcta]
+            if not iargs.grm and not iargs.grm_sparse and \
+                    (iargs.use_gcta or iargs.h2_method == H2_METHOD_REML_EIGEN):
+                native = iargs.grm_builder == GRM_BUILDER_NATIVE
+                grm_key = (None if native else iargs.gcta_exec, iargs.bfile)
+                if grm_key not in grms:
+                    logging.info("Constructing GRM for [%s] using %s...", iargs.bfile,
+                                 "the built-in builder" if native else "GCTA")
+                    grm_dir = os.path.join(temp_dir_object.name, "grm%s" % len(grms))
+                    os.mkdir(grm_dir)
+                    grms[grm_key] = build_grm_native(iargs.bfile, grm_dir) if native else \
+                                    build_grm(iargs.gcta_exec, iargs.bfile, grm_dir,
+                                              iargs.num_threads, iargs.quiet_h2)
+                iargs.grm = grms[grm_key]
+            if iargs.grm and iargs.sparse_grm_cutoff is not None:
+                sparse_key = (iargs.grm, SPARSE_GRM_NAME, iargs.sparse_grm_cutoff)
+                if sparse_key not in grms:
+                    grms[sparse_key] = sparsify_grm(open_grm(iargs.grm), iargs.sparse_grm_cutoff,
+                                                    os.path.join(temp_dir_object.name, "%s%s" % (
+                                                        SPARSE_GRM_NAME, len(grms))))
+                iargs.grm_sparse = grms[sparse_key]
+            elif iargs.grm and iargs.grm_cutoff is not None and \
+                    (iargs.use_gcta or iargs.h2_method == H2_METHOD_REML_EIGEN):
+                pruned_key = (iargs.grm, iargs.grm_cutoff)
+                if pruned_key not in grms:
+                    apply_grm_cutoff(iargs, os.path.join(temp_dir_object.name, "%s%s" % (
+                        PRUNED_GRM_NAME, len(grms))))
+                    grms[pruned_key] = (iargs.grm, iargs.grm_kept_ids, iargs.grm_source)
+                iargs.grm, iargs.grm_kept_ids, iargs.grm_source = grms[pruned_key]
+                iargs.grm_cutoff = None
+            estimate_full_sample_h2(iargs)
+
+        # Run the specifications
+        spec_nums = range(len(all_iargs))
+        if base_iargs.spec_workers > 1:
+            logging.info("Running %s specifications using %s worker processes...",
+                         len(all_iargs), base_iargs.spec_workers)
+            with multiprocessing.Pool(base_iargs.spec_workers, initializer=_init_spec_worker,
+                                      initargs=(all_iargs, reg_data_by_file,
+                                                _full_sample_h2s)) as pool:
+                failures = [failure for failure in pool.imap_unordered(_spec_worker_run, spec_nums)
+                            if failure]
+        else:
+            _init_spec_worker(all_iargs, reg_data_by_file, _full_sample_h2s)
+            failures = [failure for failure in map(_spec_worker_run, spec_nums) if failure]
+
+        if failures:
+            raise RuntimeError("%s of %s specifications failed:\n%s" %
+                               (len(failures), len(all_iargs), "\n".join(sorted(failures))))
+    finally:
+        if temp_dir_object:
+            temp_dir_object.cleanup()
+
+
+def validate_inputs_for_spec_file(argv: List[str]) -> InternalNamespace:
+    """
+    Validates the flags that apply to a --spec-file run as a whole
+
+    :param argv: List of arguments passed to the program (meant to be sys.argv)
+
+    :return: Internal namespace holding the spec file, output, and worker settings
+    """
+
+    parsed_args = _get_parser(argv[0], spec_file_mode=True).parse_args(argv[1:])
+
+    settings = InternalNamespace()
+    settings.spec_file = parsed_args.spec_file
+    settings.spec_workers = parsed_args.spec_workers
+    settings.out = parsed_args.out
+    settings.out_dir = os.path.dirname(parsed_args.out)
+
+    if not os.path.exists(settings.spec_file):
+        raise FileNotFoundError("The designated specification file [%s] does not exist." %
+                                settings.spec_file)
+    if settings.spec_workers < 1:
+        raise ValueError("The specified spec-workers (%s) must be positive." %
+                         settings.spec_workers)
+
+    return settings
+
+
+def _init_spec_worker(all_iargs: List[InternalNamespace], reg_data_by_file: Dict,
+                      full_sample_h2s: Dict):
+    """
+    Initializer of specification workers (processes, or this process when running serially)
+
+    :param all_iargs: Internal namespace of each specification
+    :param reg_data_by_file: Loaded regression data, keyed by (file, format)
+    :param full_sample_h2s: Full sample h^2 estimates that have already been made
+    """
+
+    global _spec_worker_state
+
+    _spec_worker_state = InternalNamespace()
+    _spec_worker_state.all_iargs = all_iargs
+    _spec_worker_state.reg_data_by_file = reg_data_by_file
+    _full_sample_h2s.update(full_sample_h2s)
+
+
+def _spec_worker_run(spec_num: int) -> str:
+    """
+    Runs one specification and writes its results file
+
+    :param spec_num: Index of the specification
+
+    :return: Description of the failure if the specification failed, otherwise None
+    """
+
+    iargs = _spec_worker_state.all_iargs[spec_num]
+    logging.info("\n============= SPECIFICATION %s (%s) =============\n", spec_num, iargs.out)
+    try:
+        if iargs.streaming:
+            report_results(iargs, streaming_error_correction(iargs))
+        elif len(iargs.pgi_var) > 1:
+            pgi_scan(iargs, _spec_worker_state.reg_data_by_file[
+                (iargs.reg_data_file, iargs.reg_data_format)])
+        else:
+            reg_data = adjust_regression_data(_spec_worker_state.reg_data_by_file[
+                (iargs.reg_data_file, iargs.reg_data_format)], iargs)
+            if len(iargs.outcome) > 1:
+                report_multi_outcome_results(iargs,
+                                             multi_outcome_error_correction(iargs, reg_data))
+            else:
+                pgic_result = error_correction_procedure(iargs, reg_data)
+                if iargs.jk_se:
+                    jack_knife_se(iargs, reg_data, pgic_result)
+                elif iargs.bootstrap:
+                    bootstrap_se(iargs, reg_data, pgic_result)
+                report_results(iargs, pgic_result)
+    except Exception as e:
+        logging.exception(e)
+        return "specification %s (%s): %s" % (spec_num, iargs.out, e)
+
+    return None
+
 
 def main_func(argv: List[str]):
     """
@@ -1385,8 +5347,10 @@ def main_func(argv: List[str]):
     :param argv: List of arguments passed to the program (meant to be sys.argv)
     """
 
-    # Parse the input flags using argparse
-    parser = _get_parser(argv[0])
+    # Parse the input flags using argparse (the specifications supply required flags in
+    # --spec-file mode)
+    spec_file_mode = any(token.split("=")[0] == "--spec-file" for token in argv[1:])
+    parser = _get_parser(argv[0], spec_file_mode)
     parsed_args = parser.parse_args(argv[1:])
 
     # Break down inputs to keep track of arguments and values pecified directly by the user
@@ -1400,6 +5364,11 @@ def main_func(argv: List[str]):
     logging.info("See full log at: %s\n", full_logfile_path)
     logging.info(format_os_cmd(argv))
 
+    # Run each specification in the specification file if there is one
+    if parsed_args.spec_file:
+        run_spec_file(argv)
+        return
+
     # Validate inputs
     iargs = validate_inputs(parsed_args, user_args)
 
@@ -1411,11 +5380,18 @@ def main_func(argv: List[str]):
             temp_dir_object = tempfile.TemporaryDirectory(dir=iargs.out_dir)
             iargs.temp_dir = temp_dir_object.name
 
-        # Read in and clean/filter regression data
-        logging.info("Loading regression data into memory...")
-        reg_data = adjust_regression_data(
-            pd.read_csv(iargs.reg_data_file, sep=None, engine='python'), iargs)
-        logging.info("Read in data for %s individuals.\n", len(reg_data.index))
+        # Read in and clean/filter regression data (unless it is going to be streamed)
+        if iargs.streaming:
+            logging.info("Regression data will be streamed in chunks of %s rows.",
+                         iargs.chunk_rows)
+        elif len(iargs.pgi_var) > 1:
+            logging.info("Loading regression data into memory...")
+            reg_data = load_regression_data(iargs)
+            logging.info("Read in data for %s individuals.\n", len(reg_data.index))
+        else:
+            logging.info("Loading regression data into memory...")
+            reg_data = adjust_regression_data(load_regression_data(iargs), iargs)
+            logging.info("Read in data for %s individuals.\n", len(reg_data.index))
 
         # If h^2 software is needed, make sure it is available and calculate a GRM if need be
         if iargs.calc_h2:
@@ -1425,20 +5401,44 @@ def main_func(argv: List[str]):
             if iargs.download_bolt:
                 logging.info("Retrieving BOLT-LMM...")
                 iargs.bolt_exec = get_h2_software(iargs.temp_dir, False)
-            if not iargs.grm and iargs.use_gcta:
-                logging.info("Constructing GRM using GCTA...")
-                iargs.grm = build_grm(iargs.gcta_exec, iargs.bfile,
-                                      iargs.temp_dir, iargs.num_threads, iargs.quiet_h2)
+            if not iargs.grm and not iargs.grm_sparse and \
+                    (iargs.use_gcta or iargs.h2_method == H2_METHOD_REML_EIGEN):
+                if iargs.grm_builder == GRM_BUILDER_NATIVE:
+                    logging.info("Constructing GRM using the built-in builder...")
+                    iargs.grm = build_grm_native(iargs.bfile, iargs.temp_dir)
+                else:
+                    logging.info("Constructing GRM using GCTA...")
+                    iargs.grm = build_grm(iargs.gcta_exec, iargs.bfile,
+                                          iargs.temp_dir, iargs.num_threads, iargs.quiet_h2)
+            if iargs.grm and iargs.sparse_grm_cutoff is not None:
+                iargs.grm_sparse = sparsify_grm(open_grm(iargs.grm), iargs.sparse_grm_cutoff,
+                                                os.path.join(iargs.temp_dir, SPARSE_GRM_NAME))
+            elif iargs.grm and iargs.grm_cutoff is not None and \
+                    (iargs.use_gcta or iargs.h2_method == H2_METHOD_REML_EIGEN):
+                apply_grm_cutoff(iargs, os.path.join(iargs.temp_dir, PRUNED_GRM_NAME))
 
         logging.info("You've specified %d covariates to control for.", len(iargs.covariates))
         logging.info("You've specified %d interaction variables.", len(iargs.pgi_interact_vars))
 
+        # Scan the PGIs if there are several (and stop there)
+        if len(iargs.pgi_var) > 1:
+            pgi_scan(iargs, reg_data)
+            return
+
+        # Correct each outcome separately if there are several (and stop there)
+        if len(iargs.outcome) > 1:
+            report_multi_outcome_results(iargs, multi_outcome_error_correction(iargs, reg_data))
+            return
+
         # Run the error correction method
-        pgic_result = error_correction_procedure(iargs, reg_data)
+        pgic_result = streaming_error_correction(iargs) if iargs.streaming else \
+                      error_correction_procedure(iargs, reg_data)
 
         # Jack-knife if needed
         if iargs.jk_se:
             jack_knife_se(iargs, reg_data, pgic_result)
+        elif iargs.bootstrap:
+            bootstrap_se(iargs, reg_data, pgic_result)
 
         # Report results (mixture of logging and sending output to the results file)
         report_results(iargs, pgic_result)
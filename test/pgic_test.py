@@ -2,9 +2,16 @@
 Unit tests of components in pgic.py.  This should be run via pytest
 """
 
+import os
+
 import numpy as np
+import pandas as pd
 import pgs_correct.pgic as pgic
 import pytest
+import scipy.optimize
+import statsmodels.api as sm
+
+data_directory = os.path.join(os.path.dirname(__file__), 'data')
 
 ###########################################
 
@@ -112,6 +119,236 @@ class TestCalculateCorrectedCoefficients:
 
 ###########################################
 
+class TestBuildCorrectionMatrixDerivative:
+
+    #########
+    @pytest.mark.parametrize("num_int, num_z, rho",
+        [
+        (0, 2, 1.5),
+        (1, 2, 2.0),
+        (2, 3, 3.0)
+        ]
+    )
+    def test_matches_finite_differences(self, num_int, num_z, rho):
+        data = np.random.normal(size=(200, 1 + num_int + num_z))
+        V_ghat = np.cov(data, rowvar=False)
+        z_int = data[:, 1 + num_int:1 + 2 * num_int]
+        z_int_mean, z_int_cov = np.mean(z_int, axis=0), np.cov(z_int, rowvar=False)
+
+        step = 1e-6
+        numeric = (pgic.build_correction_matrix(1 + num_int, V_ghat, z_int_mean, z_int_cov,
+                                                rho + step) -
+                   pgic.build_correction_matrix(1 + num_int, V_ghat, z_int_mean, z_int_cov,
+                                                rho - step)) / (2 * step)
+        assert np.allclose(pgic.build_correction_matrix_derivative(
+            1 + num_int, V_ghat, z_int_mean, z_int_cov, rho), numeric, atol=1e-6)
+
+###########################################
+
+class TestParseH2Log:
+
+    #########
+    @pytest.mark.parametrize("log_lines, use_gcta, expected",
+        [
+        (["Summary result of REML analysis:\n", "V(G)/Vp\t0.412345\t0.051234\n"], True,
+            (0.412345, 0.051234)),
+        (["V(G)/Vp\t0.4\n"], True, (0.4, None)),
+        (["Estimating h2g...\n", "  h2g (1,1): 0.234567 (0.012345)\n"], False,
+            (0.234567, 0.012345)),
+        (["  h2g (1,1): 0.2\n"], False, (0.2, None))
+        ]
+    )
+    def test_happypath_noerrors(self, log_lines, use_gcta, expected):
+        assert pgic.parse_h2_log(log_lines, use_gcta, "test.log") == expected
+
+    #########
+    @pytest.mark.parametrize("use_gcta", [True, False])
+    def test_missing_estimate_raises(self, use_gcta):
+        with pytest.raises(LookupError):
+            pgic.parse_h2_log(["Vp\t1.0\t0.1\n"], use_gcta, "test.log")
+
+###########################################
+
+class TestCombineMoments:
+
+    #########
+    @pytest.mark.parametrize("split_rows, weighted",
+        [
+        ([0], False),
+        ([1, 50, 51], False),
+        ([10, 20, 90], True),
+        ]
+    )
+    def test_combined_equals_direct_noerrors(self, split_rows, weighted):
+        data = np.random.normal(loc=1000.0, size=(100, 3))
+        weights = np.random.uniform(0.5, 2.0, size=100) if weighted else None
+
+        combined = pgic.calculate_moments(np.empty((0, 3)))
+        for rows in np.split(np.arange(100), split_rows):
+            combined = pgic.combine_moments(combined, pgic.calculate_moments(
+                data[rows], weights[rows] if weighted else None))
+        direct = pgic.calculate_moments(data, weights)
+
+        assert combined.n == 100
+        assert np.isclose(combined.sw, direct.sw)
+        assert np.allclose(combined.mean, direct.mean)
+        assert np.allclose(combined.css, direct.css)
+        if not weighted:
+            assert np.allclose(combined.css / 99, np.cov(data, rowvar=False))
+
+###########################################
+
+class TestCalculateMoments:
+
+    #########
+    @pytest.mark.parametrize("block_rows, weighted",
+        [
+        (7, False),
+        (7, True),
+        (1000, True),
+        ]
+    )
+    def test_float32_accumulated_in_float64_noerrors(self, monkeypatch, block_rows, weighted):
+        monkeypatch.setattr(pgic, "MOMENTS_BLOCK_ROWS", block_rows)
+        data = np.random.normal(loc=1000.0, size=(100, 3)).astype(np.float32)
+        weights = np.random.uniform(0.5, 2.0, size=100) if weighted else None
+
+        moments = pgic.calculate_moments(data, weights)
+        expected = pgic.calculate_moments(data.astype(np.float64), weights)
+
+        assert moments.n == 100
+        assert moments.mean.dtype == np.float64 and moments.css.dtype == np.float64
+        assert np.allclose(moments.mean, expected.mean, rtol=1e-14)
+        assert np.allclose(moments.css, expected.css, rtol=1e-10)
+
+###########################################
+
+class TestMomentsConditionNumber:
+
+    #########
+    def test_scale_invariant_noerrors(self):
+        data = np.random.normal(size=(100, 3))
+        scaled = data * np.array([1e-6, 1.0, 1e6])
+        condition = pgic.moments_condition_number(pgic.calculate_moments(data), [0, 1, 2])
+        assert np.isclose(pgic.moments_condition_number(pgic.calculate_moments(scaled),
+                                                        [0, 1, 2]), condition)
+        assert condition < pgic.MOMENTS_MAX_CONDITION
+
+    #########
+    def test_collinear_or_constant_infinite_noerrors(self):
+        data = np.random.normal(size=(100, 3))
+        data[:, 2] = data[:, 0] - 2.0 * data[:, 1]
+        data[:, 1] = 5.0
+        moments = pgic.calculate_moments(data)
+        assert pgic.moments_condition_number(moments, [0, 1]) == np.inf
+        assert pgic.moments_condition_number(moments, [0, 2]) < pgic.MOMENTS_MAX_CONDITION
+        data[:, 1] = np.random.normal(size=100)
+        data[:, 2] = data[:, 0] - 2.0 * data[:, 1]
+        assert pgic.moments_condition_number(pgic.calculate_moments(data), [0, 1, 2]) > \
+            pgic.MOMENTS_MAX_CONDITION
+
+###########################################
+
+class TestReadRegDataHeader:
+
+    #########
+    @pytest.mark.parametrize("header, expected_sep, expected_cols",
+        [
+        ("IID\tPGI\tPHENO\n", "\t", ["IID", "PGI", "PHENO"]),
+        ("IID,PGI,PHENO\n", ",", ["IID", "PGI", "PHENO"]),
+        ("IID PGI  PHENO\n", pgic.WHITESPACE_SEP, ["IID", "PGI", "PHENO"]),
+        ("PGI\n", pgic.WHITESPACE_SEP, ["PGI"])
+        ]
+    )
+    def test_happypath_noerrors(self, tmp_path, header, expected_sep, expected_cols):
+        data_file = tmp_path / "reg_data.txt"
+        data_file.write_text(header)
+        assert pgic.read_reg_data_header(str(data_file)) == (expected_sep, expected_cols)
+
+###########################################
+
+class TestLoadRegressionData:
+
+    #########
+    @pytest.mark.parametrize("sep", ["\t", ",", " "])
+    def test_projects_needed_columns_noerrors(self, tmp_path, sep):
+        data_file = tmp_path / "reg_data.txt"
+        data_file.write_text(sep.join(["IID", "PGI", "PHENO", "PC1", "UNUSED"]) + "\n" +
+                             sep.join(["001", "0.5", "1.5", "2", "x"]) + "\n" +
+                             sep.join(["002", "-0.5", "NA", "3", "y"]) + "\n")
+
+        iargs = pgic.InternalNamespace()
+        iargs.reg_data_file = str(data_file)
+        iargs.reg_data_format = pgic.TEXT_FORMAT
+        iargs.reg_data_sep, iargs.reg_data_columns = pgic.read_reg_data_header(str(data_file))
+        iargs.outcome = ["PHENO"]
+        iargs.pgi_var = ["PGI"]
+        iargs.pgi_pheno_var = ["PHENO"]
+        iargs.covariates = ["PC1"]
+        iargs.pgi_interact_vars = []
+        iargs.weights = []
+        iargs.id_col = ["IID"]
+
+        df = pgic.load_regression_data(iargs)
+
+        assert list(df.columns) == ["IID", "PGI", "PHENO", "PC1"]
+        assert list(df["IID"]) == ["001", "002"]
+        assert df["PC1"].dtype == np.float64
+        assert np.isnan(df["PHENO"][1])
+
+    #########
+    @pytest.mark.parametrize("extension, feather_version",
+        [
+        (".parquet", None),
+        (".feather", 2),
+        (".feather", 1),
+        (".arrow", 2)
+        ]
+    )
+    def test_columnar_matches_text_noerrors(self, tmp_path, extension, feather_version):
+        pyarrow = pytest.importorskip("pyarrow")
+        import pyarrow.feather
+
+        df = pd.DataFrame({"IID" : [1, 2, 3], "PGI" : [0.5, -0.5, 0.0], "PHENO" : [1.5, None, 2.0],
+                           "PC1" : [2, 3, 4], "UNUSED" : ["x", "y", "z"]})
+        text_file = tmp_path / "reg_data.txt"
+        df.to_csv(text_file, sep="\t", index=False)
+        columnar_file = tmp_path / ("reg_data" + extension)
+        if extension == ".parquet":
+            df.to_parquet(columnar_file, row_group_size=2)
+        elif feather_version == 1:
+            pyarrow.feather.write_feather(df, str(columnar_file), version=1)
+        else:
+            pyarrow.feather.write_feather(pyarrow.Table.from_pandas(df), str(columnar_file),
+                                          chunksize=2)
+
+        loaded = []
+        for data_file in [text_file, columnar_file]:
+            iargs = pgic.InternalNamespace()
+            iargs.reg_data_file = str(data_file)
+            iargs.reg_data_format = pgic.determine_reg_data_format(str(data_file))
+            iargs.reg_data_sep, iargs.reg_data_columns = pgic.read_reg_data_header(
+                str(data_file), iargs.reg_data_format)
+            iargs.outcome = ["PHENO"]
+            iargs.pgi_var = ["PGI"]
+            iargs.pgi_pheno_var = ["PHENO"]
+            iargs.covariates = ["PC1"]
+            iargs.pgi_interact_vars = []
+            iargs.weights = []
+            iargs.id_col = ["IID"]
+            loaded.append(pgic.load_regression_data(iargs))
+
+            batches = list(pgic.iter_regression_data_batches(iargs, batch_rows=2))
+            assert len(batches) == 2
+            pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), loaded[-1])
+
+        assert iargs.reg_data_format != pgic.TEXT_FORMAT
+        assert iargs.reg_data_sep is None
+        assert iargs.reg_data_columns == list(df.columns)
+        pd.testing.assert_frame_equal(loaded[0], loaded[1])
+
+###########################################
+
 arg_to_flag_dict = {
     "" : "",
     " " : " ",
@@ -126,6 +363,773 @@ test_flag_arg_pairs = list(flag_to_arg_dict.items())
 test_args = list(arg_to_flag_dict.keys())
 test_flags = list(flag_to_arg_dict.keys())
 
+class TestSolverConformance:
+
+    G_COLS = ["PGI", "PGI_x_PC1"]
+    Z_COLS = ["PC%s" % i for i in range(1, 21)]
+
+    #########
+    @pytest.fixture
+    def reg_data(self):
+        data = pd.read_csv(os.path.join(data_directory, "reg_data.txt"), sep="\t")
+        data["PGI_x_PC1"] = data["PGI"] * data["PC1"]
+        data["WT"] = 0.5 + np.abs(data["PC2"]) / np.abs(data["PC2"]).max()
+        data[pgic.CONS_COL_NAME] = 1.0
+        return data
+
+    #########
+    @pytest.mark.parametrize("solver", [pgic.SOLVER_CHOLESKY, pgic.SOLVER_QR])
+    @pytest.mark.parametrize("wt_cols", [[], ["WT"]])
+    def test_alpha_ghat_matches_statsmodels(self, reg_data, solver, wt_cols):
+        args = (["PHENO"], self.G_COLS, self.Z_COLS, wt_cols, reg_data)
+        exp_coefs, exp_se, exp_cov = pgic.get_alpha_ghat(*args, pgic.SOLVER_STATSMODELS)
+        coefs, se, cov = pgic.get_alpha_ghat(*args, solver)
+
+        pd.testing.assert_series_equal(coefs, exp_coefs, check_exact=False, rtol=1e-8)
+        pd.testing.assert_series_equal(se, exp_se, check_exact=False, rtol=1e-8)
+        pd.testing.assert_frame_equal(cov, exp_cov, check_exact=False, rtol=1e-8)
+
+    #########
+    @pytest.mark.parametrize("solver", [pgic.SOLVER_CHOLESKY, pgic.SOLVER_QR])
+    def test_R2_matches_statsmodels(self, reg_data, solver):
+        expected = sm.OLS(reg_data["PHENO"], reg_data[["PGI", pgic.CONS_COL_NAME]]).fit().rsquared
+        assert pgic.estimate_R2(reg_data, ["PHENO"], ["PGI"], solver) == pytest.approx(expected)
+
+    #########
+    def test_unknown_solver_raises(self, reg_data):
+        with pytest.raises(ValueError):
+            pgic.solve_least_squares(reg_data["PHENO"].to_numpy(),
+                                     reg_data[["PGI", pgic.CONS_COL_NAME]].to_numpy(),
+                                     solver="svd")
+
+
+###########################################
+
+class TestGrmIO:
+
+    #########
+    @pytest.fixture
+    def grm_prefix(self, tmp_path):
+        np.random.seed(0)
+        num_people = 9
+        genotypes = np.random.normal(size=(num_people, 50))
+        grm = np.matmul(genotypes, genotypes.T) / 50
+        ids = pd.DataFrame({"FID": ["f%s" % i for i in range(num_people)],
+                            "IID": ["0%s" % i for i in range(num_people)]})
+        prefix = str(tmp_path / "test")
+        pgic.write_grm(prefix, ids, grm, np.full((num_people, num_people), 50.0) + grm)
+        return prefix
+
+    #########
+    def test_open_grm_round_trip(self, grm_prefix):
+        grm = pgic.open_grm(grm_prefix)
+        matrix = pgic.grm_to_matrix(grm)
+
+        assert list(grm.ids.IID) == ["0%s" % i for i in range(9)]
+        assert np.allclose(matrix, matrix.T)
+        assert grm.bin.shape[0] == grm.N_bin.shape[0] == 45
+        assert np.allclose(pgic.grm_to_matrix(grm, [1, 4, 8]), matrix[np.ix_([1, 4, 8], [1, 4, 8])])
+
+    #########
+    @pytest.mark.parametrize("keep_idx", [[0, 2, 3, 7, 8], [5], list(range(9))])
+    @pytest.mark.parametrize("chunk_elements", [1, 4, pgic.DEFAULT_GRM_CHUNK_ELEMENTS])
+    def test_write_restricted_grm(self, grm_prefix, keep_idx, chunk_elements):
+        grm = pgic.open_grm(grm_prefix)
+        pgic.write_restricted_grm(grm, keep_idx, grm_prefix + "_restricted", chunk_elements)
+        restricted = pgic.open_grm(grm_prefix + "_restricted")
+        positions = pgic.grm_lower_triangle_indices(keep_idx)
+
+        pd.testing.assert_frame_equal(restricted.ids, grm.ids.iloc[keep_idx].reset_index(drop=True))
+        assert np.array_equal(restricted.bin, grm.bin[positions])
+        assert np.array_equal(restricted.N_bin, grm.N_bin[positions])
+        assert np.array_equal(pgic.grm_to_matrix(restricted),
+                              pgic.grm_to_matrix(grm)[np.ix_(keep_idx, keep_idx)])
+
+    #########
+    def test_open_grm_wrong_size_raises(self, grm_prefix):
+        with open(grm_prefix + pgic.GRM_ID_SUFFIX, "a") as id_file:
+            id_file.write("f9\t09\n")
+        with pytest.raises(ValueError):
+            pgic.open_grm(grm_prefix)
+
+
+###########################################
+
+class TestGrmCutoff:
+
+    #########
+    @pytest.fixture
+    def related_grm(self, tmp_path):
+        ids = pd.DataFrame({"FID": ["F%s" % i for i in range(6)],
+                            "IID": ["I%s" % i for i in range(6)]})
+        matrix = np.identity(6)
+        for row, col in [(1, 0), (2, 1), (4, 3)]:
+            matrix[row, col] = matrix[col, row] = 0.3
+        matrix[5, 0] = matrix[0, 5] = 0.02
+        grm_prefix = str(tmp_path / "related")
+        pgic.write_grm(grm_prefix, ids, matrix, np.full((6, 6), 100.0))
+        return grm_prefix, matrix
+
+    #########
+    @pytest.mark.parametrize("chunk_elements", [1, 4, pgic.DEFAULT_GRM_CHUNK_ELEMENTS])
+    def test_related_pairs(self, related_grm, chunk_elements):
+        grm_prefix, matrix = related_grm
+        rows, cols = pgic.grm_related_pairs(pgic.open_grm(grm_prefix), 0.025, chunk_elements)
+        assert list(zip(rows, cols)) == [(1, 0), (2, 1), (4, 3)]
+        rows, cols = pgic.grm_related_pairs(pgic.open_grm(grm_prefix), 0.01, chunk_elements)
+        assert list(zip(rows, cols)) == [(1, 0), (2, 1), (4, 3), (5, 0)]
+
+    #########
+    @pytest.mark.parametrize("cutoff, expected_keep",
+        [
+        (0.025, [0, 2, 3, 5]),  # 1 is in the most pairs, 4 is later in the tied pair
+        (0.01, [2, 3, 5]),      # 0 and 1 are both in two pairs
+        (0.5, [0, 1, 2, 3, 4, 5])
+        ]
+    )
+    def test_keeps_like_gcta(self, related_grm, cutoff, expected_keep):
+        grm_prefix, _ = related_grm
+        assert list(pgic.grm_cutoff_keep(pgic.open_grm(grm_prefix), cutoff)) == expected_keep
+
+    #########
+    @pytest.mark.parametrize("cutoff, pruned", [(0.025, True), (0.5, False)])
+    def test_apply_grm_cutoff(self, related_grm, tmp_path, cutoff, pruned):
+        grm_prefix, matrix = related_grm
+        iargs = pgic.InternalNamespace()
+        iargs.grm = grm_prefix
+        iargs.grm_cutoff = cutoff
+        pgic.apply_grm_cutoff(iargs, str(tmp_path / "pruned"))
+
+        keep = [0, 2, 3, 5] if pruned else list(range(6))
+        assert iargs.grm == (str(tmp_path / "pruned") if pruned else grm_prefix)
+        assert iargs.grm_cutoff is None
+        assert list(iargs.grm_kept_ids.IID) == ["I%s" % i for i in keep]
+        assert np.allclose(pgic.grm_to_matrix(pgic.open_grm(iargs.grm)),
+                           matrix[np.ix_(keep, keep)])
+
+
+class TestSparseGrm:
+
+    #########
+    @pytest.fixture
+    def family_grm(self, tmp_path):
+        """Dense GRM of families of 1 to 4 siblings (and a little noise), with phenotypes"""
+        np.random.seed(1)
+        family_sizes = np.random.randint(1, 5, size=100)
+        num_people = family_sizes.sum()
+        families = np.repeat(np.arange(family_sizes.shape[0]), family_sizes)
+        matrix = np.where(families[:, np.newaxis] == families, 0.5, 0.0)
+        noise = np.random.normal(scale=0.01, size=(num_people, num_people))
+        matrix += np.tril(noise, -1) + np.tril(noise, -1).T
+        np.fill_diagonal(matrix, 1.0 + np.random.normal(scale=0.01, size=num_people))
+        ids = pd.DataFrame({"FID": ["F%s" % i for i in range(num_people)],
+                            "IID": ["I%s" % i for i in range(num_people)]})
+        grm_prefix = str(tmp_path / "family")
+        pgic.write_grm(grm_prefix, ids, matrix)
+        matrix = pgic.grm_to_matrix(pgic.open_grm(grm_prefix))  # As stored (float32)
+
+        pheno = 1.0 + np.random.multivariate_normal(np.zeros(num_people), 0.5 * matrix) + \
+                np.random.normal(scale=np.sqrt(0.5), size=num_people)
+        pheno_file = str(tmp_path / "family.phen")
+        ids.assign(pheno=pheno).to_csv(pheno_file, sep=" ", header=False, index=False)
+        return grm_prefix, pheno_file, ids, matrix
+
+    #########
+    @staticmethod
+    def thresholded(matrix, cutoff):
+        return np.where((matrix > cutoff) | np.eye(matrix.shape[0], dtype=bool), matrix, 0.0)
+
+    #########
+    @staticmethod
+    def sparse_to_matrix(grm):
+        matrix = np.zeros((len(grm.ids), len(grm.ids)))
+        matrix[grm.rows, grm.cols] = grm.values
+        matrix[grm.cols, grm.rows] = grm.values
+        return matrix
+
+    #########
+    def test_read_write_round_trip(self, tmp_path):
+        grm = pgic.InternalNamespace()
+        grm.ids = pd.DataFrame({"FID": ["a", "b", "c"], "IID": ["1", "2", "3"]})
+        grm.rows = np.array([0, 1, 2, 2])
+        grm.cols = np.array([0, 1, 0, 2])
+        grm.values = np.array([1.0, 0.98, 0.25, 1.01])
+        pgic.write_sparse_grm(str(tmp_path / "sp"), grm)
+        read = pgic.read_sparse_grm(str(tmp_path / "sp"))
+
+        pd.testing.assert_frame_equal(read.ids, grm.ids)
+        for attr in ["rows", "cols", "values"]:
+            assert np.array_equal(getattr(read, attr), getattr(grm, attr))
+
+        # Upper triangle triplets are read as their lower triangle counterparts
+        with open(str(tmp_path / "sp") + pgic.GRM_SPARSE_SUFFIX, "a") as sp_file:
+            sp_file.write("1\t2\t0.1\n")
+        read = pgic.read_sparse_grm(str(tmp_path / "sp"))
+        assert (read.rows[-1], read.cols[-1], read.values[-1]) == (2, 1, 0.1)
+
+        with open(str(tmp_path / "sp") + pgic.GRM_SPARSE_SUFFIX, "a") as sp_file:
+            sp_file.write("3\t0\t0.1\n")
+        with pytest.raises(ValueError):
+            pgic.read_sparse_grm(str(tmp_path / "sp"))
+
+    #########
+    @pytest.mark.parametrize("chunk_elements", [5, pgic.DEFAULT_GRM_CHUNK_ELEMENTS])
+    def test_sparsify_and_restrict(self, family_grm, tmp_path, chunk_elements):
+        grm_prefix, _, ids, matrix = family_grm
+        sparse_prefix = pgic.sparsify_grm(pgic.open_grm(grm_prefix), 0.05,
+                                          str(tmp_path / "sparse"), chunk_elements)
+        grm = pgic.read_sparse_grm(sparse_prefix)
+        expected = self.thresholded(matrix, 0.05)
+        assert np.allclose(self.sparse_to_matrix(grm), expected)
+        assert grm.values.shape[0] == np.count_nonzero(np.tril(expected))
+
+        keep_idx = np.flatnonzero(np.arange(len(ids)) % 3 != 1)
+        restricted = pgic.restrict_sparse_grm(grm, keep_idx)
+        pd.testing.assert_frame_equal(restricted.ids, ids.iloc[keep_idx].reset_index(drop=True))
+        assert np.allclose(self.sparse_to_matrix(restricted),
+                           expected[np.ix_(keep_idx, keep_idx)])
+
+    #########
+    def test_eigen_rotation_by_family(self, family_grm, tmp_path):
+        grm_prefix, _, ids, matrix = family_grm
+        grm = pgic.read_sparse_grm(pgic.sparsify_grm(pgic.open_grm(grm_prefix), 0.05,
+                                                     str(tmp_path / "sparse")))
+        data = np.random.normal(size=(len(ids), 2))
+        eigenvalues, rotated = pgic.sparse_grm_eigen_rotation(grm, data)
+
+        dense = self.thresholded(matrix, 0.05)
+        assert np.allclose(np.sort(eigenvalues), np.linalg.eigvalsh(dense))
+        assert np.allclose(rotated.T @ rotated, data.T @ data)
+        assert np.allclose((rotated.T * eigenvalues) @ rotated, data.T @ dense @ data)
+
+    #########
+    def test_reml_matches_dense_thresholded_grm(self, family_grm, tmp_path):
+        grm_prefix, pheno_file, ids, matrix = family_grm
+        dense_prefix = str(tmp_path / "thresholded")
+        pgic.write_grm(dense_prefix, ids, self.thresholded(matrix, 0.05))
+        sparse_iargs = pgic.InternalNamespace()
+        sparse_iargs.grm = None
+        sparse_iargs.grm_sparse = pgic.sparsify_grm(pgic.open_grm(grm_prefix), 0.05,
+                                                    str(tmp_path / "sparse"))
+        sparse_iargs.pheno_file = pheno_file
+        dense_iargs = pgic.InternalNamespace()
+        dense_iargs.grm = dense_prefix
+        dense_iargs.pheno_file = pheno_file
+
+        removed_ids = [None, ids.iloc[::5], ids.iloc[:40]]
+        sparse_estimates = pgic.reml_eigen_h2_estimates(sparse_iargs, removed_ids)
+        dense_estimates = pgic.reml_eigen_h2_estimates(dense_iargs, removed_ids)
+        assert np.allclose(sparse_estimates, dense_estimates)
+        assert 0.0 < sparse_estimates[0][0] < 1.0
+
+
+class TestCalculateGrm:
+
+    #########
+    @staticmethod
+    def reference_grm(bfile_prefix):
+        """Decode the .bed file one genotype at a time and apply GCTA's GRM formula directly"""
+        num_people = sum(1 for line in open(bfile_prefix + ".fam") if line.strip())
+        num_snps = sum(1 for line in open(bfile_prefix + ".bim") if line.strip())
+        raw = open(bfile_prefix + ".bed", "rb").read()[3:]
+        bytes_per_snp = (num_people + 3) // 4
+        genotypes = np.empty((num_people, num_snps))
+        for snp in range(num_snps):
+            for person in range(num_people):
+                code = (raw[snp * bytes_per_snp + person // 4] >> (2 * (person % 4))) & 3
+                genotypes[person, snp] = {0: 2.0, 1: np.nan, 2: 1.0, 3: 0.0}[code]
+
+        grm = np.zeros((num_people, num_people))
+        n_matrix = np.zeros((num_people, num_people))
+        for snp in range(num_snps):
+            p = np.nanmean(genotypes[:, snp]) / 2.0
+            if p in (0.0, 1.0):
+                continue
+            z = (genotypes[:, snp] - 2.0 * p) / np.sqrt(2.0 * p * (1.0 - p))
+            present = ~np.isnan(z)
+            z[~present] = 0.0
+            grm += np.outer(z, z)
+            n_matrix += np.outer(present, present)
+        return grm / n_matrix, n_matrix
+
+    #########
+    @pytest.fixture
+    def missing_bfile_prefix(self, tmp_path):
+        np.random.seed(0)
+        num_people, num_snps = 10, 23
+        codes = np.random.choice([0, 1, 2, 3], p=[0.3, 0.1, 0.3, 0.3], size=(num_snps, num_people))
+        codes[5] = 3  # Monomorphic SNP
+        prefix = str(tmp_path / "missing")
+        padded = np.zeros((num_snps, 12), dtype=np.uint8)
+        padded[:, :num_people] = codes
+        packed = (padded.reshape(num_snps, 3, 4) << (2 * np.arange(4))).sum(axis=2)
+        with open(prefix + ".bed", "wb") as bed_file:
+            bed_file.write(pgic.BED_MAGIC + packed.astype(np.uint8).tobytes())
+        with open(prefix + ".fam", "w") as fam_file:
+            fam_file.writelines("F%s I%s 0 0 1 -9\n" % (i, i) for i in range(num_people))
+        with open(prefix + ".bim", "w") as bim_file:
+            bim_file.writelines("1 rs%s 0 %s A G\n" % (i, i) for i in range(num_snps))
+        return prefix
+
+    #########
+    @pytest.mark.parametrize("snp_block_size", [1, 7, None])
+    @pytest.mark.parametrize("use_fixture", [True, False])
+    def test_matches_reference(self, missing_bfile_prefix, snp_block_size, use_fixture):
+        bfile_prefix = os.path.join(data_directory, "fake_data") if use_fixture else \
+                       missing_bfile_prefix
+        ids, grm, n_matrix = pgic.calculate_grm(bfile_prefix, snp_block_size)
+        expected_grm, expected_n = self.reference_grm(bfile_prefix)
+
+        assert list(ids.columns) == ["FID", "IID"]
+        assert len(ids) == grm.shape[0]
+        assert grm.dtype == pgic.GENOTYPE_DTYPE
+        assert np.allclose(grm, expected_grm, atol=1e-6)  # Accumulated in float32, like GCTA
+        assert np.array_equal(np.broadcast_to(n_matrix, expected_n.shape), expected_n)
+
+    #########
+    @pytest.mark.parametrize("block_elements", [1, 37])
+    def test_row_blocks_match_reference(self, monkeypatch, missing_bfile_prefix, block_elements):
+        monkeypatch.setattr(pgic, "DEFAULT_GENOTYPE_BLOCK_ELEMENTS", block_elements)
+        assert pgic.genotype_block_size(10) == max(1, block_elements // 10)
+        _, grm, n_matrix = pgic.calculate_grm(missing_bfile_prefix)
+        expected_grm, expected_n = self.reference_grm(missing_bfile_prefix)
+
+        assert np.allclose(grm, expected_grm, atol=1e-6)
+        assert np.array_equal(n_matrix, expected_n)
+
+    #########
+    def test_build_grm_native_writes_gcta_format(self, tmp_path):
+        bfile_prefix = os.path.join(data_directory, "fake_data")
+        grm_prefix = pgic.build_grm_native(bfile_prefix, str(tmp_path))
+        grm = pgic.open_grm(grm_prefix)
+        ids, expected, n_matrix = pgic.calculate_grm(bfile_prefix)
+
+        pd.testing.assert_frame_equal(grm.ids, ids)
+        assert np.allclose(pgic.grm_to_matrix(grm), expected, atol=1e-6)
+        assert np.array_equal(grm.N_bin, np.broadcast_to(n_matrix, expected.shape)[
+            np.tril_indices(len(ids))])
+
+    #########
+    def test_not_snp_major_raises(self, missing_bfile_prefix):
+        with open(missing_bfile_prefix + ".bed", "r+b") as bed_file:
+            bed_file.seek(2)
+            bed_file.write(bytes([0]))
+        with pytest.raises(ValueError):
+            pgic.open_bed(missing_bfile_prefix)
+
+
+###########################################
+
+class TestRandomizedHasemanElston:
+
+    #########
+    @staticmethod
+    def dense_moments(bfile_prefix, pheno, idx, covariates):
+        """Form the GRM and the projection of one sample explicitly"""
+        bed = pgic.open_bed(bfile_prefix)
+        pgic.standardize_bed_snps(bed)
+        _, grm, n_matrix = pgic.calculate_grm(bfile_prefix)
+        grm = (grm * n_matrix)[np.ix_(idx, idx)] / bed.num_used_snps
+        basis = np.linalg.qr(covariates[idx])[0]
+        proj = np.eye(idx.shape[0]) - basis @ basis.T
+        proj_grm = proj @ grm @ proj
+        y = proj @ pheno[idx]
+        return np.trace(proj_grm), np.sum(proj_grm * proj_grm), y @ proj_grm @ y, y @ y
+
+    #########
+    @pytest.fixture
+    def fixture_data(self):
+        bfile_prefix = os.path.join(data_directory, "fake_data")
+        bed = pgic.open_bed(bfile_prefix)
+        pgic.standardize_bed_snps(bed, snp_block_size=64)
+        pheno = pgic.read_h2_pheno_file(os.path.join(data_directory, "fake_pheno.phen"))
+        assert (pheno[["FID", "IID"]].to_numpy() == bed.ids.to_numpy()).all()
+        return bfile_prefix, bed, pheno.pheno.to_numpy()
+
+    #########
+    @pytest.mark.parametrize("with_covariate", [False, True])
+    def test_matches_dense_moments(self, fixture_data, with_covariate):
+        bfile_prefix, bed, pheno = fixture_data
+        num_people = len(bed.ids)
+        covariates = np.ones((num_people, 1))
+        if with_covariate:
+            covariates = np.column_stack((covariates, np.linspace(-1.0, 1.0, num_people) ** 2))
+        samples = [np.arange(num_people), np.arange(0, num_people, 3), np.arange(10, 90)]
+
+        moments = pgic.rhe_moments(bed, pheno, samples, covariates, num_probes=2000)
+
+        assert moments.num_covariates == covariates.shape[1]
+        assert np.array_equal(moments.n, [idx.shape[0] for idx in samples])
+        for sample_num, idx in enumerate(samples):
+            tr_k, tr_k2, ypkpy, ypy = self.dense_moments(bfile_prefix, pheno, idx, covariates)
+            assert np.isclose(moments.tr_k[sample_num], tr_k)
+            assert np.isclose(moments.ypkpy[sample_num], ypkpy)
+            assert np.isclose(moments.ypy[sample_num], ypy)
+            assert np.isclose(moments.tr_k2[sample_num], tr_k2, rtol=0.1)
+
+    #########
+    def test_batches_match_single_pass(self, monkeypatch, fixture_data):
+        _, bed, pheno = fixture_data
+        samples = [np.arange(len(bed.ids)), np.arange(0, len(bed.ids), 3), np.arange(10, 90)]
+        moments = pgic.rhe_moments(bed, pheno, samples, num_probes=5)
+        monkeypatch.setattr(pgic, "DEFAULT_RHE_BATCH_ELEMENTS", 1)
+        batched = pgic.rhe_moments(bed, pheno, samples, num_probes=5)
+
+        for stat in ["n", "tr_k", "tr_k2", "ypkpy", "ypy"]:
+            assert np.allclose(getattr(batched, stat), getattr(moments, stat))
+
+    #########
+    def test_h2_solves_normal_equations(self):
+        moments = pgic.InternalNamespace()
+        moments.num_covariates = 1
+        moments.n = np.array([101, 51])
+        moments.tr_k = np.array([100.0, 50.0])
+        moments.tr_k2 = np.array([150.0, 80.0])
+        moments.ypkpy = np.array([120.0, 70.0])
+        moments.ypy = np.array([100.0, 50.0])
+        h2 = pgic.rhe_h2_from_moments(moments)
+        for sample_num in range(2):
+            lhs = [[moments.tr_k2[sample_num], moments.tr_k[sample_num]],
+                   [moments.tr_k[sample_num], moments.n[sample_num] - 1]]
+            sigma_g, sigma_e = np.linalg.solve(lhs, [moments.ypkpy[sample_num],
+                                                     moments.ypy[sample_num]])
+            assert np.isclose(h2[sample_num], sigma_g / (sigma_g + sigma_e))
+
+    #########
+    def test_estimates_removed_samples(self, fixture_data):
+        bfile_prefix, bed, pheno = fixture_data
+        iargs = pgic.InternalNamespace()
+        iargs.bfile = bfile_prefix
+        iargs.pheno_file = os.path.join(data_directory, "fake_pheno.phen")
+        iargs.rhe_probes = 5
+        removed = bed.ids.iloc[:20]
+        h2 = pgic.rhe_h2_estimates(iargs, [None, removed])
+        moments = pgic.rhe_moments(bed, pheno, [np.arange(len(bed.ids)),
+                                                np.arange(20, len(bed.ids))], num_probes=5)
+
+        assert np.allclose(h2, pgic.rhe_h2_from_moments(moments))
+
+
+class TestRemlEigen:
+
+    #########
+    @staticmethod
+    def dense_reml(grm, pheno):
+        """Maximize the REML likelihood over both variance components with explicit matrices"""
+        covariates = np.ones((pheno.shape[0], 1))
+
+        def proj(sigmas):
+            v_inv = np.linalg.inv(sigmas[0] * grm + sigmas[1] * np.eye(pheno.shape[0]))
+            vx = v_inv @ covariates
+            return v_inv - vx @ np.linalg.inv(covariates.T @ vx) @ vx.T, v_inv
+
+        def neg_loglik(log_sigmas):
+            p_matrix, v_inv = proj(np.exp(log_sigmas))
+            return 0.5 * (-np.linalg.slogdet(v_inv)[1] +
+                          np.linalg.slogdet(covariates.T @ v_inv @ covariates)[1] +
+                          pheno @ p_matrix @ pheno)
+
+        start = np.log([np.var(pheno) / 2.0] * 2)
+        sigmas = np.exp(scipy.optimize.minimize(neg_loglik, start, method="Nelder-Mead",
+                                                options={"xatol": 1e-10, "fatol": 1e-12,
+                                                         "maxiter": 10000}).x)
+        p_matrix, _ = proj(sigmas)
+        derivs = [grm, np.eye(pheno.shape[0])]
+        info = np.array([[0.5 * np.trace(p_matrix @ d_i @ p_matrix @ d_j) for d_j in derivs]
+                         for d_i in derivs])
+        h2 = sigmas[0] / sigmas.sum()
+        grad = np.array([sigmas[1], -sigmas[0]]) / sigmas.sum() ** 2
+        return h2, np.sqrt(grad @ np.linalg.solve(info, grad))
+
+    #########
+    @pytest.fixture
+    def simulated_grm(self, tmp_path):
+        np.random.seed(0)
+        num_people, num_snps = 150, 400
+        genotypes = np.random.binomial(2, np.random.uniform(0.1, 0.5, num_snps),
+                                       (num_people, num_snps)).astype(float)
+        genotypes[:50] = genotypes[50:100] + np.random.binomial(1, 0.3, (50, num_snps))  # Relatives
+        std_genotypes = (genotypes - genotypes.mean(axis=0)) / genotypes.std(axis=0)
+        grm = std_genotypes @ std_genotypes.T / num_snps
+        ids = pd.DataFrame({"FID": ["F%s" % i for i in range(num_people)],
+                            "IID": ["I%s" % i for i in range(num_people)]})
+        grm_prefix = str(tmp_path / "sim")
+        pgic.write_grm(grm_prefix, ids, grm)
+        grm = pgic.grm_to_matrix(pgic.open_grm(grm_prefix))  # As stored (float32)
+        pheno = 3.0 + np.random.multivariate_normal(np.zeros(num_people), 0.6 * grm) + \
+                np.random.normal(scale=np.sqrt(0.4), size=num_people)
+        pheno_file = str(tmp_path / "sim.phen")
+        ids.assign(pheno=pheno).to_csv(pheno_file, sep=" ", header=False, index=False)
+
+        iargs = pgic.InternalNamespace()
+        iargs.grm = grm_prefix
+        iargs.pheno_file = pheno_file
+        return iargs, ids, grm, pheno
+
+    #########
+    def test_matches_dense_reml(self, simulated_grm):
+        iargs, ids, grm, pheno = simulated_grm
+        removed = ids.iloc[::7]
+        keep = np.setdiff1d(np.arange(len(ids)), np.arange(0, len(ids), 7))
+
+        estimates = pgic.reml_eigen_h2_estimates(iargs, [None, removed])
+        for (h2, h2_se), idx in zip(estimates, [np.arange(len(ids)), keep]):
+            expected_h2, expected_se = self.dense_reml(grm[np.ix_(idx, idx)], pheno[idx])
+            assert 0.0 < h2 < 1.0
+            assert np.isclose(h2, expected_h2, atol=1e-5)
+            assert np.isclose(h2_se, expected_se, rtol=1e-3)
+
+    #########
+    def test_matches_dense_reml_on_fixture(self, tmp_path):
+        iargs = pgic.InternalNamespace()
+        iargs.grm = pgic.build_grm_native(os.path.join(data_directory, "fake_data"), str(tmp_path))
+        iargs.pheno_file = os.path.join(data_directory, "fake_pheno.phen")
+        h2, _ = pgic.reml_eigen_h2_estimates(iargs, [None])[0]
+        pheno = pgic.read_h2_pheno_file(iargs.pheno_file).pheno.to_numpy()
+        expected_h2, _ = self.dense_reml(pgic.grm_to_matrix(pgic.open_grm(iargs.grm)), pheno)
+
+        assert np.isclose(h2, expected_h2, atol=1e-3)
+
+    #########
+    def test_spectrum_cached_next_to_grm(self, simulated_grm):
+        iargs, _, grm, _ = simulated_grm
+        eigenvalues, eigenvectors = pgic.grm_spectrum(iargs.grm)
+        assert np.allclose((eigenvectors * eigenvalues) @ eigenvectors.T, grm)
+        for suffix in [pgic.GRM_EIGENVALUES_SUFFIX, pgic.GRM_EIGENVECTORS_SUFFIX]:
+            assert os.path.exists(iargs.grm + suffix)
+
+        # Later calls memory-map the cache, until the GRM changes
+        cached_values, cached_vectors = pgic.grm_spectrum(iargs.grm)
+        assert isinstance(cached_vectors, np.memmap)
+        assert np.array_equal(cached_values, eigenvalues)
+        assert np.array_equal(cached_vectors, eigenvectors)
+        mtime = os.path.getmtime(iargs.grm + pgic.GRM_EIGENVECTORS_SUFFIX)
+        os.utime(iargs.grm + pgic.GRM_BIN_SUFFIX, (mtime + 10, mtime + 10))
+        assert not isinstance(pgic.grm_spectrum(iargs.grm)[1], np.memmap)
+
+    #########
+    def test_phenotyped_subset_spectrum_cached(self, simulated_grm):
+        iargs, ids, grm, pheno = simulated_grm
+        phenotyped = np.arange(5, len(ids))
+        ids.iloc[phenotyped].assign(pheno=pheno[phenotyped]).to_csv(
+            iargs.pheno_file, sep=" ", header=False, index=False)
+        removed = ids.iloc[::7]
+        keep = np.setdiff1d(phenotyped, np.arange(0, len(ids), 7))
+        estimates = pgic.reml_eigen_h2_estimates(iargs, [None, removed])
+
+        # The spectrum of the phenotyped individuals is cached under the key of their IDs
+        cache_prefix = iargs.grm + "." + pgic.grm_subset_key(ids.iloc[phenotyped])
+        for suffix in [pgic.GRM_EIGENVALUES_SUFFIX, pgic.GRM_EIGENVECTORS_SUFFIX]:
+            assert os.path.exists(cache_prefix + suffix)
+        assert not os.path.exists(iargs.grm + pgic.GRM_EIGENVALUES_SUFFIX)
+        eigenvalues, eigenvectors = pgic.grm_spectrum(iargs.grm, keep_idx=phenotyped)
+        assert isinstance(eigenvectors, np.memmap)
+        assert np.allclose((eigenvectors * eigenvalues) @ eigenvectors.T,
+                           grm[np.ix_(phenotyped, phenotyped)])
+
+        # Later runs give the same estimates from the cache
+        assert pgic.reml_eigen_h2_estimates(iargs, [None, removed]) == estimates
+        for (h2, _), idx in zip(estimates, [phenotyped, keep]):
+            expected_h2, _ = self.dense_reml(grm[np.ix_(idx, idx)], pheno[idx])
+            assert np.isclose(h2, expected_h2, atol=1e-5)
+
+    #########
+    def test_pruned_spectrum_cached_next_to_source(self, simulated_grm, tmp_path):
+        iargs, ids, _, _ = simulated_grm
+        source_prefix = iargs.grm
+        iargs.grm_cutoff = 0.3
+        os.mkdir(tmp_path / "temp")
+        pgic.apply_grm_cutoff(iargs, str(tmp_path / "temp" / "pruned"))
+        assert iargs.grm_source == source_prefix and iargs.grm != source_prefix
+        num_kept = len(iargs.grm_kept_ids)
+        assert num_kept < len(ids)
+
+        estimates = pgic.reml_eigen_h2_estimates(iargs, [None, ids.iloc[::7]])
+        cache_prefix = source_prefix + "." + pgic.grm_subset_key(iargs.grm_kept_ids)
+        for suffix in [pgic.GRM_EIGENVALUES_SUFFIX, pgic.GRM_EIGENVECTORS_SUFFIX]:
+            assert os.path.exists(cache_prefix + suffix)
+        assert os.listdir(tmp_path / "temp") and not any(
+            f.endswith(pgic.GRM_EIGENVALUES_SUFFIX) for f in os.listdir(tmp_path / "temp"))
+
+        # Same estimates as from the pruned GRM itself
+        iargs.grm_source = None
+        pruned_estimates = pgic.reml_eigen_h2_estimates(iargs, [None, ids.iloc[::7]])
+        assert np.allclose(estimates, pruned_estimates)
+
+
+class TestEvictH2CacheEntries:
+
+    #########
+    @pytest.mark.parametrize("max_bytes, expected_kept",
+        [
+        (1000, ["a", "b", "c"]),
+        (250, ["a", "b"]),
+        (100, ["b"]),
+        (0, [])
+        ]
+    )
+    def test_evicts_least_recently_used(self, tmp_path, max_bytes, expected_kept):
+        # Entries of 100 bytes each, "c" is the least recently used, and "b" the most
+        for name, mtime in [("a", 200), ("b", 300), ("c", 100)]:
+            entry = tmp_path / (name + pgic.H2_CACHE_ENTRY_SUFFIX)
+            entry.write_text("x" * 100)
+            os.utime(entry, (mtime, mtime))
+        (tmp_path / "other.txt").write_text("x" * 1000)
+
+        pgic.evict_h2_cache_entries(str(tmp_path), max_bytes)
+
+        remaining = sorted(f[:-len(pgic.H2_CACHE_ENTRY_SUFFIX)] for f in os.listdir(tmp_path)
+                           if f.endswith(pgic.H2_CACHE_ENTRY_SUFFIX))
+        assert remaining == sorted(expected_kept)
+
+
+###########################################
+
+class TestParseGrid:
+
+    #########
+    @pytest.mark.parametrize("values, expected",
+        [
+        (["0.5"], [0.5]),
+        (["0.2", "0.4", "0.3"], [0.2, 0.4, 0.3]),
+        (["0.2:0.4:3"], [0.2, 0.3, 0.4]),
+        (["1:1:1"], [1.0])
+        ]
+    )
+    def test_happypath_noerrors(self, values, expected):
+        assert np.allclose(pgic.parse_grid(values, "h2-grid"), expected)
+
+    #########
+    @pytest.mark.parametrize("values",
+        [
+        ["0.2:0.4"],
+        ["0.2:0.4:3", "0.5"],
+        ["abc"],
+        ["0.2:0.4:0"]
+        ]
+    )
+    def test_bad_values_raises(self, values):
+        with pytest.raises(ValueError):
+            pgic.parse_grid(values, "h2-grid")
+
+
+###########################################
+
+class TestAbsorbFixedEffects:
+
+    #########
+    @pytest.mark.parametrize("num_levels, weighted",
+        [
+        ([4], False),
+        ([4], True),
+        ([4, 3], False),
+        ([5, 3, 2], True)
+        ]
+    )
+    def test_matches_dummy_residuals(self, num_levels, weighted):
+        np.random.seed(7)
+        num_rows = 300
+        codes = [np.random.randint(0, levels, size=num_rows) for levels in num_levels]
+        values = np.random.normal(size=(num_rows, 2))
+        weights = np.random.uniform(0.5, 2.0, size=num_rows) if weighted else None
+
+        dummies = np.column_stack([np.ones(num_rows)] + [np.equal.outer(factor, np.arange(1, lvls))
+                                   for factor, lvls in zip(codes, num_levels)]).astype(float)
+        fit = sm.WLS(values, dummies, weights=weights if weighted else 1.0).fit()
+        assert np.allclose(pgic.absorb_fixed_effects(values, codes, weights), fit.resid,
+                           atol=1e-8)
+
+
+###########################################
+
+class TestExpandCategoricalColumns:
+
+    #########
+    @pytest.mark.parametrize("values, expected_cols",
+        [
+        (["10", "2", "1", "2"], ["c_2", "c_10"]),
+        (["b", "a", "c", "a"], ["c_b", "c_c"]),
+        (["x", "x", "x", "x"], [])
+        ]
+    )
+    def test_happypath_noerrors(self, values, expected_cols):
+        data = pd.DataFrame({"c": values}, index=[3, 5, 7, 9])
+        dummies = pgic.expand_categorical_columns(data, ["c"])
+        assert list(dummies.columns) == expected_cols
+        assert list(dummies.index) == list(data.index)
+        for col in expected_cols:
+            assert np.array_equal(dummies[col], (data["c"] == col[2:]).astype(float))
+
+    #########
+    @pytest.mark.parametrize("categorical, reserved",
+        [
+        (["grp"], ["pgi", "grp_1"]),
+        (["grp", "grp_1"], []),
+        ]
+    )
+    def test_clash_raises(self, categorical, reserved):
+        data = pd.DataFrame({"grp": ["0", "1", "2", "1"], "grp_1": ["0", "1", "1", "0"]})
+        with pytest.raises(ValueError, match="clash"):
+            pgic.expand_categorical_columns(data, categorical, reserved)
+
+    #########
+    def test_clash_with_covariate_raises(self):
+        orig_reg_data = pd.DataFrame({"IID": ["a", "b", "c", "d", "e"],
+                                      "pgi": [1.0, 2.0, 0.5, 4.0, 3.0],
+                                      "PHENO": [0.5, 1.5, 2.5, 0.0, 1.0],
+                                      "grp_1": [2.0, 1.0, 3.0, 4.0, 6.0],
+                                      "grp": ["0", "1", "2", "1", "0"]})
+        iargs = pgic.InternalNamespace()
+        iargs.outcome = ["PHENO"]
+        iargs.pgi_var = ["pgi"]
+        iargs.pgi_pheno_var = ["PHENO"]
+        iargs.covariates = ["grp_1"]
+        iargs.categorical = ["grp"]
+        iargs.pgi_interact_vars = []
+        iargs.weights = []
+        iargs.id_col = ["IID"]
+        iargs.R2 = None
+        with pytest.raises(ValueError, match="grp_1"):
+            pgic.adjust_regression_data(orig_reg_data, iargs)
+
+
+###########################################
+
+class TestAdjustRegressionData:
+
+    #########
+    def test_block_views_noerrors(self):
+        orig_reg_data = pd.DataFrame({"IID": ["a", "b", "c", "d", "e"],
+                                      "PGI": [1.0, 2.0, np.nan, 4.0, 3.0],
+                                      "PHENO": [0.5, 1.5, 2.5, np.nan, 1.0],
+                                      "PC1": [2.0, 1.0, 3.0, 4.0, 6.0]})
+        iargs = pgic.InternalNamespace()
+        iargs.outcome = ["PHENO"]
+        iargs.pgi_var = ["PGI"]
+        iargs.pgi_pheno_var = ["PHENO"]
+        iargs.covariates = ["PC1"]
+        iargs.pgi_interact_vars = ["PC1"]
+        iargs.weights = []
+        iargs.id_col = ["IID"]
+        iargs.R2 = None
+
+        reg_data = pgic.adjust_regression_data(orig_reg_data, iargs)
+        pgi = orig_reg_data["PGI"]
+        stdized_pgi = ((pgi - pgi.mean()) / pgi.std(ddof=0))[[0, 1, 4]].to_numpy()
+
+        assert list(reg_data.index) == [0, 1, 4]
+        assert list(reg_data["IID"]) == ["a", "b", "e"]
+        assert np.allclose(reg_data["PGI"], stdized_pgi)
+        assert np.allclose(reg_data["PC1_int"], stdized_pgi * np.array([2.0, 1.0, 6.0]))
+        values = pgic.design_matrix(reg_data, iargs.alpha_cols + iargs.y_cols)
+        assert not values.flags.writeable
+        assert np.shares_memory(values, pgic.design_matrix(reg_data, iargs.G_cols))
+        assert np.array_equal(values, reg_data[iargs.alpha_cols + iargs.y_cols].to_numpy())
+        assert pgic.design_matrix(reg_data, ["PC1", "PGI"]).flags.c_contiguous
+
+
+###########################################
+
 class TestToArgAndToFlag:
 
     #########
@@ -4,10 +4,13 @@ End-to-end tests of the error correction software.  This should be run via pytes
 
 import numpy as np
 import pandas as pd
+import copy
+import json
 import logging
 import os
 
 import pytest
+import statsmodels.api as sm
 import tempfile
 
 import pgs_correct.pgic as pgic
@@ -223,7 +226,8 @@ def test_error_correction_expected_corrected_all_ones(caplog):
     assert np.isclose(res.corrected_alphas[4], 1.0, rtol=0.01, atol=0.01) # z2
 
 
-def test_error_correction_mean0z_unncorrzg_gw_jackknife_expected_results(temp_test_dir):
+@pytest.mark.parametrize("jk_method", [pgic.JK_METHOD_DOWNDATE, pgic.JK_METHOD_REFIT])
+def test_error_correction_mean0z_unncorrzg_gw_jackknife_expected_results(temp_test_dir, jk_method):
 
     # Test parameters
     g = np.array([-1, -1, 0, 1, 1])  # Already standardized (unbiased)
@@ -257,6 +261,7 @@ def test_error_correction_mean0z_unncorrzg_gw_jackknife_expected_results(temp_te
     iargs.R2 = pgic.estimate_R2(df, iargs.pgi_pheno_var, iargs.pgi_var)
     iargs.h2 = h2
     iargs.jk_se = True
+    iargs.jk_method = jk_method
     iargs.num_blocks = 5
     iargs.grm = None
     iargs.temp_dir = temp_test_dir
@@ -304,3 +309,862 @@ def test_jk(temp_test_dir, request):  # TODO(jonbjala) Needs renaming / better d
                          "--logging-level debug" %
                          (full_path_to_pgic_exec, data_filename, bfile_full_prefix, phen_filename,
                          out_prefix))
+
+
+def _generate_reg_data_file(datfile_name: str, num_people: int = 5000, missing_frac: float = 0.02):
+    """
+    Simulate regression data (PGI, phenotypes, covariates, weights, and IDs) with some missing
+    values and write it to a whitespace-delimited file.
+
+    :param datfile_name: Path of the file to write
+    :param num_people: Number of rows to simulate
+    :param missing_frac: Fraction of values to set to missing in each non-ID column
+    """
+    g = np.random.normal(size=num_people)
+    z1 = 1.0 + 0.5 * g + np.random.normal(size=num_people)
+    z2 = np.random.binomial(1, 0.4, size=num_people).astype(float)
+    df = pd.DataFrame({"IID": ["id%s" % i for i in range(num_people)],
+                       "pgi": 2.0 + 3.0 * (g + np.random.normal(size=num_people)),
+                       "pheno": 1.0 + g + g * z1 + z1 + z2 + np.random.normal(size=num_people),
+                       "pgi_pheno": g + np.random.normal(size=num_people),
+                       "z1": z1, "z2": z2,
+                       "wt": np.random.uniform(0.5, 2.0, size=num_people)})
+    for col in ["pgi", "pheno", "pgi_pheno", "z1", "z2", "wt"]:
+        df.loc[np.random.uniform(size=num_people) < missing_frac, col] = np.nan
+    df.to_csv(datfile_name, sep=" ", index=None, na_rep="NA")
+
+
+def _validated_iargs(argv):
+    """
+    Parse and validate a list of flags the same way main_func() does.
+
+    :param argv: List of flags (not including the program name)
+    :return: Internal namespace returned by validate_inputs()
+    """
+    parsed_args = pgic._get_parser("pgic.py").parse_args(argv)
+    return pgic.validate_inputs(parsed_args, pgic.get_user_inputs(argv, parsed_args))
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    [],
+    ["--weights", "wt"],
+    ["--weights", "wt", "--pgi-pheno-var", "pgi_pheno"]
+    ]
+)
+def test_streaming_matches_in_memory(temp_test_dir, request, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name)
+
+    argv = ["--reg-data-file", datfile_name, "--outcome", "pheno", "--pgi-var", "pgi",
+            "--pgi-interact-vars", "z1", "--covariates", "z1", "z2", "--h2", "0.5",
+            "--out", out_prefix, "--streaming", "--chunk-rows", "777"] + extra_flags
+
+    iargs = _validated_iargs(argv)
+    in_memory = pgic.error_correction_procedure(
+        iargs, pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs))
+    streamed = pgic.streaming_error_correction(_validated_iargs(argv))
+
+    assert streamed.n == in_memory.n
+    assert np.isclose(streamed.R2, in_memory.R2)
+    assert np.isclose(streamed.rho, in_memory.rho)
+    assert list(streamed.uncorrected_alphas.index) == list(in_memory.uncorrected_alphas.index)
+    assert np.allclose(streamed.uncorrected_alphas, in_memory.uncorrected_alphas)
+    assert np.allclose(streamed.uncorrected_alphas_se, in_memory.uncorrected_alphas_se)
+    assert np.allclose(streamed.corrected_alphas, in_memory.corrected_alphas)
+    assert np.allclose(streamed.corrected_alphas_se, in_memory.corrected_alphas_se)
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    [],
+    ["--weights", "wt", "--pgi-pheno-var", "pgi_pheno"]
+    ]
+)
+def test_downdated_jackknife_matches_refit(temp_test_dir, request, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+
+    argv = ["--reg-data-file", datfile_name, "--outcome", "pheno", "--pgi-var", "pgi",
+            "--pgi-interact-vars", "z1", "--covariates", "z1", "z2", "--h2", "0.5",
+            "--out", out_prefix, "--jk-se", "--num-blocks", "25", "--id-col", "IID"] + extra_flags
+    iargs = _validated_iargs(argv)
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+
+    results = []
+    for jk_method in pgic.JK_METHODS:
+        iargs.jk_method = jk_method
+        np.random.seed(0)  # Same shuffle / blocks for both methods
+        res = pgic.error_correction_procedure(iargs, reg_data)
+        pgic.jack_knife_se(iargs, reg_data, res)
+        results.append(res)
+
+    downdated, refit = results
+    assert np.isclose(downdated.R2_se, refit.R2_se)
+    assert np.isclose(downdated.rho_se, refit.rho_se)
+    assert np.allclose(downdated.uncorrected_alphas_se, refit.uncorrected_alphas_se)
+    assert np.allclose(downdated.corrected_alphas_se, refit.corrected_alphas_se)
+
+
+def test_parallel_jackknife_matches_serial(temp_test_dir, request):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=1000)
+
+    argv = ["--reg-data-file", datfile_name, "--outcome", "pheno", "--pgi-var", "pgi",
+            "--pgi-interact-vars", "z1", "--covariates", "z1", "z2", "--h2", "0.5",
+            "--weights", "wt", "--pgi-pheno-var", "pgi_pheno", "--out", out_prefix, "--jk-se",
+            "--num-blocks", "20", "--id-col", "IID", "--jk-method", pgic.JK_METHOD_REFIT]
+    iargs = _validated_iargs(argv)
+    iargs.temp_dir = temp_test_dir
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+
+    results = []
+    for jk_workers in [1, 3]:
+        iargs.jk_workers = jk_workers
+        np.random.seed(0)  # Same shuffle / blocks for both runs
+        res = pgic.error_correction_procedure(iargs, reg_data)
+        pgic.jack_knife_se(iargs, reg_data, res)
+        results.append(res)
+
+    serial, parallel = results
+    assert serial.R2_se == parallel.R2_se
+    assert serial.rho_se == parallel.rho_se
+    assert np.array_equal(serial.uncorrected_alphas_se, parallel.uncorrected_alphas_se)
+    assert np.array_equal(serial.corrected_alphas_se, parallel.corrected_alphas_se)
+
+
+@pytest.mark.parametrize("precision", [pgic.PRECISION_FLOAT64, pgic.PRECISION_FLOAT32])
+def test_jk_worker_shares_memory_mapped_data(temp_test_dir, precision):
+    iargs = pgic.InternalNamespace()
+    iargs.temp_dir = temp_test_dir
+    iargs.precision = precision
+    float_dtype = pgic.reg_data_float_dtype(iargs)
+    reg_data = pd.DataFrame({"IID": ["id%s" % i for i in range(10)],
+                             "x": np.arange(10.0, dtype=float_dtype),
+                             "y": np.arange(10.0, dtype=float_dtype) ** 2,
+                             "iteration": np.arange(10) % 2})
+    float_file, float_cols, other_file = pgic._publish_jk_reg_data(iargs, reg_data)
+    assert float_cols == ["x", "y"]
+    assert list(pd.read_pickle(other_file).columns) == ["IID", "iteration"]
+
+    pgic._init_jk_worker(iargs, float_file, float_cols, other_file, [None] * 2)
+    worker_data = pgic._jk_worker_state.reg_data
+    pd.testing.assert_frame_equal(worker_data[reg_data.columns], reg_data)
+
+    # The float columns are views of the memory-mapped file (so the workers share its pages)
+    for col in ["x", "y"]:
+        values = base = worker_data[col].to_numpy()
+        while base is not None and not isinstance(base, np.memmap):
+            base = base.base
+        assert base is not None and os.path.samefile(base.filename, float_file)
+        assert np.shares_memory(values, base)
+    pgic._jk_worker_state = None
+
+
+FAKE_GCTA_SCRIPT = """#!/bin/sh
+# Stand-in for GCTA --reml: fails for the block named in FAIL_BLOCK (or if a file named like the
+# executable plus ".disabled" exists) and otherwise reports h^2 = 0.1 * (number of threads it was
+# given) if the GRM it was given has 16 individuals
+[ -e "$0.disabled" ] && exit 5
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --grm) grm="$2"; shift ;;
+        --out) out="$2"; shift ;;
+        --threads) threads="$2"; shift ;;
+    esac
+    shift
+done
+case "$out" in *h2est_FAIL_BLOCK) exit 3 ;; esac
+[ "$(wc -l < "$grm.grm.id")" -eq 16 ] || exit 4
+printf "V(G)/Vp\\t0.$threads\\t0.01\\n" > "$out.log"
+"""
+
+
+def _fake_gcta_jk_inputs(job_dir: str, fail_block: str = None, num_blocks: int = 5):
+    """
+    Set up the inputs of leave_out_h2_estimates() using a fake GCTA executable
+
+    :param job_dir: Directory to use for the GRM, executable, and temporary files
+    :param fail_block: Jack knife block for which the fake GCTA fails
+    :param num_blocks: Number of jack knife blocks
+    :return: Internal namespace and regression data
+    """
+    gcta_exec = os.path.join(job_dir, "fake_gcta")
+    with open(gcta_exec, "w") as script:
+        script.write(FAKE_GCTA_SCRIPT.replace("FAIL_BLOCK", str(fail_block)))
+    os.chmod(gcta_exec, 0o755)
+    pheno_file = os.path.join(job_dir, "pheno.txt")
+    with open(pheno_file, "w") as pheno:
+        pheno.write("id0 id0 1.0\n")
+
+    reg_data = pd.DataFrame({"FID": ["id%s" % i for i in range(20)]})
+    reg_data["IID"] = reg_data.FID
+    reg_data["iteration"] = np.arange(20) % num_blocks
+    grm_prefix = os.path.join(job_dir, "grm")
+    pgic.write_grm(grm_prefix, reg_data, np.identity(20), np.full((20, 20), 100.0))
+
+    iargs = pgic.InternalNamespace()
+    iargs.gcta_exec = gcta_exec
+    iargs.use_gcta = True
+    iargs.software = "GCTA"
+    iargs.pheno_file = pheno_file
+    iargs.grm = grm_prefix
+    iargs.grm_cutoff = 0.025
+    iargs.quiet_h2 = True
+    iargs.temp_dir = job_dir
+    iargs.num_blocks = num_blocks
+    iargs.num_threads = 5
+    iargs.h2_jobs = 2
+    iargs.h2_cache = None
+    iargs.h2_cache_max_mb = pgic.DEFAULT_H2_CACHE_MAX_MB
+
+    return iargs, reg_data
+
+
+@pytest.mark.parametrize("fail_block", [None, 1])
+def test_leave_out_h2_estimates_concurrent_jobs(temp_test_dir, request, fail_block):
+    job_dir = os.path.join(temp_test_dir, request.node.name)
+    os.mkdir(job_dir)
+    iargs, reg_data = _fake_gcta_jk_inputs(job_dir, fail_block)
+    num_blocks = iargs.num_blocks
+
+    if fail_block is None:
+        h2 = pgic.leave_out_h2_estimates(iargs, reg_data)
+        assert np.allclose(h2, 0.2)  # Thread budget of 5 split across 2 jobs
+        for iter_num in range(num_blocks):
+            assert os.path.exists(os.path.join(job_dir, "h2est_%s.log" % iter_num))
+            assert not os.path.exists(os.path.join(job_dir, "removed_grm_%s.grm.bin" % iter_num))
+    else:
+        with pytest.raises(RuntimeError, match="failed for 1 of 5") as err:
+            pgic.leave_out_h2_estimates(iargs, reg_data)
+        assert "iteration %s" % fail_block in str(err.value)
+
+
+def test_leave_out_h2_estimates_cached(temp_test_dir, request):
+    job_dir = os.path.join(temp_test_dir, request.node.name)
+    os.mkdir(job_dir)
+    iargs, reg_data = _fake_gcta_jk_inputs(job_dir)
+    iargs.h2_cache = os.path.join(job_dir, "h2_cache")
+    h2 = pgic.leave_out_h2_estimates(iargs, reg_data)
+    assert len(os.listdir(iargs.h2_cache)) == iargs.num_blocks
+
+    # Every estimate is now served from the cache, even though GCTA would fail
+    open(iargs.gcta_exec + ".disabled", "w").close()
+    assert np.array_equal(pgic.leave_out_h2_estimates(iargs, reg_data), h2)
+
+    # A different set of blocks misses the cache (and fails)
+    reg_data["iteration"] = np.arange(20) // 4
+    with pytest.raises(RuntimeError, match="failed for 5 of 5"):
+        pgic.leave_out_h2_estimates(iargs, reg_data)
+
+
+def _read_res_file(res_file: str) -> pd.DataFrame:
+    """
+    Read the coefficient table of a .res file
+
+    :param res_file: Path to the .res file
+    :return: DataFrame holding the coefficient table
+    """
+    with open(res_file, "r") as f:
+        lines = f.read().split("=" * 20)[1].strip().splitlines()
+    return pd.DataFrame([line.split("\t") for line in lines[1:]],
+                        columns=lines[0].split("\t")).set_index("variable_name").astype(float)
+
+
+@pytest.mark.parametrize("spec_format, spec_workers", [("json", 1), ("tsv", 2)])
+def test_spec_file_matches_individual_runs(temp_test_dir, request, spec_format, spec_workers):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=1000)
+
+    common_flags = ["--reg-data-file", datfile_name, "--pgi-var", "pgi", "--h2", "0.5"]
+    specs = [
+        {"outcome" : "pheno", "covariates" : ["z1", "z2"], "output-vars" : ["pgi", "z1", "z2"]},
+        {"outcome" : "pheno", "covariates" : ["z1", "z2"], "pgi-interact-vars" : ["z1"],
+         "weights" : "wt", "output-vars" : ["pgi", "z1_int", "z1", "z2"]},
+        {"outcome" : "pgi_pheno", "covariates" : ["z2"], "output-vars" : ["pgi", "z2"],
+         "R2" : "0.2"}]
+    for spec_num, spec in enumerate(specs):
+        spec["out"] = "%s_%s" % (out_prefix, spec_num)
+
+    # Run each specification on its own
+    for spec in specs:
+        os.system("python3 %s %s --out %s_single" % (full_path_to_pgic_exec, " ".join(
+            common_flags + pgic.spec_to_argv({k : v for k, v in spec.items() if k != "out"})),
+            spec["out"]))
+
+    # Run them all through a specification file
+    spec_file = "%s_specs.%s" % (out_prefix, spec_format)
+    if spec_format == "json":
+        with open(spec_file, "w") as f:
+            json.dump(specs, f)
+    else:
+        pd.DataFrame([{k : " ".join(v) if isinstance(v, list) else v for k, v in spec.items()}
+                      for spec in specs]).to_csv(spec_file, sep="\t", index=False)
+    exit_status = os.system("python3 %s %s --spec-file %s --spec-workers %s --out %s" % (
+        full_path_to_pgic_exec, " ".join(common_flags), spec_file, spec_workers, out_prefix))
+    assert exit_status == 0
+
+    for spec in specs:
+        single = _read_res_file(spec["out"] + "_single.res")
+        batch = _read_res_file(spec["out"] + ".res")
+        assert list(batch.index) == spec["output-vars"]
+        assert np.allclose(batch.to_numpy(), single.to_numpy())
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    ["--pgi-pheno-var", "pgi_pheno"],
+    ["--R2", "0.3", "--weights", "wt", "--pgi-interact-vars", "z1"]
+    ]
+)
+def test_multi_outcome_matches_single_outcome_runs(temp_test_dir, request, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+
+    # Add outcomes with two distinct missingness patterns (y1 and y3 share one)
+    reg_data = pd.read_csv(datfile_name, sep=" ")
+    missing = np.random.uniform(size=(2, reg_data.shape[0])) < 0.1
+    for num, pattern in [(1, 0), (2, 1), (3, 0)]:
+        reg_data["y%s" % num] = reg_data.pheno + num * reg_data.z2 + np.random.normal(
+            size=reg_data.shape[0])
+        reg_data.loc[missing[pattern], "y%s" % num] = np.nan
+    reg_data.to_csv(datfile_name, sep=" ", index=None, na_rep="NA")
+
+    argv = ["--reg-data-file", datfile_name, "--pgi-var", "pgi", "--covariates", "z1", "z2",
+            "--h2", "0.5", "--out", out_prefix] + extra_flags
+    iargs = _validated_iargs(argv + ["--outcome", "y*"])
+    assert iargs.outcome == ["y1", "y2", "y3"]
+    multi = pgic.multi_outcome_error_correction(
+        iargs, pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs))
+    assert list(multi) == iargs.outcome
+
+    for outcome, result in multi.items():
+        single_iargs = _validated_iargs(argv + ["--outcome", outcome])
+        single = pgic.error_correction_procedure(single_iargs, pgic.adjust_regression_data(
+            pgic.load_regression_data(single_iargs), single_iargs))
+
+        assert result.n == single.n
+        assert np.isclose(result.R2, single.R2)
+        assert np.isclose(result.rho, single.rho)
+        pd.testing.assert_series_equal(result.uncorrected_alphas,
+                                       single.uncorrected_alphas[result.uncorrected_alphas.index])
+        pd.testing.assert_series_equal(
+            result.uncorrected_alphas_se,
+            single.uncorrected_alphas_se[result.uncorrected_alphas_se.index])
+        assert np.allclose(result.corrected_alphas, single.corrected_alphas)
+        assert np.allclose(result.corrected_alphas_se, single.corrected_alphas_se)
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    ["--pgi-pheno-var", "pgi_pheno"],
+    ["--pgi-pheno-var", "pgi_pheno", "--weights", "wt", "--scan-batch-size", "2"]
+    ]
+)
+def test_pgi_scan_matches_single_pgi_runs(temp_test_dir, request, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+
+    # Add PGIs with two distinct missingness patterns (pgi1 and pgi3 share one)
+    reg_data = pd.read_csv(datfile_name, sep=" ")
+    missing = np.random.uniform(size=(2, reg_data.shape[0])) < 0.1
+    for num, pattern in [(1, 0), (2, 1), (3, 0), (4, 1), (5, 0)]:
+        reg_data["pgi%s" % num] = reg_data.pgi + num * np.random.normal(size=reg_data.shape[0])
+        reg_data.loc[missing[pattern], "pgi%s" % num] = np.nan
+    reg_data.to_csv(datfile_name, sep=" ", index=None, na_rep="NA")
+
+    # Take h^2 of one PGI from a PGI table, and R^2 of another one too
+    pgi_table = out_prefix + "_pgis.txt"
+    pd.DataFrame({"pgi" : ["pgi2", "pgi4"], "h2" : [0.6, 0.4], "R2" : [np.nan, 0.05]}).to_csv(
+        pgi_table, sep=" ", index=None, na_rep="NA")
+    exit_status = os.system("python3 %s --reg-data-file %s --outcome pheno --pgi-var pgi? "
+                            "--covariates z1 z2 --h2 0.5 --pgi-table %s --out %s %s" % (
+        full_path_to_pgic_exec, datfile_name, pgi_table, out_prefix, " ".join(extra_flags)))
+    assert exit_status == 0
+    scan = pd.read_parquet(out_prefix + ".scan.parquet").set_index("variable_name")
+    assert list(scan.index) == ["pgi%s" % num for num in range(1, 6)]  # In the specified order
+
+    for pgi, row in scan.iterrows():
+        argv = ["--reg-data-file", datfile_name, "--outcome", "pheno", "--pgi-var", pgi,
+                "--covariates", "z1", "z2", "--h2", str(row.h2), "--out", out_prefix] + \
+               extra_flags[:4] + (["--R2", "0.05"] if pgi == "pgi4" else [])
+        iargs = _validated_iargs(argv)
+        single = pgic.error_correction_procedure(iargs, pgic.adjust_regression_data(
+            pgic.load_regression_data(iargs), iargs))
+
+        assert row.n == single.n
+        assert np.isclose(row.h2, {"pgi2" : 0.6, "pgi4" : 0.4}.get(pgi, 0.5))
+        assert np.isclose(row.R2, single.R2)
+        assert np.isclose(row.rho, single.rho)
+        assert np.isclose(row.uncorrected_coef, single.uncorrected_alphas[pgi])
+        assert np.isclose(row.uncorrected_se, single.uncorrected_alphas_se[pgi])
+        assert np.isclose(row.corrected_coef, single.corrected_alphas[0])
+        assert np.isclose(row.corrected_se, single.corrected_alphas_se[0])
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    ["--pgi-pheno-var", "pgi_pheno", "--h2-grid", "0.3:0.7:5"],
+    ["--R2", "0.2", "--weights", "wt", "--pgi-interact-vars", "z1", "--streaming",
+     "--rho-grid", "1.5", "2"]
+    ]
+)
+def test_grid_matches_individual_runs(temp_test_dir, request, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+
+    exit_status = os.system("python3 %s --reg-data-file %s --outcome pheno --pgi-var pgi "
+                            "--covariates z1 z2 --h2 0.5 --out %s %s" % (
+        full_path_to_pgic_exec, datfile_name, out_prefix, " ".join(extra_flags)))
+    assert exit_status == 0
+    grid = pd.read_csv(out_prefix + ".grid.tsv", sep="\t")
+    grid_flag = "--h2-grid" if "--h2-grid" in extra_flags else "--rho-grid"
+    assert len(grid.h2.unique()) == (5 if grid_flag == "--h2-grid" else 2)
+
+    # Each grid value gives the same results as a run with the corresponding h^2
+    base_flags = extra_flags[:extra_flags.index(grid_flag)]
+    for h2, h2_grid in grid.groupby("h2", sort=False):
+        argv = ["--reg-data-file", datfile_name, "--outcome", "pheno", "--pgi-var", "pgi",
+                "--covariates", "z1", "z2", "--h2", repr(h2), "--out", out_prefix] + \
+               [flag for flag in base_flags if flag != "--streaming"]
+        iargs = _validated_iargs(argv)
+        single = pgic.error_correction_procedure(iargs, pgic.adjust_regression_data(
+            pgic.load_regression_data(iargs), iargs))
+
+        assert np.allclose(h2_grid.rho, single.rho)
+        assert np.allclose(h2_grid.R2, single.R2)
+        single_vars = list(single.uncorrected_alphas.index)
+        assert sorted(h2_grid.variable_name) == sorted(single_vars)
+        var_idx = [single_vars.index(var) for var in h2_grid.variable_name]
+        assert np.allclose(h2_grid.corrected_coef, single.corrected_alphas[var_idx])
+        assert np.allclose(h2_grid.corrected_se, single.corrected_alphas_se[var_idx])
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    ["--pgi-pheno-var", "pgi_pheno"],
+    ["--pgi-pheno-var", "pgi_pheno", "--weights", "wt", "--pgi-interact-vars", "z1"]
+    ]
+)
+def test_analytic_se_delta_method(temp_test_dir, request, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+
+    iargs = _validated_iargs(["--reg-data-file", datfile_name, "--outcome", "pheno",
+                              "--pgi-var", "pgi", "--covariates", "z1", "z2", "--h2", "0.5",
+                              "--h2-se", "0.05", "--analytic-se", "--out", out_prefix] + extra_flags)
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+
+    def run(h2, analytic_se):
+        run_iargs = copy.copy(iargs)
+        run_iargs.h2 = h2
+        run_iargs.analytic_se = analytic_se
+        return pgic.error_correction_procedure(run_iargs, reg_data)
+
+    base = run(0.5, False)
+    analytic = run(0.5, True)
+
+    # rho = sqrt(h^2 / R^2), with var(R^2) = 4 R^2 (1 - R^2)^2 / n
+    assert np.isclose(analytic.h2_se, 0.05)
+    assert np.isclose(analytic.R2_se, np.sqrt(4 * base.R2 * (1 - base.R2) ** 2 / base.n))
+    assert np.isclose(analytic.rho_se, base.rho / 2 * np.sqrt(
+        (0.05 / 0.5) ** 2 + (analytic.R2_se / base.R2) ** 2))
+
+    # The extra variance is var(rho) times the squared derivative of the corrected coefficients
+    # (checked numerically through h^2, since d rho / d h^2 = rho / (2 h^2))
+    step = 1e-5
+    d_alphas = (run(0.5 + step, False).corrected_alphas -
+                run(0.5 - step, False).corrected_alphas) / (2 * step) / (base.rho / (2 * 0.5))
+    assert np.allclose(analytic.corrected_alphas, base.corrected_alphas)
+    assert np.allclose(analytic.corrected_alphas_se ** 2,
+                       base.corrected_alphas_se ** 2 + analytic.rho_se ** 2 * d_alphas ** 2,
+                       rtol=1e-4)
+
+    # Working from moments gives the same standard errors
+    streaming_iargs = copy.copy(iargs)
+    streaming_iargs.streaming = True
+    streamed = pgic.streaming_error_correction(streaming_iargs)
+    for attr in ["h2_se", "R2_se", "rho_se"]:
+        assert np.isclose(getattr(streamed, attr), getattr(analytic, attr))
+    assert np.allclose(streamed.corrected_alphas_se, analytic.corrected_alphas_se)
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    ["--pgi-pheno-var", "pgi_pheno"],
+    ["--pgi-pheno-var", "pgi_pheno", "--weights", "wt", "--pgi-interact-vars", "z1"]
+    ]
+)
+def test_multiplier_bootstrap_matches_resampled_runs(temp_test_dir, request, monkeypatch,
+                                                     extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=1000)
+
+    num_reps = 4
+    iargs = _validated_iargs(["--reg-data-file", datfile_name, "--outcome", "pheno",
+                              "--pgi-var", "pgi", "--covariates", "z1", "z2", "--h2", "0.5",
+                              "--bootstrap", str(num_reps), "--bootstrap-method", "multiplier",
+                              "--bootstrap-seed", "7", "--out", out_prefix] + extra_flags)
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+    boot = pgic.bootstrap_estimates(iargs, reg_data, 0.5)
+    assert boot.shape == (num_reps, 2 + 2 * len(iargs.alpha_cols))
+
+    # Poisson weights are frequency weights, so each replicate is a run on repeated rows (the
+    # weights are drawn a row at a time, so shrinking the chunks doesn't change them)
+    monkeypatch.setattr(pgic, "DEFAULT_BOOTSTRAP_CHUNK_ELEMENTS", 64)
+    assert np.allclose(pgic.bootstrap_estimates(iargs, reg_data, 0.5), boot)
+    boot_weights = np.random.default_rng(7).poisson(1.0, (reg_data.shape[0], num_reps)).T
+    for rep_num in range(num_reps):
+        resampled = reg_data.loc[reg_data.index.repeat(boot_weights[rep_num])]
+        single = pgic.error_correction_procedure(iargs, resampled)
+        assert np.allclose(boot[rep_num], np.concatenate((
+            [single.R2, single.rho], single.uncorrected_alphas.to_numpy(),
+            single.corrected_alphas)))
+
+
+def test_bayesian_bootstrap_se(temp_test_dir, request):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+
+    iargs = _validated_iargs(["--reg-data-file", datfile_name, "--outcome", "pheno",
+                              "--pgi-var", "pgi", "--covariates", "z1", "z2", "--h2", "0.5",
+                              "--pgi-pheno-var", "pgi_pheno", "--bootstrap", "500",
+                              "--out", out_prefix])
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+    result = pgic.error_correction_procedure(iargs, reg_data)
+    pgic.bootstrap_se(iargs, reg_data, result)
+
+    # The bootstrap standard errors of the uncorrected coefficients are near the
+    # heteroskedasticity-robust ones (the simulated outcome is heteroskedastic)
+    robust_se = sm.OLS(reg_data.pheno, reg_data[iargs.alpha_cols + pgic.CONS_COLS]).fit(
+        cov_type="HC0").bse[iargs.alpha_cols]
+    assert result.h2_se is None
+    assert result.R2_se > 0 and result.rho_se > 0
+    assert np.allclose(result.uncorrected_alphas_se.to_numpy(), robust_se.to_numpy(), rtol=0.15)
+    assert np.all(result.corrected_alphas_se > 0)
+
+
+@pytest.mark.parametrize("extra_flags",
+    [
+    ["--pgi-pheno-var", "pgi_pheno"],
+    ["--pgi-pheno-var", "pgi_pheno", "--weights", "wt", "--pgi-interact-vars", "z1"],
+    ["--R2", "0.2", "--pgi-interact-vars", "z1", "z2", "--analytic-se", "--h2-grid", "0.3", "0.4"]
+    ]
+)
+def test_single_pass_moments_match_statsmodels(temp_test_dir, request, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=1000)
+
+    iargs = _validated_iargs(["--reg-data-file", datfile_name, "--outcome", "pheno",
+                              "--pgi-var", "pgi", "--covariates", "z1", "z2", "--h2", "0.5",
+                              "--out", out_prefix] + extra_flags)
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+    assert iargs.solver == pgic.SOLVER_MOMENTS
+    moments_iargs = copy.copy(iargs)
+    iargs.solver = pgic.SOLVER_STATSMODELS
+    expected = pgic.error_correction_procedure(iargs, reg_data)
+    result = pgic.error_correction_procedure(moments_iargs, reg_data)
+
+    for attr in ["n", "h2", "R2", "rho", "h2_se", "R2_se", "rho_se", "corrected_alphas",
+                 "corrected_alphas_se", "uncorrected_alphas", "uncorrected_alphas_se"]:
+        if getattr(expected, attr) is None:
+            assert getattr(result, attr) is None
+        else:
+            assert np.allclose(getattr(result, attr), getattr(expected, attr))
+    if iargs.h2_grid is not None:
+        assert np.allclose(result.grid_corrected_alphas, expected.grid_corrected_alphas)
+        assert np.allclose(result.grid_corrected_alphas_se, expected.grid_corrected_alphas_se)
+
+
+def test_solver_choices_select_fit(temp_test_dir, request, monkeypatch):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=1000)
+    iargs = _validated_iargs(["--reg-data-file", datfile_name, "--outcome", "pheno",
+                              "--pgi-var", "pgi", "--covariates", "z1", "--h2", "0.5",
+                              "--R2", "0.2", "--out", out_prefix])
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+
+    fits = []
+    for name in ["error_correction_from_moments", "get_alpha_ghat"]:
+        monkeypatch.setattr(pgic, name, lambda *args, fit=getattr(pgic, name), name=name: (
+            fits.append(name), fit(*args))[1])
+
+    # statsmodels always fits with statsmodels, and the default moments solver only does so if
+    # the independent variables are nearly collinear
+    for solver, max_condition, expected_fit in [
+            (pgic.SOLVER_STATSMODELS, np.inf, "get_alpha_ghat"),
+            (pgic.SOLVER_MOMENTS, np.inf, "error_correction_from_moments"),
+            (pgic.SOLVER_MOMENTS, 1.0, "get_alpha_ghat"),
+            (pgic.SOLVER_CHOLESKY, 1.0, "error_correction_from_moments")]:
+        monkeypatch.setattr(pgic, "MOMENTS_MAX_CONDITION", max_condition)
+        iargs.solver = solver
+        fits.clear()
+        pgic.error_correction_procedure(iargs, reg_data)
+        assert fits == [expected_fit]
+
+
+def _add_categorical_columns(datfile_name: str, dummy_vars: list) -> list:
+    """
+    Add categorical variables (a string "site" and an integer "region") with effects on the
+    phenotype to a file written by _generate_reg_data_file(), along with dummy columns for all but
+    the first level of some of them.
+
+    :param datfile_name: Path of the file to modify
+    :param dummy_vars: Categorical variables to write dummy columns for
+    :return: Names of the dummy columns
+    """
+    df = pd.read_csv(datfile_name, sep=" ")
+    df["site"] = np.random.choice(["a", "b", "c", "d", "e"], size=df.shape[0])
+    df["region"] = np.random.randint(0, 3, size=df.shape[0])
+    df["pheno"] += df["site"].map({"a": 0.0, "b": 1.0, "c": -2.0, "d": 0.5, "e": 3.0}) + \
+                   df["region"]
+    dummy_cols = []
+    for col in dummy_vars:
+        dummies = pd.get_dummies(df[col], prefix=col, drop_first=True, dtype=float)
+        df[dummies.columns] = dummies
+        dummy_cols += list(dummies.columns)
+    df.to_csv(datfile_name, sep=" ", index=None, na_rep="NA")
+    return dummy_cols
+
+
+@pytest.mark.parametrize("absorb_cols,extra_flags",
+    [
+    (["site"], []),
+    (["site"], ["--weights", "wt", "--analytic-se"]),
+    (["site", "region"], ["--weights", "wt"])
+    ]
+)
+def test_absorb_matches_dummy_covariates(temp_test_dir, request, absorb_cols, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+
+    dummy_cols = _add_categorical_columns(datfile_name, absorb_cols)
+
+    common_flags = ["--reg-data-file", datfile_name, "--outcome", "pheno", "--pgi-var", "pgi",
+                    "--pgi-interact-vars", "z1", "--h2", "0.5", "--out", out_prefix] + extra_flags
+    dummy_iargs = _validated_iargs(common_flags + ["--covariates", "z1", "z2"] + dummy_cols)
+    absorb_iargs = _validated_iargs(common_flags + ["--covariates", "z1", "z2",
+                                                    "--absorb"] + absorb_cols)
+    expected = pgic.error_correction_procedure(
+        dummy_iargs, pgic.adjust_regression_data(pgic.load_regression_data(dummy_iargs),
+                                                 dummy_iargs))
+    result = pgic.error_correction_procedure(
+        absorb_iargs, pgic.adjust_regression_data(pgic.load_regression_data(absorb_iargs),
+                                                  absorb_iargs))
+
+    assert result.n == expected.n
+    assert np.isclose(result.rho, expected.rho)
+    assert list(result.uncorrected_alphas.index) == absorb_iargs.alpha_cols
+    expected_idx = [dummy_iargs.alpha_cols.index(col) for col in absorb_iargs.alpha_cols]
+    for attr in ["uncorrected_alphas", "uncorrected_alphas_se"]:
+        assert np.allclose(getattr(result, attr),
+                           getattr(expected, attr)[absorb_iargs.alpha_cols])
+    for attr in ["corrected_alphas", "corrected_alphas_se"]:
+        assert np.allclose(getattr(result, attr), np.asarray(getattr(expected, attr))[expected_idx])
+
+
+@pytest.mark.parametrize("categorical_cols,extra_flags",
+    [
+    (["site"], []),
+    (["site", "region"], ["--weights", "wt"]),
+    (["region"], ["--absorb", "site"])
+    ]
+)
+def test_categorical_matches_dummy_covariates(temp_test_dir, request, categorical_cols,
+                                              extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    datfile_name = out_prefix + ".dat"
+    _generate_reg_data_file(datfile_name, num_people=2000)
+    dummy_cols = _add_categorical_columns(datfile_name, categorical_cols)
+
+    common_flags = ["--reg-data-file", datfile_name, "--outcome", "pheno", "--pgi-var", "pgi",
+                    "--pgi-interact-vars", "z1", "--h2", "0.5", "--out", out_prefix] + extra_flags
+    dummy_iargs = _validated_iargs(common_flags + ["--covariates", "z1", "z2"] + dummy_cols)
+    categorical_iargs = _validated_iargs(common_flags + ["--covariates", "z1", "z2",
+                                                         "--categorical"] + categorical_cols)
+    expected = pgic.error_correction_procedure(
+        dummy_iargs, pgic.adjust_regression_data(pgic.load_regression_data(dummy_iargs),
+                                                 dummy_iargs))
+    result = pgic.error_correction_procedure(
+        categorical_iargs, pgic.adjust_regression_data(
+            pgic.load_regression_data(categorical_iargs), categorical_iargs))
+
+    assert sorted(categorical_iargs.alpha_cols) == sorted(dummy_iargs.alpha_cols)
+    assert result.n == expected.n
+    expected_idx = [dummy_iargs.alpha_cols.index(col) for col in categorical_iargs.alpha_cols]
+    for attr in ["uncorrected_alphas", "uncorrected_alphas_se", "corrected_alphas",
+                 "corrected_alphas_se"]:
+        assert np.allclose(getattr(result, attr), np.asarray(getattr(expected, attr))[expected_idx])
+
+
+@pytest.mark.parametrize("use_fixture,extra_flags",
+    [
+    (True, []),
+    (False, []),
+    (False, ["--weights", "wt", "--pgi-pheno-var", "pgi_pheno"]),
+    (False, ["--jk-se", "--jk-method", "downdate", "--id-col", "IID", "--num-blocks", "20"])
+    ]
+)
+def test_float32_precision_matches_float64(temp_test_dir, request, use_fixture, extra_flags):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    if use_fixture:
+        datfile_name = os.path.join(data_directory, 'reg_data.txt')
+        spec_flags = ["--outcome", "PHENO", "--pgi-var", "PGI", "--covariates", "PC*"]
+    else:
+        datfile_name = out_prefix + ".dat"
+        _generate_reg_data_file(datfile_name)
+        spec_flags = ["--outcome", "pheno", "--pgi-var", "pgi", "--pgi-interact-vars", "z1",
+                      "--covariates", "z1", "z2"]
+
+    # float32 storage only adds the rounding of each stored value (relative error ~6e-8)
+    iargs = _validated_iargs(["--reg-data-file", datfile_name, "--h2", "0.5", "--solver",
+                              "cholesky", "--out", out_prefix] + spec_flags + extra_flags)
+    float32_iargs = copy.copy(iargs)
+    float32_iargs.precision = pgic.PRECISION_FLOAT32
+    results = []
+    for run_iargs in [iargs, float32_iargs]:
+        reg_data = pgic.adjust_regression_data(pgic.load_regression_data(run_iargs), run_iargs)
+        results.append(pgic.error_correction_procedure(run_iargs, reg_data))
+        if run_iargs.jk_se:
+            np.random.seed(0)  # Same jack-knife blocks for both runs
+            pgic.jack_knife_se(run_iargs, reg_data, results[-1])
+    expected, result = results
+
+    assert result.n == expected.n
+    for attr in ["R2", "rho", "uncorrected_alphas", "uncorrected_alphas_se", "corrected_alphas",
+                 "corrected_alphas_se", "R2_se", "rho_se"]:
+        if getattr(expected, attr) is None:
+            assert getattr(result, attr) is None
+        else:
+            assert np.allclose(getattr(result, attr), getattr(expected, attr), rtol=1e-5,
+                               atol=0.0)
+
+
+@pytest.mark.parametrize("jk_method", ["refit", "downdate"])
+def test_rhe_h2_jackknife(temp_test_dir, request, jk_method):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    iargs = _validated_iargs(["--reg-data-file", os.path.join(data_directory, 'reg_data.txt'),
+                              "--bfile", os.path.join(data_directory, 'fake_data'),
+                              "--pheno-file", os.path.join(data_directory, 'fake_pheno.phen'),
+                              "--h2-method", "rhe", "--outcome", "PHENO", "--pgi-var", "PGI",
+                              "--covariates", "PC*", "--id-col", "IID", "--jk-se", "--jk-method",
+                              jk_method, "--num-blocks", "20", "--force", "--out", out_prefix])
+    assert iargs.software == "RHE"
+    assert not iargs.use_gcta
+
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+    result = pgic.error_correction_procedure(iargs, reg_data)
+    pgic.jack_knife_se(iargs, reg_data, result)
+    assert np.isclose(result.h2, pgic.rhe_h2_estimates(iargs, [None])[0])
+    assert result.h2_se is not None
+
+    # All blocks come from one pass, and match estimating each block on its own
+    blocks = pd.DataFrame({"FID": reg_data.IID, "IID": reg_data.IID,
+                           "iteration": np.arange(len(reg_data)) % iargs.num_blocks})
+    h2 = pgic.leave_out_h2_estimates(iargs, blocks)
+    for iter_num in [0, iargs.num_blocks - 1]:
+        removed = blocks.loc[blocks.iteration == iter_num, ["FID", "IID"]]
+        assert np.isclose(h2[iter_num], pgic.rhe_h2_estimates(iargs, [removed])[0])
+
+
+def test_reml_eigen_h2_jackknife(temp_test_dir, request):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    flags = ["--reg-data-file", os.path.join(data_directory, 'reg_data.txt'),
+             "--pheno-file", os.path.join(data_directory, 'fake_pheno.phen'),
+             "--h2-method", "reml-eigen", "--outcome", "PHENO", "--pgi-var", "PGI",
+             "--covariates", "PC*", "--id-col", "IID", "--jk-se", "--num-blocks", "20",
+             "--force", "--out", out_prefix]
+    bfile_iargs = _validated_iargs(flags + ["--bfile", os.path.join(data_directory, 'fake_data')])
+    assert bfile_iargs.software == "REML-eigen"
+    assert bfile_iargs.grm_builder == pgic.GRM_BUILDER_NATIVE
+    assert not bfile_iargs.use_gcta
+
+    grm_prefix = pgic.build_grm_native(os.path.join(data_directory, 'fake_data'), temp_test_dir)
+    iargs = _validated_iargs(flags + ["--grm", grm_prefix])
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+    result = pgic.error_correction_procedure(iargs, reg_data)
+    pgic.jack_knife_se(iargs, reg_data, result)
+    expected_h2, expected_se = pgic.reml_eigen_h2_estimates(iargs, [None])[0]
+    assert result.h2 == expected_h2
+    assert pgic.full_sample_h2_se(iargs) == expected_se
+    assert os.path.exists(grm_prefix + pgic.GRM_EIGENVECTORS_SUFFIX)
+
+    # Leave-one-block-out estimates match estimating each block on its own
+    blocks = pd.DataFrame({"FID": reg_data.IID, "IID": reg_data.IID,
+                           "iteration": np.arange(len(reg_data)) % iargs.num_blocks})
+    h2 = pgic.leave_out_h2_estimates(iargs, blocks)
+    removed = blocks.loc[blocks.iteration == 3, ["FID", "IID"]]
+    assert h2[3] == pgic.reml_eigen_h2_estimates(iargs, [removed])[0][0]
+
+
+def test_jackknife_blocks_split_pruned_grm(temp_test_dir, request, monkeypatch):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    grm_prefix = pgic.build_grm_native(os.path.join(data_directory, 'fake_data'), temp_test_dir)
+    iargs = _validated_iargs(["--reg-data-file", os.path.join(data_directory, 'reg_data.txt'),
+                              "--pheno-file", os.path.join(data_directory, 'fake_pheno.phen'),
+                              "--grm", grm_prefix, "--grm-cutoff", "0.15", "--h2-method",
+                              "reml-eigen", "--outcome", "PHENO", "--pgi-var", "PGI",
+                              "--covariates", "PC*", "--id-col", "IID", "--jk-se", "--num-blocks",
+                              "20", "--force", "--out", out_prefix])
+    pgic.apply_grm_cutoff(iargs, out_prefix + "_pruned")
+    num_kept = len(iargs.grm_kept_ids)
+    assert 20 <= num_kept < 100
+    assert len(pgic.open_grm(iargs.grm).ids) == num_kept
+
+    # Every block drops the same share of the pruned GRM
+    leave_out_h2_estimates = pgic.leave_out_h2_estimates
+    blocks = []
+    def record_blocks(iargs, reg_data):
+        blocks.append(reg_data.copy())
+        return leave_out_h2_estimates(iargs, reg_data)
+    monkeypatch.setattr(pgic, "leave_out_h2_estimates", record_blocks)
+
+    reg_data = pgic.adjust_regression_data(pgic.load_regression_data(iargs), iargs)
+    result = pgic.error_correction_procedure(iargs, reg_data)
+    pgic.jack_knife_se(iargs, reg_data, result)
+
+    in_grm = blocks[0].IID.isin(iargs.grm_kept_ids.IID)
+    for group in [in_grm, ~in_grm]:
+        block_sizes = np.bincount(blocks[0].iteration[group], minlength=20)
+        assert block_sizes.max() - block_sizes.min() <= 1
+    assert len(blocks[0]) == len(reg_data)
+
+
+def test_sparse_grm_h2(temp_test_dir, request):
+    out_prefix = os.path.join(temp_test_dir, request.node.name)
+    grm_prefix = pgic.build_grm_native(os.path.join(data_directory, 'fake_data'), temp_test_dir)
+    flags = ["--reg-data-file", os.path.join(data_directory, 'reg_data.txt'),
+             "--pheno-file", os.path.join(data_directory, 'fake_pheno.phen'),
+             "--outcome", "PHENO", "--pgi-var", "PGI", "--covariates", "PC*", "--id-col", "IID",
+             "--jk-se", "--num-blocks", "20", "--force", "--out", out_prefix]
+
+    # Sparse GRMs need the in-process REML, and replace any dense GRM
+    with pytest.raises(RuntimeError, match="require --h2-method"):
+        _validated_iargs(flags + ["--grm", grm_prefix, "--sparse-grm-cutoff", "0.05"])
+    with pytest.raises(RuntimeError, match="one and only one"):
+        _validated_iargs(flags + ["--h2-method", "reml-eigen", "--grm", grm_prefix,
+                                  "--grm-sparse", grm_prefix])
+
+    # Thresholding the dense GRM gives the same estimate as a sparse GRM made up front
+    sparse_prefix = pgic.sparsify_grm(pgic.open_grm(grm_prefix), 0.05, out_prefix + "_sparse")
+    sparse_iargs = _validated_iargs(flags + ["--h2-method", "reml-eigen", "--grm-sparse",
+                                             sparse_prefix])
+    expected_h2 = pgic.reml_eigen_h2_estimates(sparse_iargs, [None])[0][0]
+    pgic.main_func(["pgic.py"] + flags + ["--h2-method", "reml-eigen", "--grm", grm_prefix,
+                                          "--sparse-grm-cutoff", "0.05"])
+    with open(out_prefix + ".res", "r") as res_file:
+        h2_line = [line for line in res_file if line.startswith("Heritability = ")][0]
+    assert np.isclose(float(h2_line.split()[2]), expected_h2)